@@ -1,11 +1,11 @@
 import openmm.unit as unit
-from openmm.vec3 import Vec3
 from openmm.app import element
 from openmm.app.topology import Topology as OMMTop
 from openmm.app.internal.unitcell import computePeriodicBoxVectors
 
 from crimm.StructEntities.Model import Model
 from crimm.StructEntities.Structure import Structure
+from crimm.Utils.StructureUtils import get_coords
     
 class Topology(OMMTop):
     """Model/Topology class derived from Biopython Model and made compatible with
@@ -124,7 +124,5 @@ def construct_omm_positions(entity):
         # take the first model if a structure is supplied
         entity = entity.child_list[0]
 
-    positions = []
-    for atom in entity.get_atoms():
-        positions.append(Vec3(*(atom.coord/10)))
-    return unit.Quantity(value=positions, unit=unit.nanometers)
\ No newline at end of file
+    # OpenMM takes the (N, 3) array of positions directly
+    return unit.Quantity(value=get_coords(entity)/10, unit=unit.nanometers)
\ No newline at end of file
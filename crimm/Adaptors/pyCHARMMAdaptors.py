@@ -6,6 +6,7 @@ from pycharmm import ic, cons_harm
 from pycharmm import minimize as _minimize
 from pycharmm.psf import get_natom, delete_atoms
 from crimm.IO import get_pdb_str
+from crimm.StructEntities.CoordBuffer import set_atom_coords
 
 nucleic_letters_1to3 = {
     'A': 'ADE', 'C': 'CYT', 'G': 'GUA', 'T': 'THY', 'U': 'URA',
@@ -141,10 +142,14 @@ def sync_coords(chain):
         return
     ibase = list(psf.get_ibase())
     new_coord_df = coor.get_positions()
-    atom_coords = list(zip(psf.get_atype(), new_coord_df.to_numpy()))
+    atom_names = psf.get_atype()
+    new_coords = new_coord_df.to_numpy()
+    atoms, coord_ids = [], []
     for i, (st, end) in enumerate(zip(ibase[:-1], ibase[1:])):
         cur_res = chain.residues[i]
-        for atom_name, coordinate in atom_coords[st:end]:
-            if atom_name in cur_res:
-                cur_res[atom_name].coord = coordinate
+        for j in range(st, end):
+            if atom_names[j] in cur_res:
+                atoms.append(cur_res[atom_names[j]])
+                coord_ids.append(j)
+    set_atom_coords(atoms, new_coords[coord_ids])
     print(f'Synchronized: {chain}')
@@ -6,6 +6,7 @@ import pandas as pd
 from Bio.Seq import Seq
 from crimm.IO import MMCIFParser, PDBParser
 from crimm.IO.MMCIF2Dict import MMCIF2Dict
+from crimm.IO.CompressedFile import COMPRESSION_SUFFIXES
 from crimm.Superimpose.ChainSuperimposer import ChainSuperimposer
 
 def uniprot_id_query(pdbid, entity_id):
@@ -26,12 +27,16 @@ def uniprot_id_query(pdbid, entity_id):
     return uniprot_id
 
 def _find_local_cif_path(pdb_id, entry_point):
-    """Find the path to a local cif file"""
+    """Find the path to a local cif file. Compressed files (e.g. "1aka.cif.gz"
+    as in the wwPDB mirror layout) and BinaryCIF files (e.g. "1aka.bcif") are 
+    also accepted"""
     pdb_id = pdb_id.lower()
     subdir = pdb_id[1:3]
-    file_path = os.path.join(entry_point, subdir, pdb_id+'.cif')
-    if os.path.exists(file_path):
-        return file_path
+    for ext in ('.cif', '.bcif'):
+        for suffix in ('',) + COMPRESSION_SUFFIXES:
+            file_path = os.path.join(entry_point, subdir, pdb_id+ext+suffix)
+            if os.path.exists(file_path):
+                return file_path
 
 def _file_handle_from_url(cif_url):
     """Get a cif file from a url, return a file handle to the cif file"""
@@ -0,0 +1,132 @@
+"""Builder classes that expand a model into its biological assembly by applying
+the symmetry operations specified in mmCIF ("pdbx_struct_oper_list")."""
+import numpy as np
+from crimm.Utils.StructureUtils import index_to_letters
+from crimm.StructEntities.CoordBuffer import CoordBuffer, get_atom_coords
+
+class AssemblyBuilder:
+    """Apply a set of symmetry operations (rotation matrix, translation vector)
+    to the chains of a model. The operations are applied to a single coordinate
+    block of all template atoms in one batched matrix multiplication.
+
+    Arguments:
+     :operations: list of (matrix, vector) tuples, where matrix is a (3, 3)
+                  rotation matrix and vector is a (3,) translation vector. The
+                  transformed coordinates are x' = matrix @ x + vector
+    """
+    def __init__(self, operations):
+        operations = list(operations)
+        self.matrices = np.array([m for m, v in operations], dtype=float)
+        self.vectors = np.array([v for m, v in operations], dtype=float)
+        self.matrices = self.matrices.reshape(-1, 3, 3)
+        self.vectors = self.vectors.reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.matrices)
+
+    def transform(self, coords):
+        """Apply all operations to an (N, 3) coordinate array. Return an
+        (n_operations, N, 3) array of the transformed coordinates."""
+        coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        return (
+            np.matmul(coords[np.newaxis], self.matrices.transpose(0, 2, 1))
+            + self.vectors[:, np.newaxis, :]
+        )
+
+    @staticmethod
+    def get_template_atoms(chains):
+        """Return the list of all atoms (including altlocs) in the template
+        chains in the order that the chain copies will be filled."""
+        atoms = []
+        for chain in chains:
+            atoms.extend(chain.get_atoms(include_alt=True))
+        return atoms
+
+    def create_chain_copies(self, chains, start_index=0):
+        """Create copies of the template chains for each operation with the
+        transformed coordinates. The copies are named by the alphabet starting
+        from start_index (see index_to_letters). Return the list of the new
+        chains, ordered by operation and then by template chain. The atoms of
+        the copies of each operation share one CoordBuffer of the transformed
+        coordinates."""
+        chains = list(chains)
+        atoms = self.get_template_atoms(chains)
+        if len(atoms) == 0:
+            return []
+        all_coords = self.transform(get_atom_coords(atoms))
+        new_chains = []
+        for op_coords in all_coords:
+            op_chains = []
+            for chain in chains:
+                chain_copy = chain.copy()
+                chain_copy.id = index_to_letters(start_index + len(new_chains))
+                op_chains.append(chain_copy)
+                new_chains.append(chain_copy)
+            # the atoms of the copies are bound to the transformed block
+            CoordBuffer(self.get_template_atoms(op_chains), coords=op_coords)
+        return new_chains
+
+    def build(self, model):
+        """Expand the model in place by adding the chain copies of all the
+        current chains in the model for each operation."""
+        new_chains = self.create_chain_copies(model.child_list, len(model))
+        for chain in new_chains:
+            model.add(chain)
+        return new_chains
+
+    def create_view(self, model):
+        """Return an AssemblyView of the model without copying any chain."""
+        return AssemblyView(self, model)
+
+
+class AssemblyView:
+    """A lightweight view of a biological assembly. The chains of the model are
+    used as the shared template, and the coordinates of the symmetry copies are
+    computed on demand from the current template coordinates instead of
+    copying every chain."""
+    def __init__(self, builder, model):
+        self.builder = builder
+        self.model = model
+        self.template_chains = list(model.child_list)
+
+    def __len__(self):
+        """Number of symmetry copies (excluding the template itself)"""
+        return len(self.builder)
+
+    def __repr__(self):
+        return (
+            f"<AssemblyView Template Chains={len(self.template_chains)} "
+            f"Copies={len(self)}>"
+        )
+
+    def get_atoms(self):
+        """Return the list of template atoms that all copies are mapped to."""
+        return self.builder.get_template_atoms(self.template_chains)
+
+    def get_coords(self, copy_index=None):
+        """Return the coordinates of the symmetry copies as an
+        (n_copies, n_atoms, 3) array, or as an (n_atoms, 3) array for a single
+        copy if copy_index is specified."""
+        coords = get_atom_coords(self.get_atoms())
+        if copy_index is None:
+            return self.builder.transform(coords)
+        single_op = AssemblyBuilder([
+            (self.builder.matrices[copy_index], self.builder.vectors[copy_index])
+        ])
+        return single_op.transform(coords)[0]
+
+    def iter_coords(self):
+        """Yield the (n_atoms, 3) coordinates of each symmetry copy."""
+        for i in range(len(self)):
+            yield self.get_coords(i)
+
+    def materialize(self):
+        """Add the chain copies to the model, and return the list of the new
+        chains. The atom serial numbers of the model will be reset."""
+        new_chains = self.builder.create_chain_copies(
+            self.template_chains, len(self.model)
+        )
+        for chain in new_chains:
+            self.model.add(chain)
+        self.model.reset_atom_serial_numbers()
+        return new_chains
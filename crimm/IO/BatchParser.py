@@ -0,0 +1,82 @@
+"""Parallel parsing of structure files across a process pool. The structures
+are transferred back from the worker processes in the compact array format of
+StructureArrays instead of pickling the full entity hierarchy."""
+import os
+import inspect
+import pathlib
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from crimm.IO.MMCIFParser import MMCIFParser
+from crimm.IO.PDBParser import PDBParser
+from crimm.IO.StructureCache import StructureArrays
+from crimm.IO.CompressedFile import COMPRESSION_SUFFIXES
+
+_PDB_SUFFIXES = ('.pdb', '.ent')
+
+def _is_pdb_file(filepath):
+    """Return True if the file is in PDB format judging by its extension"""
+    path = pathlib.Path(filepath)
+    if path.suffix in COMPRESSION_SUFFIXES:
+        path = path.with_suffix('')
+    return path.suffix.lower() in _PDB_SUFFIXES
+
+def _get_parser_opts(parser_cls, parser_opts):
+    """Return the options accepted by the parser class, so the options of
+    only one of the parsers (e.g. use_bio_assembly of MMCIFParser) do not
+    fail the files of the other format (PRIVATE)"""
+    params = inspect.signature(parser_cls.__init__).parameters
+    return {k: v for k, v in parser_opts.items() if k in params}
+
+def _parse_to_bytes(filepath, parser_opts):
+    """Parse a file in the worker process and serialize the structure with
+    StructureArrays (PRIVATE)"""
+    parser_cls = PDBParser if _is_pdb_file(filepath) else MMCIFParser
+    parser = parser_cls(**_get_parser_opts(parser_cls, parser_opts))
+    structure = parser.get_structure(filepath)
+    return StructureArrays.from_entity(structure).to_bytes()
+
+def parse_many(filepaths, workers=None, as_arrays=False, **parser_opts):
+    """Parse structure files in parallel with a process pool. mmCIF (and
+    BinaryCIF) files are parsed with MMCIFParser, and files with the ".pdb" or
+    ".ent" extensions are parsed with PDBParser.
+
+    Yield a tuple of (filepath, structure, error) for each file in the order
+    of completion. If a file fails to be parsed, structure is None and error
+    is the exception raised, and the rest of the batch is not affected. At
+    most twice as many files as workers are submitted at a time, so the
+    results waiting to be consumed are bounded for large batches.
+
+    Arguments:
+     :filepaths: iterable of the paths to the structure files
+     :workers: number of worker processes (default: number of CPUs)
+     :as_arrays: if True, yield StructureArrays instead of building the
+                 Structure objects in the main process
+     :parser_opts: keyword arguments passed to the parser (e.g.
+                   first_model_only, include_solvent, QUIET). Options not
+                   accepted by the parser of a file are ignored for it.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    filepaths = iter(filepaths)
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        def submit(n_files):
+            for filepath in islice(filepaths, n_files):
+                future = executor.submit(_parse_to_bytes, filepath, parser_opts)
+                futures[future] = filepath
+        submit(max_pending)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = futures.pop(future)
+                try:
+                    structure = StructureArrays.from_buffer(future.result())
+                    if not as_arrays:
+                        structure = structure.to_entity()
+                except Exception as exc: # pylint: disable=broad-except
+                    structure, error = None, exc
+                else:
+                    error = None
+                yield filepath, structure, error
+            submit(max_pending - len(futures))
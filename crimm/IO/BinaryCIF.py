@@ -0,0 +1,233 @@
+"""Reader for BinaryCIF (BCIF) files. The columns of BCIF are encoded with a
+chain of encodings (e.g. run-length, delta, integer packing) that are decoded
+directly into numpy arrays. The decoded data is organized in the same way as
+MMCIF2Dict, so the BCIF2Dict can be used in place of it in MMCIFParser.
+
+See https://github.com/molstar/BinaryCIF for the format specification.
+"""
+import io
+import os
+import sys
+import numpy
+from crimm.IO.MMCIF2Dict import MMCIF2Dict, _COLUMN_DTYPES
+from crimm.IO.CompressedFile import get_compression_module
+
+# Data type codes of the ByteArray encoding
+_BCIF_DTYPES = {
+    1: numpy.dtype('<i1'),
+    2: numpy.dtype('<i2'),
+    3: numpy.dtype('<i4'),
+    4: numpy.dtype('<u1'),
+    5: numpy.dtype('<u2'),
+    6: numpy.dtype('<u4'),
+    32: numpy.dtype('<f4'),
+    33: numpy.dtype('<f8'),
+}
+# Values of the column masks. 0 is a present value, 1 is "." and 2 is "?"
+_MASK_TOKENS = {1: '.', 2: '?'}
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError as exc:
+        raise ImportError(
+            "msgpack not found! Install msgpack to read BinaryCIF files "
+            "(e.g. pip install crimm[bcif] or pip install msgpack). "
+            "https://pypi.org/project/msgpack/"
+        ) from exc
+    return msgpack
+
+def _decode_integer_packing(data, encoding):
+    """Decode the integer packing encoding (PRIVATE). Values that do not fit in
+    the packed type are split into a sum of the upper (or lower) limit values
+    followed by a remainder."""
+    data = numpy.asarray(data)
+    if encoding['isUnsigned']:
+        is_limit = data == numpy.iinfo(data.dtype).max
+    else:
+        info = numpy.iinfo(data.dtype)
+        is_limit = (data == info.max) | (data == info.min)
+    if not is_limit.any():
+        return data.astype(numpy.int32)
+    is_end = ~is_limit
+    ends = numpy.flatnonzero(is_end)
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    return numpy.add.reduceat(data.astype(numpy.int32), starts)
+
+def _decode_string_array(data, encoding):
+    """Decode the string array encoding (PRIVATE). Return a list of str."""
+    offsets = decode_data(encoding['offsets'], encoding['offsetEncoding'])
+    indices = decode_data(data, encoding['dataEncoding'])
+    string_data = encoding['stringData']
+    offsets = offsets.tolist()
+    strings = [
+        string_data[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+    # index -1 denotes an empty (masked) value
+    strings.append('')
+    return [strings[i] for i in indices.tolist()]
+
+def _decode_step(data, encoding):
+    """Decode data with a single encoding step (PRIVATE)"""
+    kind = encoding['kind']
+    if kind == 'ByteArray':
+        return numpy.frombuffer(data, dtype=_BCIF_DTYPES[encoding['type']])
+    if kind == 'FixedPoint':
+        dtype = _BCIF_DTYPES[encoding['srcType']]
+        return (numpy.asarray(data) / encoding['factor']).astype(dtype)
+    if kind == 'IntervalQuantization':
+        dtype = _BCIF_DTYPES[encoding['srcType']]
+        delta = (
+            (encoding['max'] - encoding['min']) / (encoding['numSteps'] - 1)
+        )
+        return (encoding['min'] + delta * numpy.asarray(data)).astype(dtype)
+    if kind == 'RunLength':
+        dtype = _BCIF_DTYPES[encoding['srcType']]
+        data = numpy.asarray(data)
+        return numpy.repeat(data[0::2], data[1::2]).astype(dtype)
+    if kind == 'Delta':
+        dtype = _BCIF_DTYPES[encoding['srcType']]
+        decoded = numpy.cumsum(numpy.asarray(data), dtype=numpy.int64)
+        return (decoded + encoding['origin']).astype(dtype)
+    if kind == 'IntegerPacking':
+        return _decode_integer_packing(data, encoding)
+    if kind == 'StringArray':
+        return _decode_string_array(data, encoding)
+    raise ValueError(f'Unknown BinaryCIF encoding: {kind}')
+
+def decode_data(data, encodings):
+    """Decode the raw bytes of an encoded BCIF data with its list of
+    encodings. The encodings are applied in the reverse order. Return a numpy
+    array, or a list of str for string data."""
+    for encoding in reversed(encodings):
+        data = _decode_step(data, encoding)
+    return data
+
+def decode_column(column):
+    """Decode a BCIF column. Return the values (numpy array or list of str)
+    and the mask (numpy uint8 array, or None if no value is missing)."""
+    encoded = column['data']
+    values = decode_data(encoded['data'], encoded['encoding'])
+    mask = column.get('mask')
+    if mask is not None:
+        mask = decode_data(mask['data'], mask['encoding'])
+        if not mask.any():
+            mask = None
+    return values, mask
+
+def _is_msgpack_map(first_byte):
+    """Return True if the first byte starts a MessagePack map (PRIVATE)"""
+    # fixmap (0x80-0x8f), map16 (0xde) and map32 (0xdf)
+    return len(first_byte) == 1 and (
+        0x80 <= first_byte[0] <= 0x8f or first_byte[0] in (0xde, 0xdf)
+    )
+
+def _peek_first_byte(handle):
+    """Return the first byte of a binary handle without consuming it, or None
+    if the handle can not be rewound (PRIVATE)"""
+    if hasattr(handle, 'peek'):
+        return handle.peek(1)[:1]
+    if not handle.seekable():
+        return None
+    pos = handle.tell()
+    first_byte = handle.read(1)
+    handle.seek(pos)
+    return first_byte
+
+def is_binary_cif(filepath):
+    """Return True if the file (path or handle) is a BinaryCIF file. Paths and
+    binary mode handles are detected from their (decompressed) content. BCIF
+    is a MessagePack map, whereas text mmCIF starts with printable characters.
+    Binary handles that can not be rewound are considered as BCIF."""
+    if not isinstance(filepath, (str, os.PathLike)):
+        if isinstance(filepath, io.TextIOBase):
+            return False
+        first_byte = _peek_first_byte(filepath)
+        return first_byte is None or _is_msgpack_map(first_byte)
+    compression = get_compression_module(filepath)
+    opener = open if compression is None else compression.open
+    with opener(filepath, 'rb') as f:
+        first_byte = f.read(1)
+    return _is_msgpack_map(first_byte)
+
+class BCIF2Dict(MMCIF2Dict):
+    """A dictionary-like object that reads a BinaryCIF file and stores the data
+    in the same way as MMCIF2Dict. The columns are decoded from their binary
+    encodings into numpy arrays, and the numeric columns in "atom_site" and
+    "atom_site_anisotrop" are kept as numpy arrays.
+
+    If lazy is True, the categories are only decoded when they are first
+    accessed. Only the first data block of the file is read.
+    """
+    def __init__(self, filename, lazy=False):
+        msgpack = _import_msgpack()
+        self._lazy_blocks = {}
+        self._filepath = None
+        self._data = None
+        compression = get_compression_module(filename)
+        if compression is not None:
+            with compression.open(filename, 'rb') as f:
+                content = f.read()
+        elif isinstance(filename, (str, os.PathLike)):
+            with open(filename, 'rb') as f:
+                content = f.read()
+        else:
+            content = filename.read()
+        if len(content) == 0:
+            raise ValueError("Empty file.")
+        bcif = msgpack.unpackb(content, raw=False)
+        data_blocks = bcif.get('dataBlocks')
+        if not data_blocks:
+            raise ValueError("No data block found in the BinaryCIF file.")
+        data_block = data_blocks[0]
+        dict.__setitem__(self, 'data', data_block['header'])
+        for category in data_block['categories']:
+            key = self._format_key(category['name'])
+            self._lazy_blocks[key] = category
+        if not lazy:
+            self.decode_all()
+
+    def _decode_category(self, key):
+        """Decode a category from its encoded BCIF columns"""
+        category = self._lazy_blocks.pop(key)
+        dict.__setitem__(self, key, dict())
+        for column in category['columns']:
+            k = self._format_key(category['name'] + '.' + column['name'])
+            main, sec = k.split('.')
+            values, mask = decode_column(column)
+            dict.__getitem__(self, main)[sec] = self._convert_bcif_column(
+                main, sec, values, mask
+            )
+        return dict.__getitem__(self, key)
+
+    def _convert_bcif_column(self, main, sec, values, mask):
+        """Convert the decoded values of a column to the same types as the
+        ones from MMCIF2Dict"""
+        if isinstance(values, list):
+            # string columns go through the same conversion as the text
+            # tokens, with the masked values restored as "." or "?"
+            if mask is not None:
+                values = [
+                    _MASK_TOKENS.get(m, v) for v, m in zip(values, mask.tolist())
+                ]
+            if '' in values:
+                values = ['.' if v == '' else v for v in values]
+            return self._convert_column(main, sec, values)
+
+        dtype = _COLUMN_DTYPES.get(main, {}).get(sec)
+        if dtype is not None:
+            arr = values.astype(dtype)
+            if mask is not None:
+                return numpy.ma.MaskedArray(arr, mask=mask.astype(bool))
+            return arr
+        values = values.tolist()
+        if mask is not None:
+            values = [
+                None if m else v for v, m in zip(values, mask.tolist())
+            ]
+        if main in _COLUMN_DTYPES:
+            # label columns of the coordinate categories are kept as str
+            return [
+                v if v is None else sys.intern(str(v)) for v in values
+            ]
+        return values
@@ -1,19 +1,24 @@
 """
-Module containing the parser class for constructing structures from coord CRD 
+Module containing the parser class for constructing structures from coord CRD
 files from CHARMM output.
 
 Read a list of atoms from a CHARMM CARD coordinate file (CRD_)
-to build a basic biopython/crimm structure.  Reads atom ids (ATOMNO), 
-atom names (TYPES), resids (RESID), residue numbers (RESNO), 
-residue names (RESNames), segment ids (SEGID) and tempfactor (Weighting).  
-Atom element and mass are determined by a lookup table derived from CHARMM36 
+to build a basic biopython/crimm structure.  Reads atom ids (ATOMNO),
+atom names (TYPES), resids (RESID), residue numbers (RESNO),
+residue names (RESNames), segment ids (SEGID) and tempfactor (Weighting).
+Atom element and mass are determined by a lookup table derived from CHARMM36
 and CGENFF residue topology files (rtf).
 
-Residues are detected through a change in resid or resnum, 
-while segments are detected according to changes in segid. chains are based on 
+Both the standard and the extended (EXT) formats are read. The atom records
+are sliced by their fixed column widths, and the columns are converted to
+numpy arrays in one pass.
+
+Residues are detected through a change in resid or resnum,
+while segments are detected according to changes in segid. chains are based on
 segid. The chain ids are assigned based on the alphabet.
 
 """
+import re
 import warnings
 from string import ascii_uppercase
 from collections import namedtuple
@@ -21,16 +26,146 @@ import numpy as np
 from Bio.PDB.PDBExceptions import PDBConstructionWarning
 from crimm.IO.StructureBuilder import StructureBuilder
 from crimm.IO.PDBParser import protein_letters_3to1, nucleic_letters_3to1
+from crimm.IO.CompressedFile import open_decompressed, get_file_stem
+from crimm.StructEntities.Atom import Atom
 from crimm.Data.element_dict import all_element_dict
+from crimm.Utils.StructureUtils import gc_paused
 
 crd_entry = namedtuple(
     'crd_entry',
     [
-        'serial', 'resnum', 'resname', 'atomname', 
+        'serial', 'resnum', 'resname', 'atomname',
         'coord', 'segid', 'resid', 'tempFactor'
     ]
 )
 
+# (name, start, end) of the fixed width columns of the atom records
+# standard format: (I5,I5,1X,A4,1X,A4,3F10.5,1X,A4,1X,A4,F10.5)
+_CRD_COLUMNS = (
+    ('serial', 0, 5), ('resnum', 5, 10), ('resname', 11, 15),
+    ('atomname', 16, 20), ('x', 20, 30), ('y', 30, 40), ('z', 40, 50),
+    ('segid', 51, 55), ('resid', 56, 60), ('tempFactor', 60, 70),
+)
+# extended format: (I10,I10,2X,A8,2X,A8,3F20.10,2X,A8,2X,A8,F20.10)
+_CRD_EXT_COLUMNS = (
+    ('serial', 0, 10), ('resnum', 10, 20), ('resname', 22, 30),
+    ('atomname', 32, 40), ('x', 40, 60), ('y', 60, 80), ('z', 80, 100),
+    ('segid', 102, 110), ('resid', 112, 120), ('tempFactor', 120, 140),
+)
+_CRD_FIELD_NAMES = [name for name, _, _ in _CRD_COLUMNS]
+# resid with an optional insertion code
+_RESID_PATTERN = re.compile(r'(-?\d+)([A-Za-z]?)')
+
+def _get_record_dtype(columns):
+    """Return the numpy structured dtype of the fixed width atom records
+    (PRIVATE)"""
+    return np.dtype({
+        'names': [name for name, _, _ in columns],
+        'formats': [f'S{end-start}' for _, start, end in columns],
+        'offsets': [start for _, start, _ in columns],
+        'itemsize': columns[-1][2],
+    })
+
+def _decode_str_column(column):
+    """Decode a fixed width byte string column to a list of stripped str
+    (PRIVATE)"""
+    return np.char.strip(column.astype('U')).tolist()
+
+def _slice_columns(lines, columns):
+    """Slice the atom records by the fixed column widths (PRIVATE). Return a
+    dict of the raw byte string columns."""
+    width = columns[-1][2]
+    buffer = ''.join(
+        l.rstrip('\r\n').ljust(width)[:width] for l in lines
+    ).encode('ascii')
+    records = np.frombuffer(buffer, dtype=_get_record_dtype(columns))
+    return {name: records[name] for name in _CRD_FIELD_NAMES}
+
+def _split_columns(lines):
+    """Split the atom records by white spaces (PRIVATE). This is the fallback
+    for files that are not aligned to the CHARMM column widths."""
+    fields = np.array(
+        ' '.join(lines).split(), dtype=bytes
+    ).reshape(len(lines), len(_CRD_FIELD_NAMES))
+    return {name: fields[:, i] for i, name in enumerate(_CRD_FIELD_NAMES)}
+
+def _convert_resid(column):
+    """Convert the resid column to the int residue sequence numbers and the
+    insertion codes (PRIVATE). Resids like "10A" are split into 10 and "A"."""
+    column = np.char.strip(column)
+    try:
+        return column.astype(np.int64), [' ']*len(column)
+    except ValueError:
+        pass
+    resseqs, icodes = [], []
+    for resid in column.astype('U').tolist():
+        match = _RESID_PATTERN.fullmatch(resid)
+        if match is None:
+            raise ValueError(f'Invalid resid in CRD file: {resid}')
+        resseqs.append(int(match.group(1)))
+        icodes.append(match.group(2) or ' ')
+    return np.array(resseqs, dtype=np.int64), icodes
+
+def _convert_columns(raw):
+    """Convert the raw byte string columns to the numeric arrays and the
+    lists of names (PRIVATE)"""
+    coord = np.column_stack(
+        [raw['x'].astype(float), raw['y'].astype(float), raw['z'].astype(float)]
+    )
+    atomname = _decode_str_column(raw['atomname'])
+    resname = _decode_str_column(raw['resname'])
+    # CHARMM names the delta carbon of isoleucine CD instead of CD1
+    for i in np.flatnonzero(
+        (np.char.strip(raw['resname']) == b'ILE') &
+        (np.char.strip(raw['atomname']) == b'CD')
+    ):
+        atomname[i] = 'CD1'
+    resid, icode = _convert_resid(raw['resid'])
+    return {
+        'serial': raw['serial'].astype(np.int64),
+        'resnum': raw['resnum'].astype(np.int64),
+        'resname': resname,
+        'atomname': atomname,
+        'coord': coord,
+        'segid': _decode_str_column(raw['segid']),
+        'resid': resid,
+        'icode': icode,
+        'tempFactor': raw['tempFactor'].astype(float),
+    }
+
+def read_crd_columns(filepath):
+    """Read the atom records of a CRD file into a dictionary of columns.
+    Coordinates are stored as a (N, 3) float array under "coord", "serial",
+    "resnum" and "resid" as int arrays, "tempFactor" as a float array, and the
+    names ("resname", "atomname", "segid") and the insertion codes ("icode")
+    as lists of str.
+
+    Arguments:
+     :filepath: path to the CRD file (can be gzip/bzip2/xz compressed)
+    """
+    with open_decompressed(filepath) as f:
+        lines = f.readlines()
+    i = 0
+    while i < len(lines) and (
+        lines[i].startswith('*') or not lines[i].strip()
+    ):
+        i += 1
+    if i == len(lines):
+        raise ValueError(f'No atom count line found in CRD file: {filepath}')
+    count_line = lines[i]
+    n_atoms = int(count_line.split()[0])
+    is_ext = 'EXT' in count_line.upper()
+    lines = lines[i+1:i+1+n_atoms]
+    if len(lines) != n_atoms:
+        raise ValueError(
+            f'Expected {n_atoms} atoms in CRD file, but found {len(lines)}'
+        )
+    columns = _CRD_EXT_COLUMNS if is_ext else _CRD_COLUMNS
+    try:
+        return _convert_columns(_slice_columns(lines, columns))
+    except (ValueError, UnicodeEncodeError):
+        return _convert_columns(_split_columns(lines))
+
 class CRDParser:
     """Parse a CHARMM CARD coordinate file for topology information.
 
@@ -63,7 +198,7 @@ class CRDParser:
 
         Arguments:
          :structure_id: string, the id that will be used for the structure
-         :filepath: path to mmCIF file, OR an open text mode file handle
+         :filepath: path to CRD file (can be gzip/bzip2/xz compressed)
 
         """
         with warnings.catch_warnings():
@@ -71,66 +206,98 @@ class CRDParser:
                 warnings.filterwarnings(
                     "ignore", category=PDBConstructionWarning
                 )
-            entries = self.create_namedtuples(filepath)
+            columns = read_crd_columns(filepath)
             if structure_id is None:
-                structure_id = filepath.split('/')[-1].split('.')[0]
-            self._build_structure(structure_id, entries)
+                structure_id = get_file_stem(filepath)
+            with gc_paused():
+                self._build_structure(structure_id, columns)
 
         return self._structure_builder.get_structure()
 
     def create_namedtuples(self, filepath):
         """Create a list of namedtuples from the CRD file."""
-        with open(filepath, 'r') as f:
-            lines = [l.rstrip() for l in f.readlines() if not l.startswith('*')]
-        entries = []
-        for l in lines[1:]:
-            entry = l.split()
-            (
-                serial, resnum, resname, atomname, 
-                x, y, z, segid, resid, tempFactor
-            ) = entry
-            coord = np.array([float(x), float(y), float(z)])
-            if resname == 'ILE' and atomname == 'CD':
-                atomname = 'CD1'
-            cur_entry = crd_entry(
-                int(serial), int(resnum), resname, atomname, 
-                coord, segid, int(resid), float(tempFactor)
+        columns = read_crd_columns(filepath)
+        return [
+            crd_entry(*entry) for entry in zip(
+                columns['serial'].tolist(), columns['resnum'].tolist(),
+                columns['resname'], columns['atomname'], columns['coord'],
+                columns['segid'], columns['resid'].tolist(),
+                columns['tempFactor'].tolist()
             )
-            entries.append(cur_entry)
-        return entries
-    
-    def _build_structure(self, structure_id, entries):
+        ]
+
+    @staticmethod
+    def _get_hetero_field(resname):
+        if (
+            resname not in protein_letters_3to1 and
+            resname not in nucleic_letters_3to1
+        ):
+            return 'H'
+        return ' '
+
+    def _build_structure(self, structure_id, columns):
         sb = self._structure_builder
         sb.init_structure(structure_id)
         # Only one model per structure for crd files
         sb.init_model(1)
-        cur_segid = None
-        cur_resid = None
-        cur_resnum = None
-        chain_id_dict = {}
-        for entry in entries:
-            if entry.segid != cur_segid:
-                cur_segid = entry.segid
-                sb.init_seg(cur_segid)
-                chain_id = self.determine_chain_id(len(chain_id_dict))
-                chain_id_dict[chain_id] = cur_segid
-                sb.init_chain(chain_id)
-            if entry.resid != cur_resid or entry.resnum != cur_resnum:
-                cur_resid = entry.resid
-                cur_resnum = entry.resnum
-                if entry.resname not in protein_letters_3to1 and entry.resname not in nucleic_letters_3to1:
-                    field = 'H'
-                elif entry.resname in ('HOH', 'WAT', 'TIP3', 'TIP4'):
-                    field = 'W'
-                else:
-                    field = ' '
-                sb.init_residue(entry.resname, field, cur_resid, ' ')
-            element = all_element_dict.get(entry.atomname)
-            sb.init_atom(
-                entry.atomname, entry.coord, entry.tempFactor,
-                occupancy = 1.0,
-                altloc = ' ',
-                fullname = entry.atomname,
-                serial_number = entry.serial,
-                element = element
-            )
\ No newline at end of file
+        n_atoms = len(columns['serial'])
+        if n_atoms == 0:
+            return
+        segid = np.array(columns['segid'])
+        resid, resnum = columns['resid'], columns['resnum']
+        seg_starts = np.flatnonzero(segid[1:] != segid[:-1]) + 1
+        is_seg_start = np.zeros(n_atoms, dtype=bool)
+        is_seg_start[0] = True
+        is_seg_start[seg_starts] = True
+        is_res_start = is_seg_start.copy()
+        is_res_start[1:] |= (resid[1:] != resid[:-1])
+        is_res_start[1:] |= (resnum[1:] != resnum[:-1])
+        icodes = columns['icode']
+        icode_arr = np.array(icodes)
+        is_res_start[1:] |= (icode_arr[1:] != icode_arr[:-1])
+        res_starts = np.flatnonzero(is_res_start).tolist()
+        res_ends = res_starts[1:] + [n_atoms]
+
+        seg_start_set = set(np.flatnonzero(is_seg_start).tolist())
+        resnames, atomnames = columns['resname'], columns['atomname']
+        seg_list, resid_list = columns['segid'], resid.tolist()
+        serials = columns['serial'].tolist()
+        temp_factors = columns['tempFactor'].tolist()
+        # coord is None for structures without coordinates (e.g. from PSF)
+        coords = columns['coord']
+        if coords is None:
+            coords = [None] * n_atoms
+        n_chains = 0
+        for start, end in zip(res_starts, res_ends):
+            if start in seg_start_set:
+                sb.init_seg(seg_list[start])
+                sb.init_chain(self.determine_chain_id(n_chains))
+                n_chains += 1
+            resname = resnames[start]
+            sb.init_residue(
+                resname, self._get_hetero_field(resname),
+                resid_list[start], icodes[start]
+            )
+            residue = sb.residue
+            # The atoms are attached directly instead of through Residue.add
+            # when their names are unique in the residue, which is the case
+            # for any valid CRD file. Otherwise, Residue.add raises on the
+            # duplicated atom.
+            names = atomnames[start:end]
+            is_unique = len(set(names)) == len(names)
+            for i in range(start, end):
+                atomname = atomnames[i]
+                atom = Atom(
+                    atomname, coords[i], temp_factors[i],
+                    occupancy = 1.0,
+                    altloc = ' ',
+                    fullname = atomname,
+                    serial_number = serials[i],
+                    element = all_element_dict.get(atomname)
+                )
+                if not is_unique:
+                    residue.add(atom)
+                    continue
+                atom.parent = residue
+                residue.child_list.append(atom)
+                residue.child_dict[atomname] = atom
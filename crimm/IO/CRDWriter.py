@@ -0,0 +1,183 @@
+"""Writer for crimm entities in CHARMM CARD coordinate (CRD) format. The
+extended (EXT) format is used automatically when the system has 100000 atoms
+or more, or when any of the names or coordinates do not fit in the columns of
+the standard format. The file can be read by CHARMM with "read coor card" and
+by CRDParser."""
+import numpy as np
+from Bio.File import as_handle
+
+_CRD_FORMAT_STRING = "%5d%5d %-4s %-4s%10.5f%10.5f%10.5f %-4s %-4s%10.5f\n"
+_CRD_EXT_FORMAT_STRING = (
+    "%10d%10d  %-8s  %-8s%20.10f%20.10f%20.10f  %-8s  %-8s%20.10f\n"
+)
+# Limits of the standard format from CHARMM (coorio.F90)
+_MAX_STD_ATOMS = 100000
+_MAX_STD_NAME_LEN = 4
+# Range of the values that fit in the %10.5f fields (after rounding)
+_MAX_STD_COORD = 9999.999995
+_MIN_STD_COORD = -999.999995
+_WATER_RESNAMES = ('HOH', 'WAT', 'TIP3')
+_CHARMM_WATER_RESNAME = 'TIP3'
+
+def _get_chains(entity):
+    """Return the list of chains in the entity (PRIVATE). For structures, only
+    the first model is written."""
+    if entity.level == 'S':
+        entity = entity.child_list[0]
+    if entity.level == 'M':
+        return entity.child_list
+    if entity.level == 'C':
+        return [entity]
+    raise TypeError(
+        f'Only Structure, Model or Chain can be written, not {entity}'
+    )
+
+def _get_segid(residue, chain):
+    """Return the segid of the residue, or the chain id if the segid is blank
+    (PRIVATE)"""
+    segid = residue.segid.strip() if residue.segid else ''
+    return segid if segid else chain.id
+
+def _get_resid(residue):
+    """Return the CHARMM resid (residue sequence number and insertion code)
+    (PRIVATE)"""
+    _, resseq, icode = residue.id
+    return f'{resseq}{icode.strip()}'
+
+def _get_charmm_resname(residue):
+    """Return the CHARMM residue name (PRIVATE). The name of the topology
+    definition is used if it is loaded, and waters are named TIP3."""
+    if residue.topo_definition is not None:
+        return residue.topo_definition.resname
+    if residue.resname in _WATER_RESNAMES:
+        return _CHARMM_WATER_RESNAME
+    return residue.resname
+
+def _get_residue_atoms(residue):
+    """Return the atoms of the residue (PRIVATE). If the topology definition is
+    loaded, the atoms are ordered by the atom groups of the definition, which
+    is the order CHARMM generates the atoms in. The atoms not in the groups
+    follow in their original order."""
+    atoms = list(residue.get_atoms())
+    if not residue.atom_groups:
+        return atoms
+    # group atoms are matched by name, since the missing atoms in the groups
+    # are replaced when they are built
+    atoms_by_name = {atom.name: atom for atom in atoms}
+    ordered = []
+    for group in residue.atom_groups:
+        for group_atom in group:
+            atom = atoms_by_name.pop(group_atom.name, None)
+            if atom is not None:
+                ordered.append(atom)
+    ordered.extend(atoms_by_name.values())
+    return ordered
+
+def get_crd_columns(entity):
+    """Get the columns of the CRD atom records of an entity. Return a dict with
+    the (N, 3) coordinate array under "coord", the lists of "resnum",
+    "resname", "atomname", "segid" and "resid", and the array of "weight" (B
+    factors). Only the selected altloc of the disordered atoms is included.
+    Raise ValueError if any atom has no coordinates.
+    Residues with topology definitions are named and ordered as in CHARMM, so
+    the atoms are in the same order as the PSF from write_psf.
+    """
+    resnum, resname, atomname, segid, resid, weight = [], [], [], [], [], []
+    coords = []
+    res_count = 0
+    for chain in _get_chains(entity):
+        for residue in chain:
+            res_count += 1
+            cur_resname = _get_charmm_resname(residue)
+            cur_segid = _get_segid(residue, chain)
+            cur_resid = _get_resid(residue)
+            for atom in _get_residue_atoms(residue):
+                if atom.coord is None:
+                    raise ValueError(
+                        f'Atom {atom.name} of {residue} in {chain} has no '
+                        'coordinates. Build the missing atoms (e.g. with '
+                        'fix_chain) before writing the CRD.'
+                    )
+                resnum.append(res_count)
+                resname.append(cur_resname)
+                atomname.append(atom.name)
+                segid.append(cur_segid)
+                resid.append(cur_resid)
+                weight.append(atom.bfactor)
+                coords.append(atom.coord)
+    return {
+        'coord': np.array(coords, dtype=float).reshape(-1, 3),
+        'resnum': resnum,
+        'resname': resname,
+        'atomname': atomname,
+        'segid': segid,
+        'resid': resid,
+        'weight': np.array(weight, dtype=float),
+    }
+
+def _needs_ext_format(columns):
+    """Return True if the records do not fit in the standard format
+    (PRIVATE)"""
+    if len(columns['resnum']) >= _MAX_STD_ATOMS:
+        return True
+    for key in ('resname', 'atomname', 'segid', 'resid'):
+        if any(len(name) > _MAX_STD_NAME_LEN for name in set(columns[key])):
+            return True
+    for values in (columns['coord'], columns['weight']):
+        if values.size and (
+            values.max() >= _MAX_STD_COORD or values.min() <= _MIN_STD_COORD
+        ):
+            return True
+    return False
+
+def iter_crd_lines(entity, title=None, ext=None):
+    """Iterate over the lines of the CRD file of an entity.
+
+    Arguments:
+     :entity: Structure, Model or Chain. Only the first model of a structure
+              is written.
+     :title: title lines (str or list of str) written after "*". Default is
+             the id of the entity.
+     :ext: if True, write in the extended format. If None, the extended format
+           is only used when required.
+    """
+    columns = get_crd_columns(entity)
+    n_atoms = len(columns['resnum'])
+    if ext is None:
+        ext = _needs_ext_format(columns)
+    if title is None:
+        title = [f'{entity.get_id()}']
+    elif isinstance(title, str):
+        title = title.splitlines()
+    for line in title:
+        yield f'* {line}\n'
+    yield '*\n'
+    if ext:
+        yield f'{n_atoms:10d}  EXT\n'
+        format_string = _CRD_EXT_FORMAT_STRING
+    else:
+        yield f'{n_atoms:5d}\n'
+        format_string = _CRD_FORMAT_STRING
+    coords = columns['coord'].tolist()
+    for i, (x, y, z), resnum, resname, atomname, segid, resid, weight in zip(
+        range(1, n_atoms+1), coords, columns['resnum'], columns['resname'],
+        columns['atomname'], columns['segid'], columns['resid'],
+        columns['weight'].tolist()
+    ):
+        yield format_string % (
+            i, resnum, resname, atomname, x, y, z, segid, resid, weight
+        )
+
+def get_crd_str(entity, title=None, ext=None):
+    """Get the CRD format string of an entity (see iter_crd_lines)."""
+    return ''.join(iter_crd_lines(entity, title=title, ext=ext))
+
+def write_crd(entity, file, title=None, ext=None):
+    """Write an entity to a CRD file (see iter_crd_lines).
+
+    Arguments:
+     :entity: Structure, Model or Chain
+     :file: file path or an open text mode file handle
+    """
+    with as_handle(file, 'w') as handle:
+        handle.writelines(iter_crd_lines(entity, title=title, ext=ext))
@@ -0,0 +1,44 @@
+"""Helper functions to read gzip, bzip2 and xz compressed structure files.
+The compression is detected from the magic bytes of the file, and the files
+are decompressed as streams without inflating to a temporary file."""
+import os
+import gzip
+import bz2
+import lzma
+import pathlib
+
+# magic bytes at the start of the compressed files
+_COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma),
+)
+COMPRESSION_SUFFIXES = ('.gz', '.bz2', '.xz')
+
+def get_compression_module(filepath):
+    """Return the module (gzip, bz2 or lzma) to decompress the file with, or
+    None if the file is not a path or not compressed."""
+    if not isinstance(filepath, (str, os.PathLike)):
+        return None
+    with open(filepath, 'rb') as f:
+        magic = f.read(6)
+    for magic_bytes, module in _COMPRESSION_MAGIC:
+        if magic.startswith(magic_bytes):
+            return module
+    return None
+
+def open_decompressed(filepath, mode='rt'):
+    """Open a file that may be compressed. The content is decompressed as it
+    is read. Plain files are opened as is."""
+    module = get_compression_module(filepath)
+    if module is None:
+        return open(filepath, mode)
+    return module.open(filepath, mode)
+
+def get_file_stem(filepath):
+    """Return the file name without the directory, the compression suffix, and
+    the file extension (e.g. "1aka" for "1aka.cif.gz")."""
+    path = pathlib.Path(filepath)
+    if path.suffix in COMPRESSION_SUFFIXES:
+        path = path.with_suffix('')
+    return path.stem
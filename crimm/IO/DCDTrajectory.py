@@ -0,0 +1,355 @@
+"""Reader for CHARMM/NAMD DCD trajectories. The frames are memory-mapped from
+the file, so only the frames (and the atoms) that are accessed are read from
+the disk, and the atom coordinates of the model are not modified unless a frame
+is applied explicitly. The atoms of the trajectory are mapped onto a crimm
+entity in the same order as the PSF from write_psf.
+"""
+import struct
+import numpy as np
+from crimm.IO.CRDWriter import _get_chains, _get_residue_atoms
+from crimm.StructEntities.CoordBuffer import set_atom_coords
+
+_DCD_MAGIC = b'CORD'
+# size of the first record in the header (magic + 20 ICNTRL integers)
+_DCD_HEADER_RECORD_SIZE = 84
+# indices of the ICNTRL header entries (see CHARMM dynio.F90)
+_ICNTRL_NFILE = 0
+_ICNTRL_NPRIV = 1
+_ICNTRL_NSAVC = 2
+_ICNTRL_NSTEP = 3
+_ICNTRL_NFIXED = 8
+_ICNTRL_DELTA = 9
+_ICNTRL_QCRYS = 10
+_ICNTRL_QDIM4 = 11
+_ICNTRL_VERSION = 19
+
+def _read_fortran_record(f, endian):
+    """Read an unformatted Fortran record with 4-byte length markers
+    (PRIVATE)"""
+    head = f.read(4)
+    if len(head) < 4:
+        raise ValueError('Unexpected end of DCD file in the header')
+    (size,) = struct.unpack(endian + 'i', head)
+    data = f.read(size)
+    tail = f.read(4)
+    if len(data) < size or struct.unpack(endian + 'i', tail)[0] != size:
+        raise ValueError('Invalid record markers in the DCD header')
+    return data
+
+def _get_frame_dtype(endian, n_atoms, has_cell, has_4d):
+    """Return the numpy structured dtype of a frame record (PRIVATE). Each
+    block (unit cell, x, y, z and w) is enclosed in its own record markers."""
+    marker = endian + 'i4'
+    fields = []
+    if has_cell:
+        fields += [
+            ('_cell_head', marker), ('cell', endian + 'f8', (6,)),
+            ('_cell_tail', marker)
+        ]
+    for axis in ('x', 'y', 'z', 'w') if has_4d else ('x', 'y', 'z'):
+        fields += [
+            (f'_{axis}_head', marker), (axis, endian + 'f4', (n_atoms,)),
+            (f'_{axis}_tail', marker)
+        ]
+    return np.dtype(fields)
+
+def _read_field(records, field, frame_indices, atom_indices):
+    """Read the (n_frames, n_atoms) array of a coordinate field of the frame
+    records (PRIVATE). The field view of the memmap is indexed by the frames
+    and atoms together, so only the requested values are read instead of the
+    full frame records."""
+    values = records[field]
+    if isinstance(atom_indices, slice):
+        return values[frame_indices, atom_indices]
+    return values[np.ix_(frame_indices, atom_indices)]
+
+class DCDTrajectory:
+    """Memory-mapped DCD trajectory (CHARMM and NAMD formats, both byte
+    orders, and fixed atoms).
+
+    Frames are accessed by index or slice as (n_atoms, 3) or
+    (n_frames, n_atoms, 3) float32 arrays, and only the requested frames are
+    read from the file. If a crimm entity is attached, the coordinates can be
+    selected by the atoms of the entity, and a frame can be applied to the
+    atom coordinates with apply_frame.
+
+    Arguments:
+     :filepath: path to the DCD file
+     :entity: Structure, Model or Chain whose atoms are in the same order as
+              the trajectory (i.e. the PSF from write_psf). Only the first
+              model of a structure is used.
+    """
+    def __init__(self, filepath, entity=None):
+        self.filepath = filepath
+        self.title = []
+        self.n_atoms = 0
+        self.n_fixed = 0
+        self.istart = 0
+        self.nsavc = 0
+        self.delta = 0.0
+        self.has_cell = False
+        self.has_4d = False
+        self.free_indices = None
+        self.atoms = None
+        self._atom_index = None
+        self._first_frame = None
+        self._frames = None
+        self._n_frames = 0
+        self._read_header()
+        if entity is not None:
+            self.attach(entity)
+
+    def __len__(self):
+        return self._n_frames
+
+    def __repr__(self):
+        return (
+            f"<DCDTrajectory Frames={len(self)} Atoms={self.n_atoms}>"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memory-mapped file"""
+        self._first_frame = None
+        self._frames = None
+        self._n_frames = 0
+
+    def _read_header(self):
+        """Read the header and memory-map the frames (PRIVATE)"""
+        with open(self.filepath, 'rb') as f:
+            head = f.read(8)
+            for endian in ('<', '>'):
+                size = struct.unpack(endian + 'i', head[:4])[0]
+                if size == _DCD_HEADER_RECORD_SIZE and head[4:] == _DCD_MAGIC:
+                    break
+            else:
+                raise ValueError(f'Not a DCD file: {self.filepath}')
+            f.seek(0)
+            record = _read_fortran_record(f, endian)
+            icntrl = np.frombuffer(record[4:], dtype=endian + 'i4')
+            is_charmm = icntrl[_ICNTRL_VERSION] != 0
+            self.istart = int(icntrl[_ICNTRL_NPRIV])
+            self.nsavc = int(icntrl[_ICNTRL_NSAVC])
+            self.n_fixed = int(icntrl[_ICNTRL_NFIXED])
+            delta_bytes = record[4+4*_ICNTRL_DELTA:8+4*_ICNTRL_DELTA]
+            if is_charmm:
+                self.delta = struct.unpack(endian + 'f', delta_bytes)[0]
+                self.has_cell = bool(icntrl[_ICNTRL_QCRYS])
+                self.has_4d = bool(icntrl[_ICNTRL_QDIM4])
+            else:
+                # X-PLOR format stores delta as a double across two entries
+                delta_bytes = record[4+4*_ICNTRL_DELTA:12+4*_ICNTRL_DELTA]
+                self.delta = struct.unpack(endian + 'd', delta_bytes)[0]
+
+            record = _read_fortran_record(f, endian)
+            n_title = struct.unpack(endian + 'i', record[:4])[0]
+            self.title = [
+                record[4+80*i:84+80*i].decode('ascii', 'replace').rstrip()
+                for i in range(n_title)
+            ]
+            record = _read_fortran_record(f, endian)
+            self.n_atoms = struct.unpack(endian + 'i', record[:4])[0]
+            if self.n_fixed > 0:
+                record = _read_fortran_record(f, endian)
+                # 1-based indices of the free atoms
+                self.free_indices = np.frombuffer(
+                    record, dtype=endian + 'i4'
+                ).astype(np.int64) - 1
+            offset = f.tell()
+            f.seek(0, 2)
+            file_size = f.tell()
+
+        first_dtype = _get_frame_dtype(
+            endian, self.n_atoms, self.has_cell, self.has_4d
+        )
+        n_free = self.n_atoms - self.n_fixed
+        frame_dtype = _get_frame_dtype(
+            endian, n_free, self.has_cell, self.has_4d
+        )
+        if file_size - offset < first_dtype.itemsize:
+            return
+        # The number of frames is determined by the file size, since the
+        # header is not updated if the simulation was interrupted.
+        n_rest = (file_size - offset - first_dtype.itemsize) // (
+            frame_dtype.itemsize
+        )
+        self._n_frames = 1 + n_rest
+        if self.n_fixed > 0:
+            # Only the first frame has the coordinates of the fixed atoms
+            self._first_frame = np.memmap(
+                self.filepath, dtype=first_dtype, mode='r', offset=offset,
+                shape=(1,)
+            )
+            if n_rest > 0:
+                self._frames = np.memmap(
+                    self.filepath, dtype=frame_dtype, mode='r',
+                    offset=offset+first_dtype.itemsize, shape=(n_rest,)
+                )
+        else:
+            self._frames = np.memmap(
+                self.filepath, dtype=frame_dtype, mode='r', offset=offset,
+                shape=(self._n_frames,)
+            )
+
+    def attach(self, entity):
+        """Map the atoms of the trajectory onto the atoms of a crimm entity.
+        The atoms are taken in the same order as the PSF from write_psf."""
+        atoms = [
+            atom for chain in _get_chains(entity)
+            for residue in chain for atom in _get_residue_atoms(residue)
+        ]
+        if len(atoms) != self.n_atoms:
+            raise ValueError(
+                f'Number of atoms in {entity} ({len(atoms)}) does not match '
+                f'the trajectory ({self.n_atoms})'
+            )
+        self.atoms = atoms
+        self._atom_index = {id(atom): i for i, atom in enumerate(atoms)}
+
+    def get_atom_indices(self, atoms):
+        """Return the trajectory indices of the atoms from the attached
+        entity."""
+        if self._atom_index is None:
+            raise ValueError(
+                'No entity attached to the trajectory! Use attach() first.'
+            )
+        try:
+            return np.array(
+                [self._atom_index[id(atom)] for atom in atoms], dtype=np.int64
+            )
+        except KeyError as exc:
+            raise ValueError(
+                'Atoms are not in the entity attached to the trajectory'
+            ) from exc
+
+    def _get_frame_indices(self, key):
+        """Convert an index, slice or sequence of frames to an array of frame
+        indices (PRIVATE)"""
+        return np.arange(self._n_frames)[key]
+
+    def _read_frames(self, frame_indices, atom_indices):
+        """Read the coordinates of the frames as a (n_frames, n_atoms, 3)
+        array (PRIVATE)"""
+        if self._n_frames == 0:
+            raise IndexError('The trajectory has no frames')
+        axes = ('x', 'y', 'z')
+        if atom_indices is None:
+            atom_indices = slice(None)
+        if self.n_fixed == 0:
+            return np.stack(
+                [
+                    _read_field(self._frames, axis, frame_indices, atom_indices)
+                    for axis in axes
+                ],
+                axis=-1
+            )
+
+        first = np.stack(
+            [self._first_frame[axis][0, atom_indices] for axis in axes],
+            axis=-1
+        )
+        coords = np.repeat(first[np.newaxis], len(frame_indices), axis=0)
+        # position of each selected atom in the free atom records
+        free_pos = np.full(self.n_atoms, -1, dtype=np.int64)
+        free_pos[self.free_indices] = np.arange(len(self.free_indices))
+        free_pos = free_pos[atom_indices]
+        is_free = free_pos >= 0
+        is_later = frame_indices > 0
+        if is_later.any() and is_free.any():
+            later_indices = frame_indices[is_later] - 1
+            later_coords = coords[is_later]
+            later_coords[:, is_free] = np.stack(
+                [
+                    _read_field(
+                        self._frames, axis, later_indices, free_pos[is_free]
+                    )
+                    for axis in axes
+                ],
+                axis=-1
+            )
+            coords[is_later] = later_coords
+        return coords
+
+    def get_coords(self, key, atoms=None):
+        """Return the coordinates of the frames. An int index returns an
+        (n_atoms, 3) array, and a slice or a sequence of indices returns an
+        (n_frames, n_atoms, 3) array.
+
+        Arguments:
+         :key: frame index, slice or sequence of frame indices
+         :atoms: atoms from the attached entity to select (default: all atoms)
+        """
+        atom_indices = None
+        if atoms is not None:
+            atom_indices = self.get_atom_indices(atoms)
+        frame_indices = self._get_frame_indices(key)
+        if np.ndim(frame_indices) == 0:
+            return self._read_frames(
+                np.array([frame_indices]), atom_indices
+            )[0]
+        return self._read_frames(frame_indices, atom_indices)
+
+    def __getitem__(self, key):
+        return self.get_coords(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_coords(i)
+
+    def iter_blocks(self, block_size, start=0, stop=None, step=1, atoms=None):
+        """Yield the (frame indices, coordinates) of blocks of block_size
+        frames, where the coordinates are (n_frames, n_atoms, 3) arrays.
+
+        Arguments:
+         :block_size: number of frames in each block
+         :start, stop, step: range of the frames (same as slicing)
+         :atoms: atoms from the attached entity to select (default: all atoms)
+        """
+        atom_indices = None
+        if atoms is not None:
+            atom_indices = self.get_atom_indices(atoms)
+        frame_indices = self._get_frame_indices(slice(start, stop, step))
+        for i in range(0, len(frame_indices), block_size):
+            block = frame_indices[i:i+block_size]
+            yield block, self._read_frames(block, atom_indices)
+
+    def get_unit_cells(self, key=slice(None)):
+        """Return the unit cell dimensions (a, b, c, alpha, beta, gamma) of the
+        frames in Angstrom and degrees, or None if the trajectory has no unit
+        cell."""
+        if not self.has_cell:
+            return None
+        frame_indices = self._get_frame_indices(key)
+        is_single = np.ndim(frame_indices) == 0
+        frame_indices = np.atleast_1d(frame_indices)
+        if self.n_fixed == 0:
+            cells = self._frames['cell'][frame_indices]
+        else:
+            cells = np.empty((len(frame_indices), 6))
+            is_later = frame_indices > 0
+            cells[~is_later] = self._first_frame['cell'][0]
+            if is_later.any():
+                cells[is_later] = self._frames['cell'][
+                    frame_indices[is_later] - 1
+                ]
+        # CHARMM order: a, gamma, b, beta, alpha, c
+        cells = np.asarray(cells, dtype=float)[:, [0, 2, 5, 4, 3, 1]]
+        angles = cells[:, 3:]
+        # newer CHARMM and NAMD versions store the cosines of the angles
+        if np.all(np.abs(angles) <= 1.0):
+            cells[:, 3:] = np.degrees(np.arccos(angles))
+        return cells[0] if is_single else cells
+
+    def apply_frame(self, index):
+        """Set the coordinates of the atoms of the attached entity to the
+        frame."""
+        if self.atoms is None:
+            raise ValueError(
+                'No entity attached to the trajectory! Use attach() first.'
+            )
+        set_atom_coords(self.atoms, self.get_coords(index))
@@ -1,13 +1,425 @@
+import re
+import os
+import sys
+import mmap
+import copyreg
+import itertools
 from collections import namedtuple
+from collections.abc import KeysView
 import numpy
-from Bio.PDB.MMCIF2Dict import MMCIF2Dict as _MMCIF2Dict
+from Bio.File import as_handle
+from crimm.IO.CompressedFile import get_compression_module
+
+# Data types of the numeric columns in the coordinate categories. These
+# columns are decoded in bulk into numpy arrays (masked arrays if any value is
+# missing), and the remaining columns of these categories are kept as interned
+# strings.
+_COLUMN_DTYPES = {
+    'atom_site': {
+        'id': numpy.int32,
+        'label_entity_id': numpy.int32,
+        'label_seq_id': numpy.int32,
+        'auth_seq_id': numpy.int32,
+        'pdbx_PDB_model_num': numpy.int32,
+        'pdbx_formal_charge': numpy.int32,
+        'Cartn_x': numpy.float32,
+        'Cartn_y': numpy.float32,
+        'Cartn_z': numpy.float32,
+        'occupancy': numpy.float32,
+        'B_iso_or_equiv': numpy.float32,
+    },
+    'atom_site_anisotrop': {
+        'id': numpy.int32,
+        'pdbx_label_seq_id': numpy.int32,
+        'pdbx_auth_seq_id': numpy.int32,
+        'U11': numpy.float32,
+        'U12': numpy.float32,
+        'U13': numpy.float32,
+        'U22': numpy.float32,
+        'U23': numpy.float32,
+        'U33': numpy.float32,
+    },
+}
+
+_MISSING_VALUES = ('?', '.')
+
+# mmCIF tokens are either single/double quoted strings (a quote only closes
+# when followed by whitespace), or any run of non-whitespace characters
+_TOKEN_RE = re.compile(
+    r"""'(.*?)'(?=[ \t]|$)|"(.*?)"(?=[ \t]|$)|([^ \t]+)"""
+)
+
+def _split_line(line):
+    """Split a line of mmCIF into tokens (PRIVATE). Comments are skipped."""
+    line = line.strip()
+    if "'" not in line and '"' not in line and '#' not in line:
+        # fast path for the vast majority of the lines (e.g. atom_site)
+        return line.split()
+    tokens = []
+    for single_quoted, double_quoted, bare in _TOKEN_RE.findall(line):
+        if bare:
+            if bare.startswith('#'):
+                break
+            tokens.append(bare)
+        else:
+            tokens.append(single_quoted or double_quoted)
+    return tokens
+
+# Lines that may start a new category block: loop_ and data_ directives, tags,
+# and the delimiters of semicolon text fields. Matching on the preceding
+# newline (instead of "^" in multiline mode) lets the regex engine skip to the
+# next line break directly, which is much faster on large loops.
+_BLOCK_START_RE = re.compile(rb'\n((?i:loop_)|data_\S*|_[^\s.]+|;)')
+_FIRST_BLOCK_START_RE = re.compile(rb'((?i:loop_)|data_\S*|_[^\s.]+|;)')
+
+def scan_category_blocks(data):
+    """Scan the raw bytes (or mmap) of mmCIF data for the category blocks
+    without tokenizing their content. Return the name of the data block and a
+    dictionary of the (start, end) byte offsets of the blocks keyed by the
+    category names as they appear in the file (e.g. "_atom_site")."""
+    data_name = None
+    block_dict = {}
+    cur_category = None
+    cur_start = None
+    in_loop_header = False
+    in_text_field = False
+
+    def commit_block(end):
+        if cur_category is not None:
+            block_dict.setdefault(cur_category, []).append((cur_start, end))
+
+    first_match = _FIRST_BLOCK_START_RE.match(data)
+    matches = _BLOCK_START_RE.finditer(data)
+    if first_match is not None:
+        matches = itertools.chain((first_match,), matches)
+    for match in matches:
+        token = match.group(1)
+        start = match.start(1)
+        if token == b';':
+            in_text_field = not in_text_field
+            continue
+        if in_text_field:
+            continue
+        if token.lower() == b'loop_':
+            commit_block(start)
+            cur_category, cur_start = None, start
+            in_loop_header = True
+        elif token.startswith(b'data_'):
+            commit_block(start)
+            cur_category = None
+            if data_name is None:
+                data_name = token[5:].decode()
+        elif in_loop_header:
+            # the first tag of a loop_ names the category of the block
+            cur_category = token.decode()
+            in_loop_header = False
+        elif token.decode() != cur_category:
+            commit_block(start)
+            cur_category, cur_start = token.decode(), start
+    commit_block(len(data))
+    return data_name, block_dict
+
+def _read_text_field(first_line, lines):
+    """Return the content of a semicolon-delimited text field and the
+    remainder of the closing line (PRIVATE)."""
+    token_buffer = [first_line[1:].rstrip()]
+    for line in lines:
+        line = line.rstrip()
+        if line.startswith(';'):
+            return '\n'.join(token_buffer), line[1:]
+        token_buffer.append(line)
+    raise ValueError("Missing closing semicolon")
+
+def tokenize_lines(lines):
+    """Yield the tokens from lines of mmCIF text as one list per line."""
+    lines = iter(lines)
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        if line.startswith(';'):
+            token, line = _read_text_field(line, lines)
+            yield [token]
+        tokens = _split_line(line)
+        if tokens:
+            yield tokens
+
+def parse_tokens(token_lines):
+    """Parse the tokenized mmCIF lines. Return the name of the data block and
+    a dictionary of the raw (str) tokens keyed by the mmCIF tags. Values from
+    a loop_ are stored as columns."""
+    raw_dict = {}
+    data_name = None
+    pending_key = None
+    loop_keys = None
+    loop_values = None
+
+    def commit_loop():
+        n_cols = len(loop_keys)
+        for i, key in enumerate(loop_keys):
+            raw_dict[key] = loop_values[i::n_cols]
+
+    for tokens in token_lines:
+        if loop_values is not None:
+            first = tokens[0]
+            if not (
+                (first.startswith('_') and len(loop_values) % len(loop_keys) == 0)
+                or first.lower() == 'loop_'
+            ):
+                # fast path for the lines in the body of a loop_
+                loop_values.extend(tokens)
+                continue
+        for token in tokens:
+            if loop_values is not None:
+                # The second condition checks we are in the first column
+                # Some mmCIF files (e.g. 4q9r) have values in later columns
+                # starting with an underscore and we don't want to read
+                # these as keys
+                is_new_key = (
+                    token.startswith('_') and
+                    len(loop_values) % len(loop_keys) == 0
+                )
+                if not (is_new_key or token.lower() == 'loop_'):
+                    loop_values.append(token)
+                    continue
+                commit_loop()
+                loop_keys, loop_values = None, None
+            elif loop_keys is not None:
+                if token.startswith('_'):
+                    loop_keys.append(token)
+                    continue
+                loop_values = [token]
+                continue
+
+            if token.lower() == 'loop_':
+                loop_keys = []
+            elif pending_key is not None:
+                raw_dict[pending_key] = [token]
+                pending_key = None
+            elif data_name is None and token.startswith('data_'):
+                data_name = token[5:]
+            else:
+                pending_key = token
+
+    if loop_values is not None:
+        commit_loop()
+    elif loop_keys:
+        # loop_ without any values
+        for key in loop_keys:
+            raw_dict[key] = []
+    return data_name, raw_dict
+
+def _to_str_column(values):
+    """Intern the string values of a column and replace missing values with
+    None (PRIVATE)."""
+    values = list(map(sys.intern, values))
+    if '?' in values or '.' in values:
+        values = [None if x in _MISSING_VALUES else x for x in values]
+    return values
+
+def _to_array_column(values, dtype):
+    """Convert the string values of a column to a numpy array of dtype in bulk
+    (PRIVATE). Missing values are masked. Raise ValueError if any value can not
+    be converted."""
+    # python's float() and int() are much faster than numpy's str casting
+    converter = float if numpy.issubdtype(dtype, numpy.floating) else int
+    missing = None
+    if '?' in values or '.' in values:
+        missing = numpy.fromiter(
+            (x in _MISSING_VALUES for x in values), bool, count=len(values)
+        )
+        values = ['0' if x in _MISSING_VALUES else x for x in values]
+    arr = numpy.fromiter(map(converter, values), dtype, count=len(values))
+    if missing is not None:
+        return numpy.ma.MaskedArray(arr, mask=missing)
+    return arr
 
 class MMCIF2Dict(dict):
-    """A dictionary-like object that reads a mmCIF file and stores the data in a dictionary."""
-    def __init__(self, filename):
-        orig_dict = _MMCIF2Dict(filename)
-        self._organize_mmcif_dict(orig_dict)
- 
+    """A dictionary-like object that reads a mmCIF file and stores the data in a dictionary.
+    The values of each category are stored as columns keyed by the category and
+    the item names (e.g. cifdict['atom_site']['Cartn_x']). The numeric columns in
+    "atom_site" and "atom_site_anisotrop" are numpy arrays, and the label columns
+    are lists of interned strings.
+
+    If lazy is True, only the byte offsets of the category blocks are recorded
+    when the file is read, and each category is decoded when it is first
+    accessed. The file has to remain readable until all the needed categories
+    are decoded if a file path is given. The undecoded categories are listed
+    as keys, and the methods that return all values (e.g. values, items, copy
+    and pickling) decode the remaining categories first.
+
+    gzip, bzip2 and xz compressed files are decompressed as they are read. In
+    lazy mode, the decompressed content is kept in memory instead of being
+    memory-mapped.
+    """
+    def __init__(self, filename, lazy=False):
+        # byte offsets of the category blocks that are not yet decoded
+        self._lazy_blocks = {}
+        self._filepath = None
+        self._data = None
+        compression = get_compression_module(filename)
+        if compression is not None:
+            with compression.open(filename, 'rb' if lazy else 'rt') as handle:
+                if lazy:
+                    data_name = self._scan_file(handle)
+                else:
+                    data_name, raw_dict = parse_tokens(tokenize_lines(handle))
+        elif lazy:
+            data_name = self._scan_file(filename)
+        else:
+            with as_handle(filename) as handle:
+                data_name, raw_dict = parse_tokens(tokenize_lines(handle))
+        if data_name is None:
+            raise ValueError(
+                "The input mmCIF file must begin with a 'data_' directive."
+            )
+        dict.__setitem__(self, 'data', data_name)
+        if not lazy:
+            self._organize_mmcif_dict(raw_dict)
+
+    def _scan_file(self, filename):
+        """Record the byte offsets of the category blocks in the file. The
+        undecoded categories are not stored in the dict until they are
+        accessed."""
+        if isinstance(filename, (str, os.PathLike)):
+            self._filepath = filename
+            with open(filename, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise ValueError("Empty file.")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    data_name, block_dict = scan_category_blocks(data)
+        else:
+            # a file handle can not be reopened, so its content is kept
+            self._data = filename.read()
+            if isinstance(self._data, str):
+                self._data = self._data.encode()
+            data_name, block_dict = scan_category_blocks(self._data)
+
+        for category, offsets in block_dict.items():
+            key = self._format_key(category)
+            self._lazy_blocks[key] = offsets
+        return data_name
+
+    def _read_block(self, start, end):
+        """Read the text of a category block from its byte offsets"""
+        if self._data is not None:
+            return self._data[start:end].decode()
+        with open(self._filepath, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode()
+
+    def _decode_category(self, key):
+        """Decode a category from its recorded block(s) of the file"""
+        offsets = self._lazy_blocks.pop(key)
+        dict.__setitem__(self, key, dict())
+        for start, end in offsets:
+            text = self._read_block(start, end)
+            _, raw_dict = parse_tokens(tokenize_lines(text.splitlines()))
+            self._organize_mmcif_dict(raw_dict)
+        if not self._lazy_blocks:
+            # all categories are decoded, release the file content
+            self._data = None
+        return dict.__getitem__(self, key)
+
+    def decode_all(self):
+        """Decode all the categories that have not been accessed yet."""
+        for key in list(self._lazy_blocks):
+            self._decode_category(key)
+
+    def __getitem__(self, key):
+        if key in self._lazy_blocks:
+            return self._decode_category(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._lazy_blocks.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self._lazy_blocks.pop(key, None) is None:
+            dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        return key in self._lazy_blocks or dict.__contains__(self, key)
+
+    def __iter__(self):
+        yield from dict.__iter__(self)
+        # decoding while iterating adds the key to the dict
+        yield from list(self._lazy_blocks)
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._lazy_blocks)
+
+    def __eq__(self, other):
+        self.decode_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self.decode_all()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # the categories are restored with the attributes in __setstate__,
+        # since __setitem__ needs the attributes to be set first
+        self.decode_all()
+        return (
+            copyreg.__newobj__, (self.__class__,),
+            (self.__dict__.copy(), dict.copy(self))
+        )
+
+    def __setstate__(self, state):
+        attrs, categories = state
+        self.__dict__.update(attrs)
+        dict.update(self, categories)
+
+    def keys(self):
+        return KeysView(self)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        self.decode_all()
+        return dict.values(self)
+
+    def items(self):
+        self.decode_all()
+        return dict.items(self)
+
+    def pop(self, key, *default):
+        if key in self._lazy_blocks:
+            self._decode_category(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self.decode_all()
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        for key in other:
+            self._lazy_blocks.pop(key, None)
+        dict.update(self, other)
+
+    def setdefault(self, key, default=None):
+        if key in self._lazy_blocks:
+            return self._decode_category(key)
+        return dict.setdefault(self, key, default)
+
+    def copy(self):
+        """Return a shallow copy as a dict with all categories decoded."""
+        self.decode_all()
+        return dict.copy(self)
+
+    def clear(self):
+        self._lazy_blocks.clear()
+        self._data = None
+        dict.clear(self)
+
     def _convert_type(self, entry: str):
         sign = -1 if entry[0] == '-' else 1
         entry = entry.lstrip('-')
@@ -18,37 +430,53 @@ class MMCIF2Dict(dict):
             if a.isnumeric() and b.isnumeric():
                 return sign*float(entry)
         return entry
-    
+
     def _reformat_str(self, entry: str):
         if entry in ('?','.'):
             return None
         elif '\n' in entry:
             return ''.join(entry.split('\n'))
         return self._convert_type(entry)
-    
-    def _organize_mmcif_dict(self, orig_dict):
-        for k, v in orig_dict.items():
-            k = k.strip('_')
-            if isinstance(v, list):
-                v = [self._reformat_str(x) for x in v]
-            if '[' in k:
-                k = ''.join([s.replace(']','') for s in k.split('[')])
-            if '-' in k:
-                k = '_'.join([s for s in k.split('-')])
+
+    @staticmethod
+    def _format_key(k):
+        k = k.strip('_')
+        if '[' in k:
+            k = ''.join([s.replace(']','') for s in k.split('[')])
+        if '-' in k:
+            k = '_'.join([s for s in k.split('-')])
+        return k
+
+    def _convert_column(self, main, sec, values):
+        """Convert the raw string values of a column based on its category"""
+        if main not in _COLUMN_DTYPES:
+            return [self._reformat_str(x) for x in values]
+        dtype = _COLUMN_DTYPES[main].get(sec)
+        if dtype is not None:
+            try:
+                return _to_array_column(values, dtype)
+            except ValueError:
+                # Non-standard values, fall back to the generic conversion
+                return [self._reformat_str(x) for x in values]
+        return _to_str_column(values)
+
+    def _organize_mmcif_dict(self, raw_dict):
+        for k, v in raw_dict.items():
+            k = self._format_key(k)
             if '.' not in k:
                 # second level does not exist
-                self[k] = v
+                self[k] = [self._reformat_str(x) for x in v]
                 continue
             main, sec = k.split('.')
-            if main not in self:
-                self[main] = dict()
-            self[main][sec] = v
+            if dict.get(self, main) is None:
+                dict.__setitem__(self, main, dict())
+            dict.__getitem__(self, main)[sec] = self._convert_column(main, sec, v)
 
     def level_two_get(self, key, subkey):
         if key in self:
             return self[key].get(subkey)
         return None
-    
+
     def retrieve_single_value_dict(self, key):
         citation = dict()
         subdict = self.get(key)
@@ -59,31 +487,37 @@ class MMCIF2Dict(dict):
                 raise ValueError(
                     'Sub-dict "{}" is not a single value dict'.format(key)
                 )
-            if v[0] is not None: 
+            if v[0] is not None:
                 citation[k] = v[0]
         return citation
-    
+
     def create_namedtuples(self, key, single_value = False):
         '''Create a list of namedtuples from a section of the mmcif dict'''
         if key not in self:
             return ()
         sub_dict = self[key]
         named_entries = namedtuple(key, sub_dict.keys())
+        # numpy columns are converted to lists of python scalars, and masked
+        # values are converted to None
+        columns = [
+            v.tolist() if isinstance(v, numpy.ndarray) else v
+            for v in sub_dict.values()
+        ]
 
         if single_value:
-            entry = list(zip(*sub_dict.values()))[0]
+            entry = list(zip(*columns))[0]
             return named_entries(*entry)
-        
+
         all_entries = []
-        for entry in zip(*sub_dict.values()):
+        for entry in zip(*columns):
             all_entries.append(named_entries(*entry))
         return all_entries
-    
+
     def find_atom_coords(self):
         sub_dict = self['atom_site']
         n_atoms = len(sub_dict['label_atom_id'])
-        
-        coords = numpy.empty((n_atoms, 3),'f') 
+
+        coords = numpy.empty((n_atoms, 3),'f')
         for i,k in enumerate(["Cartn_x", "Cartn_y", "Cartn_z"]):
             coords[:,i] = numpy.asarray(sub_dict[k],'f')
-        return coords
\ No newline at end of file
+        return coords
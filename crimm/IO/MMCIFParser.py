@@ -10,20 +10,23 @@ import numpy as np
 from Bio.PDB.PDBExceptions import PDBConstructionWarning
 from crimm.StructEntities.Atom import Atom
 from crimm.IO.MMCIF2Dict import MMCIF2Dict
+from crimm.IO.BinaryCIF import BCIF2Dict, is_binary_cif
 from crimm.IO.StructureBuilder import StructureBuilder
+from crimm.IO.AssemblyBuilder import AssemblyBuilder
 from crimm.StructEntities.Chain import (
     Chain, PolymerChain, Heterogens, Oligosaccharide, Solvent, Macrolide
 )
 from crimm.StructEntities.Model import Model
-from crimm.Utils.StructureUtils import get_coords, index_to_letters
 class MMCIFParser:
     """Parser class for standard mmCIF files from PDB"""
     def __init__(
             self,
             first_model_only = True,
             use_bio_assembly = True,
+            expand_assembly = True,
             include_solvent = True,
             include_hydrogens = False,
+            include_anisou = True,
             strict_parser = True,
             QUIET = False
         ):
@@ -31,13 +34,23 @@ class MMCIFParser:
         self.QUIET = QUIET
         self.first_model_only = first_model_only
         self.use_bio_assembly = use_bio_assembly
+        self.expand_assembly = expand_assembly
         self.include_solvent = include_solvent
         self.include_hydrogens = include_hydrogens
+        self.include_anisou = include_anisou
         self.strict_parser = strict_parser
         self.cifdict = None
         self.model_template = None
         self.symmetry_ops = None
 
+    @staticmethod
+    def _read_cifdict(filepath):
+        """Read the mmCIF or BinaryCIF file into a lazily decoded dictionary. 
+        Categories are only decoded when they are accessed"""
+        if is_binary_cif(filepath):
+            return BCIF2Dict(filepath, lazy=True)
+        return MMCIF2Dict(filepath, lazy=True)
+
     @staticmethod
     def _cif_find_resolution(cifdict):
         """Find structure resolution information from the parsed mmCIF dictionary"""
@@ -51,6 +64,13 @@ class MMCIFParser:
             if resolution is not None and (value:=resolution[0]) is not None:
                 return value
 
+    @staticmethod
+    def _cif_find_method(cifdict):
+        """Find the experimental method from the parsed mmCIF dictionary"""
+        struct_method_list = cifdict.level_two_get("exptl", "method")
+        if struct_method_list is not None:
+            return struct_method_list[0]
+
     @staticmethod
     def _cif_get_header(cifdict):
         """Get header information from the parsed mmCIF dictionary"""
@@ -98,25 +118,22 @@ class MMCIFParser:
 
         Arguments:
          :structure_id: string, the id that will be used for the structure
-         :filepath: path to mmCIF file, OR an open text mode file handle
+         :filepath: path to mmCIF or BinaryCIF file, OR an open file handle
+                    (text mode for mmCIF, binary mode for BinaryCIF)
 
         """
         with warnings.catch_warnings():
             if self.QUIET:
                 warnings.filterwarnings("ignore", category=PDBConstructionWarning)
             # mmCIF will be parsed into dictionary first and then namedtuples
-            # to gather all the necessary info to construct the structure
-            self.cifdict = MMCIF2Dict(filepath)
+            # to gather all the necessary info to construct the structure.
+            self.cifdict = self._read_cifdict(filepath)
             self.model_template = self.create_model_template()
             # find crystal symmetry operation
             self.symmetry_ops = self._cif_find_symmetry_info()
             self._build_structure(structure_id)
             # set additional info on the structure
-            structure_method = None
-            struct_method_list = self.cifdict.level_two_get("exptl", "method")
-            if struct_method_list is not None:
-                structure_method = struct_method_list[0]
-                
+            structure_method = self._cif_find_method(self.cifdict)
             self._structure_builder.set_structure_method(structure_method)
             resolution = self._cif_find_resolution(self.cifdict)
             self._structure_builder.set_resolution(resolution)
@@ -125,6 +142,87 @@ class MMCIFParser:
 
         return self._structure_builder.get_structure()
 
+    def iter_models(self, filepath):
+        """Yield the models in the mmCIF file one at a time. Only the Atom 
+        objects of the model being built are created, so the memory usage does
+        not scale with the number of models in the file (e.g. NMR ensembles).
+        The models are not attached to a Structure, and all models are yielded
+        regardless of first_model_only. The symmetry operations and connect 
+        records are applied to each model.
+
+        Arguments:
+         :filepath: path to mmCIF or BinaryCIF file, OR an open file handle
+                    (text mode for mmCIF, binary mode for BinaryCIF)
+        """
+        with warnings.catch_warnings():
+            if self.QUIET:
+                warnings.filterwarnings("ignore", category=PDBConstructionWarning)
+            self.cifdict = self._read_cifdict(filepath)
+            self.model_template = self.create_model_template()
+            self.symmetry_ops = self._cif_find_symmetry_info()
+            self._structure_builder.init_seg(" ")
+            selected_chains = self._find_selected_chains(
+                self.create_assembly_dict()
+            )
+            connect_dict = self.create_connect_dict()
+            rows = self._select_atom_site_rows(first_model_only=False)
+            all_model_rows = self.split_model_rows(rows)
+
+        for model_rows in all_model_rows:
+            # warnings are only filtered while building, not in between the
+            # yields where the caller has control
+            with warnings.catch_warnings():
+                if self.QUIET:
+                    warnings.filterwarnings(
+                        "ignore", category=PDBConstructionWarning
+                    )
+                atom_site = self.create_atom_site_entry_dict(model_rows)
+                ((model_id, entity_dict),) = atom_site.items()
+                model = self._build_model(model_id, entity_dict, selected_chains)
+                if connect_dict is not None:
+                    model.set_connect(connect_dict)
+            yield model
+
+    def get_header(self, filepath):
+        """Return the header and metadata of the mmCIF file without building
+        the structure. The "atom_site" and "atom_site_anisotrop" categories are
+        never decoded, and no Atom object is created.
+
+        Arguments:
+         :filepath: path to mmCIF or BinaryCIF file, OR an open file handle
+                    (text mode for mmCIF, binary mode for BinaryCIF)
+
+        Return a dictionary with the keys:
+         :pdb_id: id of the data block
+         :method: experimental method
+         :resolution: resolution of the structure
+         :header: header dictionary (as in Structure.header)
+         :assemblies: chain ids of the assemblies (as in Structure.assemblies)
+         :cell_info: unit cell info (as in Structure.cell_info)
+         :entities: dictionary of the empty template chains keyed by entity
+          id. PolymerChain templates contain the reported sequences and the
+          missing residues.
+        """
+        with warnings.catch_warnings():
+            if self.QUIET:
+                warnings.filterwarnings("ignore", category=PDBConstructionWarning)
+            self.cifdict = self._read_cifdict(filepath)
+            self.model_template = self.create_model_template()
+            cell_info = None
+            if 'cell' in self.cifdict:
+                cell_info = self.cifdict.create_namedtuples('cell')[0]._asdict()
+            return {
+                'pdb_id': self.cifdict['data'],
+                'method': self._cif_find_method(self.cifdict),
+                'resolution': self._cif_find_resolution(self.cifdict),
+                'header': self._cif_get_header(self.cifdict),
+                'assemblies': self.create_assembly_dict(),
+                'cell_info': cell_info,
+                'entities': {
+                    chain.id: chain for chain in self.model_template
+                },
+            }
+
     def create_polymer_chain_dict(self):
         """Create a dictionary for the PolymerChain object from mmCIF. Empty 
         PolymerChain classes will be created, and information on entity id, 
@@ -203,6 +301,8 @@ class MMCIFParser:
             else:
                 raise TypeError(f'Unknown Chain Type: {entity.type}')
             self._set_chain_attr(entity, cur_chain)
+            if not isinstance(cur_chain, PolymerChain):
+                cur_chain.entity_id = entity.id
             model_temp.add(cur_chain)
         return model_temp
 
@@ -216,7 +316,7 @@ class MMCIFParser:
          :type atom_entry: namedtuple
         """
         coord = np.array(
-                [atom_entry.Cartn_x, atom_entry.Cartn_y, atom_entry.Cartn_z]
+                [atom_entry.Cartn_x, atom_entry.Cartn_y, atom_entry.Cartn_z], "f"
         )
         altloc = atom_entry.label_alt_id
         if altloc is None:
@@ -242,25 +342,136 @@ class MMCIFParser:
             return "W"
         return "H"
 
-    def _create_residue_dict_entry(self, atom_entry, resseq):
-        """Create a residue dictionary entry with empty atom list"""
-        resname = str(atom_entry.label_comp_id)
-        hetatm_flag = self._assign_hetflag(
-            atom_entry.group_PDB, resname
+    @staticmethod
+    def _first_appearance_codes(values):
+        """Return integer codes of the values that are ordered by their first
+        appearance in the array"""
+        _, first_idx, inverse = np.unique(
+            values, return_index=True, return_inverse=True
         )
-        icode = atom_entry.pdbx_PDB_ins_code
-        if icode is None:
-            icode = ' '
-        res_id = (hetatm_flag, resseq, icode)
-        res_dict_entry = {
-            "resname": resname,
-            "res_id": res_id,
-            "author_seq_id": atom_entry.auth_seq_id,
-            "atom_list": []
-        }
-        return res_dict_entry
-        
-    def create_atom_site_entry_dict(self):
+        rank = np.empty(len(first_idx), dtype=np.int64)
+        rank[np.argsort(first_idx)] = np.arange(len(first_idx))
+        return rank[inverse.ravel()]
+
+    @staticmethod
+    def _assign_het_resseq(chain_codes, auth_seq_ids):
+        """Assign residue sequence numbers for HETATM entries. The residue 
+        sequence for HETATM is not defined in mmCIF, so it is incremented 
+        on each change of author sequence id within the chain"""
+        n_entries = len(chain_codes)
+        if n_entries == 0:
+            return np.empty(0, dtype=np.int64)
+        order = np.argsort(chain_codes, kind='stable')
+        sorted_chains = chain_codes[order]
+        sorted_auth_seq = auth_seq_ids[order]
+        chain_starts = np.ones(n_entries, dtype=bool)
+        chain_starts[1:] = sorted_chains[1:] != sorted_chains[:-1]
+        new_res = chain_starts.copy()
+        new_res[1:] |= sorted_auth_seq[1:] != sorted_auth_seq[:-1]
+        res_count = np.cumsum(new_res)
+        chain_offsets = res_count[chain_starts] - 1
+        sorted_resseq = res_count - chain_offsets[np.cumsum(chain_starts) - 1]
+        resseq = np.empty(n_entries, dtype=np.int64)
+        resseq[order] = sorted_resseq
+        return resseq
+
+    def _select_atom_site_rows(self, first_model_only=None):
+        """Return the indices of the "atom_site" entries to be included in 
+        the structure. If first_model_only is None, the parser setting is
+        used."""
+        if first_model_only is None:
+            first_model_only = self.first_model_only
+        atom_site = self.cifdict['atom_site']
+        model_nums = np.ma.getdata(atom_site['pdbx_PDB_model_num'])
+        selected = np.ones(len(model_nums), dtype=bool)
+        if not self.include_hydrogens:
+            selected &= np.array(atom_site['type_symbol']) != 'H'
+        if first_model_only and selected.any():
+            first_model = model_nums[np.argmax(selected)]
+            selected &= model_nums == first_model
+        return np.flatnonzero(selected)
+
+    def group_atom_site_entries(self, rows):
+        """Group the "atom_site" entries by model, entity, chain and residue 
+        sequence id with numpy sorting on the column arrays. The groups are
+        ordered by their first appearance in the file, and the entries within
+        a residue keep the file order.
+
+        Return the sorted row indices, the residue sequence ids of the sorted 
+        rows, and the starting positions of the residue groups in the sorted 
+        rows.
+        """
+        atom_site = self.cifdict['atom_site']
+        model_nums = np.ma.getdata(atom_site['pdbx_PDB_model_num'])[rows]
+        entity_ids = np.ma.getdata(atom_site['label_entity_id'])[rows]
+        chain_ids = np.array(atom_site['label_asym_id'])[rows]
+        label_seq_ids = atom_site['label_seq_id']
+        resseq = np.ma.getdata(label_seq_ids)[rows].astype(np.int64)
+
+        model_codes = self._first_appearance_codes(model_nums)
+        entity_codes = self._first_appearance_codes(entity_ids)
+        chain_codes = self._first_appearance_codes(chain_ids)
+        model_chain_codes = model_codes * (chain_codes.max(initial=0) + 1) + chain_codes
+
+        het_mask = np.ma.getmaskarray(label_seq_ids)[rows]
+        if het_mask.any():
+            auth_seq_ids = np.ma.getdata(atom_site['auth_seq_id'])[rows]
+            resseq[het_mask] = self._assign_het_resseq(
+                model_chain_codes[het_mask], auth_seq_ids[het_mask]
+            )
+
+        resseq_offset = resseq.min(initial=0)
+        resseq_span = resseq.max(initial=0) - resseq_offset + 1
+        res_codes = self._first_appearance_codes(
+            model_chain_codes * resseq_span + (resseq - resseq_offset)
+        )
+        # lexsort is stable, so the atoms in a residue keep the file order
+        order = np.lexsort((res_codes, chain_codes, entity_codes, model_codes))
+        sorted_res_codes = res_codes[order]
+        res_starts = np.flatnonzero(
+            np.diff(sorted_res_codes, prepend=-1)
+        )
+        return rows[order], resseq[order], res_starts
+
+    def find_anisou(self, atom_ids):
+        """Find the anisotropic B factors for the atoms from the 
+        "atom_site_anisotrop" entries, which are matched to the atoms by 
+        "atom_site_anisotrop.id" through a sorted index.
+
+        Return a boolean mask of the atoms that have anisotropic B factors and
+        an (N, 6) array of (U11, U12, U13, U22, U23, U33) aligned to atom_ids.
+        None is returned if include_anisou is False or no entry exists.
+        """
+        if not self.include_anisou or 'atom_site_anisotrop' not in self.cifdict:
+            return None
+        anisotrop = self.cifdict['atom_site_anisotrop']
+        anisou_ids = np.asarray(np.ma.getdata(anisotrop['id']))
+        if len(anisou_ids) == 0:
+            return None
+        u_block = np.column_stack([
+            np.ma.getdata(anisotrop[k]) 
+            for k in ('U11', 'U12', 'U13', 'U22', 'U23', 'U33')
+        ]).astype("f")
+        atom_ids = np.asarray(atom_ids)
+        sort_idx = np.argsort(anisou_ids, kind='stable')
+        sorted_ids = anisou_ids[sort_idx]
+        pos = np.searchsorted(sorted_ids, atom_ids)
+        pos[pos == len(sorted_ids)] = 0
+        has_anisou = sorted_ids[pos] == atom_ids
+        return has_anisou, u_block[sort_idx[pos]]
+
+    def split_model_rows(self, rows):
+        """Split the "atom_site" row indices by model. Return a list of row 
+        index arrays ordered by the first appearance of the models."""
+        if len(rows) == 0:
+            return []
+        model_nums = np.ma.getdata(self.cifdict['atom_site']['pdbx_PDB_model_num'])
+        model_codes = self._first_appearance_codes(model_nums[rows])
+        order = np.argsort(model_codes, kind='stable')
+        splits = np.flatnonzero(np.diff(model_codes[order]))+1
+        return np.split(rows[order], splits)
+
+    def create_atom_site_entry_dict(self, rows=None):
         """Create a dictionary containing structured data from all "atom_site" 
         fields in mmCIF. Return a dictionary that contains four levels, which 
         are keyed by [model_id,[chain_id,[resseq]]].
@@ -277,44 +488,82 @@ class MMCIFParser:
                 }
             }
         }
+        The entries are grouped with numpy on the column arrays, and the 
+        coordinates are sliced from the coordinate block all at once. If rows
+        is given, only these row indices of "atom_site" are included.
         """
-        atom_site = self.cifdict.create_namedtuples('atom_site')
-        model_dict = dict()
+        atom_site = self.cifdict['atom_site']
+        if rows is None:
+            rows = self._select_atom_site_rows()
+        sorted_rows, sorted_resseq, res_starts = self.group_atom_site_entries(rows)
+
+        def sorted_column(key):
+            column = atom_site[key]
+            if isinstance(column, np.ndarray):
+                return column[sorted_rows].tolist()
+            return [column[i] for i in sorted_rows]
+
+        coords = np.column_stack([
+            np.ma.getdata(atom_site[k])[sorted_rows]
+            for k in ("Cartn_x", "Cartn_y", "Cartn_z")
+        ]).astype("f")
+        model_nums = sorted_column('pdbx_PDB_model_num')
+        entity_ids = sorted_column('label_entity_id')
+        chain_ids = sorted_column('label_asym_id')
+        resnames = sorted_column('label_comp_id')
+        group_pdb = sorted_column('group_PDB')
+        icodes = sorted_column('pdbx_PDB_ins_code')
+        auth_seq_ids = sorted_column('auth_seq_id')
+        atom_names = sorted_column('label_atom_id')
+        altlocs = sorted_column('label_alt_id')
+        serial_numbers = sorted_column('id')
+        bfactors = sorted_column('B_iso_or_equiv')
+        occupancies = sorted_column('occupancy')
+        elements = sorted_column('type_symbol')
+        sorted_resseq = sorted_resseq.tolist()
+        anisou = self.find_anisou(serial_numbers)
+        if anisou is None:
+            has_anisou = [False]*len(sorted_rows)
+        else:
+            has_anisou, anisou_arrays = anisou
+            has_anisou = has_anisou.tolist()
 
-        for atom_entry in atom_site:
-            if not self.include_hydrogens and atom_entry.type_symbol == 'H':
-                continue
-            model_num = atom_entry.pdbx_PDB_model_num
-            if model_num not in model_dict:
-                if self.first_model_only and len(model_dict) > 0:
-                    break
-                model_dict[model_num] = dict()
-            entity_dict = model_dict[model_num]
-            entity_id = atom_entry.label_entity_id
-            if entity_id not in entity_dict:
-                entity_dict[entity_id] = dict()
-            chain_dict = entity_dict[entity_id]
-            chain_id = atom_entry.label_asym_id
-            if chain_id not in chain_dict:
-                last_auth_seq = None
-                het_chain_resseq = 0
-                chain_dict[chain_id] = dict()
-            res_dict = chain_dict[chain_id]
-
-            resseq = atom_entry.label_seq_id
-            auth_seq_id = atom_entry.auth_seq_id
-            if resseq is None:
-                # The residue sequence for HETATOM is not defined in mmCIF, 
-                # we need to manually increment it from the last sequence number
-                if auth_seq_id != last_auth_seq:
-                    het_chain_resseq += 1
-                    last_auth_seq = auth_seq_id
-                resseq = het_chain_resseq
-
-            if resseq not in res_dict:
-                res_dict[resseq] = self._create_residue_dict_entry(atom_entry, resseq)
-            atom = self.create_atom_from_namedtuple(atom_entry)
-            res_dict[resseq]['atom_list'].append(atom)
+        model_dict = dict()
+        res_ends = np.append(res_starts[1:], len(sorted_rows)).tolist()
+        for start, end in zip(res_starts.tolist(), res_ends):
+            entity_dict = model_dict.setdefault(model_nums[start], dict())
+            chain_dict = entity_dict.setdefault(entity_ids[start], dict())
+            res_dict = chain_dict.setdefault(chain_ids[start], dict())
+            resname = str(resnames[start])
+            hetatm_flag = self._assign_hetflag(group_pdb[start], resname)
+            icode = icodes[start]
+            if icode is None:
+                icode = ' '
+            resseq = sorted_resseq[start]
+            atom_list = []
+            for i in range(start, end):
+                altloc = altlocs[i]
+                if altloc is None:
+                    altloc = ' '
+                atom = Atom(
+                    name = atom_names[i],
+                    fullname = atom_names[i],
+                    coord = coords[i],
+                    bfactor = bfactors[i],
+                    occupancy = occupancies[i],
+                    altloc = altloc,
+                    serial_number = serial_numbers[i],
+                    element = elements[i],
+                )
+                if has_anisou[i]:
+                    atom.set_anisou(anisou_arrays[i])
+                atom_list.append(atom)
+            res_dict[resseq] = {
+                "resname": resname,
+                "res_id": (hetatm_flag, resseq, icode),
+                "author_seq_id": auth_seq_ids[start],
+                "atom_list": atom_list
+            }
 
         return model_dict
 
@@ -344,33 +593,81 @@ class MMCIFParser:
         return assemblies
 
     def _execute_symmetry_operations(self, model):
+        """Apply all symmetry operations to the chains of the model in one 
+        batched transformation. If expand_assembly is False, the chain copies
+        are not created, and an AssemblyView is set on the model instead."""
         if not self.symmetry_ops:
             return
-        reference_model = model.copy()
-        reference_model.detach_parent()
-
+        all_operations = []
         for operation_name, operations in self.symmetry_ops.items():
             warnings.warn(
                 f"{operation_name.upper()} performed as specified in mmCIF file."
             )
-            for matrix, vector in operations:
-                copy_model = reference_model.copy()
-                copy_coords = get_coords(copy_model)
-                new_coords = copy_coords @ matrix + vector
-                for i, atom in enumerate(copy_model.get_atoms()):
-                    atom.coord = new_coords[i]
-                for i, chain in enumerate(copy_model):
-                    chain.id = index_to_letters(len(model)+i)
-                for chain in copy_model:
-                    model.add(chain)
+            all_operations.extend(operations)
+        assembly_builder = AssemblyBuilder(all_operations)
+        if not self.expand_assembly:
+            model.assembly_view = assembly_builder.create_view(model)
+            return
+        assembly_builder.build(model)
         model.reset_atom_serial_numbers()
 
+    @staticmethod
+    def _find_selected_chains(assembly_dict):
+        """Return the list of chain ids included in the assemblies, or None
+        if no assembly info is available"""
+        if assembly_dict is None:
+            return None
+        selected_chains = []
+        for chain_list in assembly_dict.values():
+            selected_chains.extend(chain_list)
+        return selected_chains
+
+    def _build_model(self, model_id, entity_dict, selected_chains):
+        """Build a model from the entity dictionary of one model in the 
+        "atom_site" entry dict. The chains are copied from the model template,
+        and the symmetry operations are applied if use_bio_assembly is True."""
+        sb = self._structure_builder
+        model = Model(model_id)
+        sb.model = model
+        ##TODO: refactor these nested for loops
+        for entity_id, chain_dict in entity_dict.items():
+            for chain_id, res_dict in chain_dict.items():
+                if (
+                    selected_chains is not None
+                ) and (
+                    chain_id not in selected_chains
+                ):
+                    continue
+                chain = self.model_template[entity_id].copy()
+                if not self.include_solvent and isinstance(chain, Solvent):
+                    continue
+                sb.model.add(chain)
+                sb.chain = chain
+                # This is the mmCIF label chain id
+                sb.chain.id = chain_id
+                for resseq, res_info in res_dict.items():
+                    resname = res_info["resname"]
+                    res_id = res_info["res_id"]
+                    author_seq_id = res_info["author_seq_id"]
+                    atoms = res_info["atom_list"]
+                    sb.init_residue(resname, *res_id, author_seq_id=author_seq_id)
+                    for atom in atoms:
+                        sb.add_atom(atom, sb.residue)
+            if isinstance(sb.chain, Heterogens):
+                sb.chain.update()
+            if isinstance(sb.chain, PolymerChain):
+                sb.chain.reset_disordered_residues()
+                sb.chain.sort_residues()
+
+        if self.use_bio_assembly:
+            self._execute_symmetry_operations(model)
+        return model
+
     def _build_structure(self, structure_id):
         """build the structure with structure builder object and mmcif dict"""
         sb = self._structure_builder
         self.model_template = self.create_model_template()
-        
-        all_anisou = self.cifdict.create_namedtuples('atom_site_anisotrop')
+
         if structure_id is None:
             structure_id = self.cifdict['data']
         sb.init_structure(structure_id)
@@ -379,58 +676,14 @@ class MMCIFParser:
             cell_info = self.cifdict.create_namedtuples('cell')[0]
             sb.structure.cell_info = cell_info._asdict()
         assembly_dict = self.create_assembly_dict()
-        if assembly_dict is None:
-            selected_chains = None
-        else:
+        if assembly_dict is not None:
             sb.structure.assemblies = assembly_dict
-            selected_chains = []
-            for chain_list in assembly_dict.values():
-                selected_chains.extend(chain_list)
+        selected_chains = self._find_selected_chains(assembly_dict)
 
         atom_site = self.create_atom_site_entry_dict()
-        ##TODO: refactor these nested for loops
         for model_id, entity_dict in atom_site.items():
-            model = Model(model_id)
+            model = self._build_model(model_id, entity_dict, selected_chains)
             sb.structure.add(model)
-            sb.model = model
-            for entity_id, chain_dict in entity_dict.items():
-                for chain_id, res_dict in chain_dict.items():
-                    if (
-                        selected_chains is not None
-                    ) and (
-                        chain_id not in selected_chains
-                    ):
-                        continue
-                    chain = self.model_template[entity_id].copy()
-                    if not self.include_solvent and isinstance(chain, Solvent):
-                        continue
-                    sb.model.add(chain)
-                    sb.chain = chain
-                    # This is the mmCIF label chain id
-                    sb.chain.id = chain_id
-                    for resseq, res_info in res_dict.items():
-                        resname = res_info["resname"]
-                        res_id = res_info["res_id"]
-                        author_seq_id = res_info["author_seq_id"]
-                        atoms = res_info["atom_list"]
-                        sb.init_residue(resname, *res_id, author_seq_id=author_seq_id)
-                        for atom in atoms:
-                            sb.add_atom(atom, sb.residue)
-                            if atom.orig_serial_number <= len(all_anisou):
-                                anisou = all_anisou[atom.orig_serial_number-1]
-                                u = (
-                                    anisou.U11, anisou.U12, anisou.U13,
-                                    anisou.U22, anisou.U23, anisou.U33,
-                                )
-                                atom.set_anisou(np.array(u, "f"))
-                if isinstance(sb.chain, Heterogens):
-                    sb.chain.update()
-                if isinstance(sb.chain, PolymerChain):
-                    sb.chain.reset_disordered_residues()
-                    sb.chain.sort_residues()
-
-            if self.use_bio_assembly:
-                self._execute_symmetry_operations(sb.model)
 
         sb.structure.set_pdb_id(structure_id)
         self.add_cell_and_symmetry_info()
@@ -456,6 +709,14 @@ class MMCIFParser:
         self._structure_builder.set_symmetry(spacegroup, cell_data)
 
     def add_connect_record(self):
+        conn_dict = self.create_connect_dict()
+        if conn_dict is None:
+            return
+        self._structure_builder.set_connect(conn_dict)
+
+    def create_connect_dict(self):
+        """Return a dictionary of the connect records from "struct_conn" keyed
+        by the connection types. If no record exists, None is returned."""
         if 'struct_conn' not in self.cifdict:
             return
         struct_conn = self.cifdict.create_namedtuples('struct_conn')
@@ -479,4 +740,4 @@ class MMCIFParser:
                     k: getattr(connect, v) for k, v in cur_label_dict.items()
                 })
             conn_dict[conn_type].append(tuple(cur_connect))
-        self._structure_builder.set_connect(conn_dict)
\ No newline at end of file
+        return conn_dict
\ No newline at end of file
@@ -0,0 +1,403 @@
+"""Writer for crimm entities in mmCIF format. The "atom_site" rows are streamed
+from the entity hierarchy chain by chain, and there are no limits on the number
+of atoms, residues or chains as in PDB format. The entity, sequence, missing
+residue and connect records are written so that the file can be read back with
+MMCIFParser."""
+from Bio.File import as_handle
+from Bio.Data.PDBData import protein_letters_3to1_extended
+from crimm.StructEntities.Chain import PolymerChain
+
+# mmCIF entity types of the (non-polymer) chain types
+_ENTITY_TYPES = {
+    'Solvent': 'water',
+    'Heterogens': 'non-polymer',
+    'Ion': 'non-polymer',
+    'Ligand': 'non-polymer',
+    'CoSolvent': 'non-polymer',
+    'NucleosidePhosphate': 'non-polymer',
+    'Oligosaccharide': 'branched',
+    'Glycosylation': 'branched',
+    'Macrolide': 'macrolide',
+}
+# "entity" items that are set as chain attributes by MMCIFParser
+_ENTITY_ATTRS = (
+    'src_method', 'pdbx_description', 'formula_weight',
+    'pdbx_number_of_molecules', 'pdbx_ec', 'pdbx_mutation', 'pdbx_fragment',
+    'details'
+)
+_RESERVED_PREFIXES = ('data_', 'loop_', 'save_', 'global_', 'stop_')
+_ATOM_SITE_ITEMS = (
+    'group_PDB', 'id', 'type_symbol', 'label_atom_id', 'label_alt_id',
+    'label_comp_id', 'label_asym_id', 'label_entity_id', 'label_seq_id',
+    'pdbx_PDB_ins_code', 'Cartn_x', 'Cartn_y', 'Cartn_z', 'occupancy',
+    'B_iso_or_equiv', 'pdbx_formal_charge', 'auth_seq_id', 'auth_comp_id',
+    'auth_asym_id', 'auth_atom_id', 'pdbx_PDB_model_num',
+)
+_ATOM_SITE_FORMAT_STRING = (
+    "%s %s %s %s %s %s %s %s %s %s %.3f %.3f %.3f %s %.2f ? %s %s %s %s %s\n"
+)
+_SEQ_LINE_WIDTH = 80
+
+def _quote(value):
+    """Format a value as an mmCIF token (PRIVATE). None is written as "?",
+    and values with white spaces or special characters are quoted."""
+    if value is None:
+        return '?'
+    value = str(value)
+    if value == '':
+        return '.'
+    if '\n' in value:
+        return f'\n;{value}\n;\n'
+    if not (
+        value[0] in "_#$'\"[];" or
+        any(c.isspace() for c in value) or
+        value.lower().startswith(_RESERVED_PREFIXES)
+    ):
+        return value
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return f'\n;{value}\n;\n'
+
+def _wrap_seq(seq):
+    """Wrap a long sequence into lines (PRIVATE). The line breaks are removed
+    by MMCIF2Dict when the file is read."""
+    seq = str(seq)
+    if len(seq) <= _SEQ_LINE_WIDTH:
+        return seq
+    return '\n'.join(
+        seq[i:i+_SEQ_LINE_WIDTH] for i in range(0, len(seq), _SEQ_LINE_WIDTH)
+    )
+
+def _get_category_lines(category, columns):
+    """Return the lines of a category from a dictionary of columns (PRIVATE).
+    Single row categories are written as key-value pairs, and the others are
+    written as a loop."""
+    if not columns:
+        return []
+    n_rows = len(next(iter(columns.values())))
+    if n_rows == 0:
+        return []
+    if n_rows == 1:
+        width = max(len(key) for key in columns) + len(category) + 3
+        lines = [
+            f"{f'_{category}.{key}':<{width}}{_quote(values[0])}\n"
+            for key, values in columns.items()
+        ]
+        return lines + ['#\n']
+    lines = ['loop_\n']
+    lines.extend(f'_{category}.{key}\n' for key in columns)
+    for row in zip(*columns.values()):
+        lines.append(' '.join(_quote(v) for v in row) + '\n')
+    return lines + ['#\n']
+
+def _get_entity_type(chain):
+    if isinstance(chain, PolymerChain):
+        return 'polymer'
+    return _ENTITY_TYPES.get(chain.chain_type, 'polymer')
+
+
+class _EntityRegistry:
+    """Assign mmCIF entity ids to the chains (PRIVATE). The entity ids of the
+    chains parsed from mmCIF are kept, and chains without entity ids are
+    grouped by their entity type, description and residue names."""
+    def __init__(self, chains):
+        self.entities = {}
+        self.chain_entity_ids = {}
+        used_ids = {
+            entity_id for chain in chains
+            if isinstance(entity_id := getattr(chain, 'entity_id', None), int)
+        }
+        next_id = max(used_ids, default=0) + 1
+        group_ids = {}
+        for chain in chains:
+            entity_id = getattr(chain, 'entity_id', None)
+            entity_type = _get_entity_type(chain)
+            if entity_id is None:
+                if entity_type == 'polymer':
+                    # each chain without entity info is its own polymer entity
+                    group_key = (id(chain),)
+                else:
+                    group_key = (
+                        entity_type, chain.pdbx_description,
+                        tuple(sorted({res.resname for res in chain}))
+                    )
+                if group_key not in group_ids:
+                    group_ids[group_key] = next_id
+                    next_id += 1
+                entity_id = group_ids[group_key]
+            self.chain_entity_ids[id(chain)] = entity_id
+            self.entities.setdefault(entity_id, (entity_type, []))[1].append(chain)
+
+    def get_entity_id(self, chain):
+        return self.chain_entity_ids[id(chain)]
+
+    def get_entity_lines(self):
+        columns = {'id': [], 'type': []}
+        columns.update({attr: [] for attr in _ENTITY_ATTRS})
+        for entity_id, (entity_type, chains) in self.entities.items():
+            columns['id'].append(entity_id)
+            columns['type'].append(entity_type)
+            for attr in _ENTITY_ATTRS:
+                columns[attr].append(getattr(chains[0], attr, None))
+        return _get_category_lines('entity', columns)
+
+    def get_polymer_lines(self):
+        poly_columns = {
+            'entity_id': [], 'type': [], 'pdbx_seq_one_letter_code': [],
+            'pdbx_seq_one_letter_code_can': [], 'pdbx_strand_id': [],
+        }
+        seq_columns = {'entity_id': [], 'num': [], 'mon_id': [], 'hetero': []}
+        unobs_columns = {
+            'id': [], 'PDB_model_num': [], 'polymer_flag': [],
+            'occupancy_flag': [], 'auth_asym_id': [], 'auth_comp_id': [],
+            'auth_seq_id': [], 'PDB_ins_code': [], 'label_asym_id': [],
+            'label_comp_id': [], 'label_seq_id': [],
+        }
+        written_auth_chains = set()
+        for entity_id, (entity_type, chains) in self.entities.items():
+            if entity_type != 'polymer':
+                continue
+            template = chains[0]
+            if isinstance(template, PolymerChain):
+                chain_type = template.chain_type
+                chain_type = chain_type[0].lower() + chain_type[1:]
+                known_seq = template.known_seq
+                can_seq = template.can_seq
+                reported_res = template.reported_res
+            else:
+                chain_type = 'polypeptide(L)'
+                reported_res = []
+            if not reported_res:
+                # chains without the reported sequence (e.g. from PDB, CRD or
+                # PSF files) are written with the residues present
+                letter_3to1_dict = getattr(
+                    template, 'letter_3to1_dict', protein_letters_3to1_extended
+                )
+                reported_res = [(res.id[1], res.resname) for res in template]
+                can_seq = ''.join(
+                    letter_3to1_dict.get(resname, 'X')
+                    for _, resname in reported_res
+                )
+                known_seq = can_seq
+            auth_chain_ids = []
+            for chain in chains:
+                auth_chain_id = getattr(chain, 'author_chain_id', chain.id)
+                if auth_chain_id not in auth_chain_ids:
+                    auth_chain_ids.append(auth_chain_id)
+            poly_columns['entity_id'].append(entity_id)
+            poly_columns['type'].append(chain_type)
+            poly_columns['pdbx_seq_one_letter_code'].append(_wrap_seq(known_seq))
+            poly_columns['pdbx_seq_one_letter_code_can'].append(_wrap_seq(can_seq))
+            poly_columns['pdbx_strand_id'].append(','.join(auth_chain_ids))
+            for num, mon_id in reported_res:
+                seq_columns['entity_id'].append(entity_id)
+                seq_columns['num'].append(num)
+                seq_columns['mon_id'].append(mon_id)
+                seq_columns['hetero'].append('n')
+            for chain in chains:
+                missing_res = getattr(chain, 'reported_missing_res', None)
+                auth_chain_id = getattr(chain, 'author_chain_id', chain.id)
+                # MMCIFParser collects the missing residues by the author chain
+                # ids, so they are only written once for each of them
+                if not missing_res or auth_chain_id in written_auth_chains:
+                    continue
+                written_auth_chains.add(auth_chain_id)
+                for seq_id, resname in missing_res:
+                    unobs_columns['id'].append(len(unobs_columns['id']) + 1)
+                    unobs_columns['PDB_model_num'].append(1)
+                    unobs_columns['polymer_flag'].append('Y')
+                    unobs_columns['occupancy_flag'].append(1)
+                    unobs_columns['auth_asym_id'].append(auth_chain_id)
+                    unobs_columns['auth_comp_id'].append(resname)
+                    unobs_columns['auth_seq_id'].append(None)
+                    unobs_columns['PDB_ins_code'].append(None)
+                    unobs_columns['label_asym_id'].append(chain.id)
+                    unobs_columns['label_comp_id'].append(resname)
+                    unobs_columns['label_seq_id'].append(seq_id)
+        return (
+            _get_category_lines('entity_poly', poly_columns) +
+            _get_category_lines('entity_poly_seq', seq_columns) +
+            _get_category_lines('pdbx_unobs_or_zero_occ_residues', unobs_columns)
+        )
+
+
+def _get_header_lines(data_name, structure):
+    """Return the lines of the header categories (PRIVATE)."""
+    lines = [f'data_{data_name}\n', '#\n']
+    lines += _get_category_lines('entry', {'id': [data_name]})
+    header = {}
+    if structure is not None and structure.header:
+        header = structure.header
+    if (idcode := header.get('idcode')):
+        lines += _get_category_lines(
+            'struct', {k: [v] for k, v in idcode.items()}
+        )
+    if (keywords := header.get('keywords')):
+        lines += _get_category_lines(
+            'struct_keywords', {k: [v] for k, v in keywords.items()}
+        )
+    # MMCIFParser requires the deposition date entry
+    lines += _get_category_lines(
+        'pdbx_database_status',
+        {
+            'entry_id': [data_name],
+            'recvd_initial_deposition_date': [header.get('deposition_date')]
+        }
+    )
+    if (citation := header.get('citation')):
+        lines += _get_category_lines('citation', citation)
+    if structure is None:
+        return lines
+    if structure.method is not None:
+        lines += _get_category_lines(
+            'exptl', {'entry_id': [data_name], 'method': [structure.method]}
+        )
+    if structure.resolution is not None:
+        lines += _get_category_lines(
+            'refine', {
+                'entry_id': [data_name],
+                'ls_d_res_high': [structure.resolution]
+            }
+        )
+    if structure.cell_info:
+        lines += _get_category_lines(
+            'cell', {k: [v] for k, v in structure.cell_info.items()}
+        )
+    return lines
+
+def _get_connect_lines(connect_dict):
+    """Return the lines of "struct_conn" from the connect_dict of a model
+    (PRIVATE)."""
+    columns = {'id': [], 'conn_type_id': []}
+    label_keys = (
+        ('label_asym_id', 'chain'),
+        ('label_comp_id', 'resname'),
+        ('label_seq_id', 'resseq'),
+        ('label_atom_id', 'atom_id'),
+    )
+    for i in (1, 2):
+        for item, _ in label_keys:
+            columns[f'ptnr{i}_{item}'] = []
+        columns[f'pdbx_ptnr{i}_label_alt_id'] = []
+    for conn_type, records in connect_dict.items():
+        for j, record in enumerate(records, 1):
+            columns['id'].append(f'{conn_type}{j}')
+            columns['conn_type_id'].append(conn_type)
+            for i, atom_info in enumerate(record, 1):
+                for item, key in label_keys:
+                    columns[f'ptnr{i}_{item}'].append(atom_info[key])
+                columns[f'pdbx_ptnr{i}_label_alt_id'].append(atom_info['altloc'])
+    return _get_category_lines('struct_conn', columns)
+
+def _get_atom_site_lines(chain, entity_id, model_num, include_alt):
+    """Return the "atom_site" rows of a chain (PRIVATE). The residue fields
+    are formatted once per residue, and the atom names are quoted once per
+    name."""
+    label_asym_id = _quote(chain.id)
+    auth_asym_id = _quote(getattr(chain, 'author_chain_id', chain.id))
+    is_polymer = _get_entity_type(chain) == 'polymer'
+    quoted_names = {}
+    lines = []
+    cur_residue = None
+    for atom in chain.get_atoms(include_alt=include_alt):
+        residue = atom.parent
+        if residue is not cur_residue:
+            cur_residue = residue
+            hetfield, resseq, icode = residue.id
+            group_pdb = 'ATOM' if hetfield == ' ' else 'HETATM'
+            resname = _quote(residue.resname)
+            auth_seq_id = getattr(residue, 'author_seq_id', None)
+            if auth_seq_id is None:
+                auth_seq_id = resseq
+            # label_seq_id is only defined for polymers
+            label_seq_id = resseq if is_polymer else '.'
+            icode = '?' if icode == ' ' else _quote(icode)
+        if (quoted_name := quoted_names.get(atom.name)) is None:
+            quoted_name = quoted_names[atom.name] = _quote(atom.name)
+        altloc = atom.altloc
+        x, y, z = atom.coord
+        occupancy = atom.occupancy
+        lines.append(_ATOM_SITE_FORMAT_STRING % (
+            group_pdb, atom.serial_number, atom.element or '?', quoted_name,
+            '.' if altloc == ' ' else _quote(altloc), resname, label_asym_id,
+            entity_id, label_seq_id, icode, x, y, z,
+            '?' if occupancy is None else f'{occupancy:.2f}', atom.bfactor,
+            auth_seq_id, resname, auth_asym_id, quoted_name, model_num
+        ))
+    return lines
+
+def _iter_mmcif_line_blocks(entity, reset_serial=True, include_alt=True):
+    """Yield the lines of the mmCIF string in blocks (PRIVATE). The
+    "atom_site" rows are yielded chain by chain."""
+    if reset_serial and hasattr(entity, 'reset_atom_serial_numbers'):
+        entity.reset_atom_serial_numbers(include_alt=include_alt)
+    top_parent = entity
+    if entity.level != 'S':
+        top_parent = entity.get_top_parent()
+    structure = top_parent if top_parent.level == 'S' else None
+    if entity.level == 'S':
+        models = entity.child_list
+        chain_lists = [model.child_list for model in models]
+    elif entity.level == 'M':
+        models = [entity]
+        chain_lists = [entity.child_list]
+    elif entity.level == 'C':
+        models = [entity.parent] if entity.parent is not None else [None]
+        chain_lists = [[entity]]
+    else:
+        raise ValueError(
+            "Only Structure, Model, or Chain level entities can be written "
+            f"in mmCIF! {entity} has level \"{entity.level}\"."
+        )
+
+    data_name = getattr(structure, 'pdb_id', None) or entity.get_id()
+    if entity.level == 'C':
+        data_name = getattr(structure, 'pdb_id', None) or 'crimm'
+    data_name = str(data_name).replace(' ', '_')
+    yield _get_header_lines(data_name, structure)
+
+    # the entities are defined by the chains in the first model
+    registry = _EntityRegistry(chain_lists[0])
+    yield registry.get_entity_lines()
+    yield registry.get_polymer_lines()
+    # all chains are included in the assembly, since symmetry copies have
+    # already been added as chains if any
+    yield _get_category_lines(
+        'pdbx_struct_assembly_gen', {
+            'assembly_id': [1], 'oper_expression': [1],
+            'asym_id_list': [','.join(chain.id for chain in chain_lists[0])],
+        }
+    )
+    if models[0] is not None and models[0].connect_dict:
+        yield _get_connect_lines(models[0].connect_dict)
+
+    yield ['loop_\n'] + [f'_atom_site.{item}\n' for item in _ATOM_SITE_ITEMS]
+    for i, (model, chains) in enumerate(zip(models, chain_lists), 1):
+        model_num = model.get_id() if model is not None else 1
+        if not isinstance(model_num, int):
+            model_num = i
+        for chain in chains:
+            if id(chain) in registry.chain_entity_ids:
+                entity_id = registry.get_entity_id(chain)
+            else:
+                entity_id = getattr(chain, 'entity_id', '?')
+            yield _get_atom_site_lines(chain, entity_id, model_num, include_alt)
+    yield ['#\n']
+
+def get_mmcif_str(entity, reset_serial=True, include_alt=True):
+    """Return the mmCIF string of a Structure, Model or Chain."""
+    return ''.join(
+        line for lines in _iter_mmcif_line_blocks(
+            entity, reset_serial, include_alt
+        ) for line in lines
+    )
+
+def write_mmcif(entity, file, reset_serial=True, include_alt=True):
+    """Write a Structure, Model or Chain to an mmCIF file (path or an open
+    text mode file handle). The "atom_site" rows are streamed chain by chain.
+    All altlocs are written by default."""
+    with as_handle(file, 'w') as handle:
+        for lines in _iter_mmcif_line_blocks(entity, reset_serial, include_alt):
+            handle.writelines(lines)
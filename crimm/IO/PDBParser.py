@@ -1,15 +1,32 @@
 from string import ascii_uppercase
 import warnings
-import pathlib
 from Bio.PDB.PDBParser import PDBParser as _PDBParser
 from Bio.Data.PDBData import (
     protein_letters_3to1, protein_letters_3to1_extended,
     nucleic_letters_3to1, nucleic_letters_3to1_extended
 )
-from crimm.IO.StructureBuilder import StructureBuilder
+from Bio.PDB.PDBExceptions import PDBConstructionException
+from crimm.IO.StructureBuilder import StructureBuilder, ChainConstructionWarning
+from crimm.IO.CompressedFile import get_compression_module, get_file_stem
 from crimm.StructEntities.Chain import Solvent, Heterogens, PolymerChain, Chain
+from crimm.StructEntities.Residue import Residue, Heterogen
+from crimm.Utils.StructureUtils import index_to_letters, gc_paused
 
 protein_letters_3to1.update({'HSD': 'H', 'HSE': 'H', 'HSP': 'H'})
+# residue name lookup sets for determining the chain types during parsing
+_PROTEIN_RESNAMES = frozenset(protein_letters_3to1)
+_PROTEIN_EXT_RESNAMES = frozenset(protein_letters_3to1_extended)
+_NUCLEIC_RESNAMES = frozenset(nucleic_letters_3to1)
+_NUCLEIC_EXT_RESNAMES = frozenset(nucleic_letters_3to1_extended)
+_SOLVENT_RESNAMES = frozenset(('HOH',))
+_CHAIN_SORT_DICT = {
+    'Polypeptide(L)': 0,
+    'Polyribonucleotide': 1,
+    'Chain': 2, # 'Chain' is a catch-all for 'unknown
+    'Heterogens': 3,
+    'Solvent': 4
+}
+
 def check_chain_type(residues, resname_lookup, extended_lookup=None):
     for res in residues:
         if res.resname not in resname_lookup:
@@ -115,6 +132,220 @@ def convert_chains(chains):
         new_chains.append(new_chain)
     return new_chains
 
+class _AuthorChain:
+    """Residues of an author chain collected during parsing (PRIVATE). The
+    residues are sorted into polymer residues, heterogens and solvent as they
+    are added, and the polymer type is tracked with the residue name lookup
+    sets, so the typed chains can be created without walking the residues
+    again."""
+    def __init__(self, chain_id):
+        self.chain_id = chain_id
+        self.res_ids = set()
+        self.polymer_res = []
+        self.het_res = []
+        self.water_res = []
+        self.is_protein = True
+        self.is_nucleic = True
+        # polymer residues that are only in the extended lookup tables
+        self.protein_ext_res = []
+        self.nucleic_ext_res = []
+
+    def add(self, residue):
+        """Sort the residue into the polymer, heterogen or solvent residues"""
+        res_id = residue.get_id()
+        if res_id in self.res_ids:
+            raise PDBConstructionException(f"{res_id} defined twice")
+        self.res_ids.add(res_id)
+        resname = residue.resname
+        if res_id[0] != ' ':
+            if resname in _SOLVENT_RESNAMES:
+                self.water_res.append(residue)
+            else:
+                self.het_res.append(residue)
+            return
+        self.polymer_res.append(residue)
+        if self.is_protein and resname not in _PROTEIN_RESNAMES:
+            if resname in _PROTEIN_EXT_RESNAMES:
+                self.protein_ext_res.append(residue)
+            else:
+                self.is_protein = False
+        if self.is_nucleic and resname not in _NUCLEIC_RESNAMES:
+            if resname in _NUCLEIC_EXT_RESNAMES:
+                self.nucleic_ext_res.append(residue)
+            else:
+                self.is_nucleic = False
+
+    def get_polymer_type(self):
+        """Return the polymer chain type of the residues, and correct the
+        heterogen flags of the residues from the extended lookup tables"""
+        if self.is_protein:
+            chain_type, ext_res = 'Polypeptide(L)', self.protein_ext_res
+        elif self.is_nucleic:
+            chain_type, ext_res = 'Polyribonucleotide', self.nucleic_ext_res
+        else:
+            warnings.warn(
+                f'Chain type cannot be determined for chain {self.chain_id}'
+            )
+            return 'Chain'
+        for res in ext_res:
+            # Heterogen flag will be changed to 'H_{resname}'
+            _, resseq, icode = res.get_id()
+            res.id = (f'H_{res.resname}', resseq, icode)
+            warnings.warn(f"Heterogen flag for {res.get_id()} corrected.")
+        return chain_type
+
+    def iter_typed_residues(self):
+        """Yield the (chain type, residues) of the author chain"""
+        if self.polymer_res:
+            yield self.get_polymer_type(), self.polymer_res
+        yield 'Heterogens', self.het_res
+        yield 'Solvent', self.water_res
+
+
+class PDBStructureBuilder(StructureBuilder):
+    """StructureBuilder for PDBParser that builds the typed chains
+    (PolymerChain, Chain, Heterogens and Solvent) directly. The residues of
+    each author chain are sorted by type as they are parsed, and the chains
+    are created when the model is complete.
+
+    Arguments:
+     :first_model_only: if True, the records of the other models are skipped
+     :include_solvent: if False, the solvent chains are not created
+    """
+    def __init__(self, first_model_only=True, include_solvent=True):
+        super().__init__()
+        self.first_model_only = first_model_only
+        self.include_solvent = include_solvent
+        self._author_chains = None
+        self._skip_model = False
+
+    def init_structure(self, structure_id):
+        super().init_structure(structure_id)
+        self._author_chains = None
+        self._skip_model = False
+
+    def init_model(self, model_id, serial_num = None):
+        self._build_chains()
+        if self.first_model_only and self.model is not None:
+            # The atoms of the other models are not built
+            self._skip_model = True
+            self.chain = None
+            self.residue = None
+            self.atom = None
+            return
+        super().init_model(model_id, serial_num)
+        self._author_chains = {}
+
+    def init_chain(self, chain_id):
+        if self._skip_model:
+            return
+        if chain_id in self._author_chains:
+            warnings.warn(
+                f"WARNING: Chain {chain_id} is discontinuous at "
+                f"line {self.line_counter}.",
+                ChainConstructionWarning,
+            )
+        else:
+            self._author_chains[chain_id] = _AuthorChain(chain_id)
+        self.chain = self._author_chains[chain_id]
+
+    def init_residue(self, resname, field, resseq, icode, author_seq_id=None):
+        if self._skip_model:
+            self.residue = None
+            return
+        if field == 'H':
+            # The hetero field consists of H_ + the residue name (e.g. H_FUC)
+            residue = Heterogen(('H_' + resname, resseq, icode), resname, self.segid)
+        else:
+            residue = Residue(
+                (field, resseq, icode), resname, self.segid, author_seq_id
+            )
+        self.chain.add(residue)
+        self.residue = residue
+
+    def init_atom(
+        self, name, coord, b_factor, occupancy, altloc, fullname,
+        serial_number=None, element=None,
+    ):
+        if (
+            name == 'CD' and self.residue is not None and
+            self.residue.resname == 'ILE'
+        ):
+            # ILE could have a CD atom (CHARMM convention)
+            # that is not in the standard PDB format
+            name, fullname = 'CD1', ' CD1'
+        super().init_atom(
+            name, coord, b_factor, occupancy, altloc, fullname,
+            serial_number, element
+        )
+
+    def set_anisou(self, anisou_array):
+        if self._skip_model:
+            return
+        super().set_anisou(anisou_array)
+
+    def set_siguij(self, siguij_array):
+        if self._skip_model:
+            return
+        super().set_siguij(siguij_array)
+
+    def set_sigatm(self, sigatm_array):
+        if self._skip_model:
+            return
+        super().set_sigatm(sigatm_array)
+
+    @staticmethod
+    def _create_chain(chain_type, chain_id, auth_chain_id):
+        """Create the chain of the chain type (PRIVATE)"""
+        if chain_type in ('Polypeptide(L)', 'Polyribonucleotide'):
+            return PolymerChain(
+                chain_id = chain_id,
+                entity_id = None,
+                author_chain_id = auth_chain_id,
+                chain_type = chain_type,
+                known_sequence = '',
+                canon_sequence = '',
+                reported_res = [],
+                reported_missing_res = []
+            )
+        if chain_type == 'Chain':
+            return Chain(chain_id)
+        if chain_type == 'Heterogens':
+            return Heterogens(chain_id)
+        return Solvent(chain_id)
+
+    def _build_chains(self):
+        """Create the typed chains of the current model from the residues
+        collected (PRIVATE). The chains are ordered by type and named by the
+        alphabet."""
+        if not self._author_chains or self._skip_model:
+            return
+        typed_residues = []
+        for author_chain in self._author_chains.values():
+            for chain_type, residues in author_chain.iter_typed_residues():
+                if residues:
+                    typed_residues.append(
+                        (chain_type, author_chain.chain_id, residues)
+                    )
+        typed_residues.sort(key=lambda x: _CHAIN_SORT_DICT[x[0]])
+        for i, (chain_type, auth_chain_id, residues) in enumerate(
+            typed_residues
+        ):
+            if chain_type == 'Solvent' and not self.include_solvent:
+                continue
+            chain = self._create_chain(
+                chain_type, index_to_letters(i), auth_chain_id
+            )
+            for res in residues:
+                chain.add(res)
+            self.model.add(chain)
+        self._author_chains = None
+        self.chain = None
+
+    def get_structure(self):
+        self._build_chains()
+        return super().get_structure()
+
 class PDBParser(_PDBParser):
     """PDBParser that returns a Structure with determined chain types."""
     def __init__(
@@ -125,7 +356,9 @@ class PDBParser(_PDBParser):
             get_header=False, 
             QUIET=False
         ):
-        structure_builder = StructureBuilder()
+        structure_builder = PDBStructureBuilder(
+            first_model_only, include_solvent
+        )
         self.first_model_only = first_model_only
         self.include_solvent = include_solvent
         PERMISSIVE = not strict_parser
@@ -136,20 +369,17 @@ class PDBParser(_PDBParser):
     def _get_structure(self, filepath, structure_id=None):
         """Return the structure contained in file."""
         if structure_id is None:
-            structure_id = pathlib.Path(filepath).stem
-        structure = super().get_structure(structure_id, filepath)
-        if self.first_model_only:
-            structure.child_list = structure.child_list[:1]
-            structure.child_dict = {c.id: c for c in structure.child_list}
-        for model in structure:
-            new_chains = convert_chains(model.child_list)
-            if not self.include_solvent:
-                new_chains = [c for c in new_chains if c.chain_type != 'Solvent']
-            for chain in new_chains:
-                chain.set_parent(model)
-            model.child_list = new_chains
-            model.child_dict = {c.id: c for c in new_chains}
-        return structure
+            structure_id = get_file_stem(filepath)
+        # the chain types are determined by the structure builder while the
+        # file is parsed
+        self.structure_builder.first_model_only = self.first_model_only
+        self.structure_builder.include_solvent = self.include_solvent
+        compression = get_compression_module(filepath)
+        with gc_paused():
+            if compression is not None:
+                with compression.open(filepath, 'rt') as handle:
+                    return super().get_structure(structure_id, handle)
+            return super().get_structure(structure_id, filepath)
 
     def get_structure(self, filepath, structure_id=None):
         """Return the structure contained in file."""
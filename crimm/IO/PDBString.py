@@ -1,4 +1,6 @@
 import warnings
+import numpy as np
+from Bio.File import as_handle
 
 # Allowed Elements
 from Bio.Data.IUPACData import atom_weights
@@ -8,8 +10,89 @@ _ATOM_FORMAT_STRING = (
     "%s%5i %-4s%c%3s %c%4i%c   %8.3f%8.3f%8.3f%s%6.2f      %4s%2s%2s\n"
 )
 _TER_FORMAT_STRING = (
-    "TER   %5i      %3s %c%4i%c                                                      \n"
+    "TER   %5s      %3s %c%4s%c                                                      \n"
 )
+# Format strings of the atom lines with the residue fields (resname, chain id,
+# resseq, icode) preformatted once per residue. They produce the same lines as
+# _ATOM_FORMAT_STRING
+_RESIDUE_FORMAT_STRING = "%3s %s%4s%s   "
+_ATOM_RES_FORMAT_STRING = (
+    "%s%5s %-4s%s%s%8.3f%8.3f%8.3f%s%6.2f      %4s%2s  \n"
+)
+
+_HY36_DIGITS_UPPER = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_HY36_DIGITS_LOWER = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def _encode_base36(value, width, digits):
+    """Encode a non-negative integer with the digits right justified to the
+    width (PRIVATE)"""
+    result = []
+    while value:
+        value, remainder = divmod(value, 36)
+        result.append(digits[remainder])
+    return "".join(reversed(result)).rjust(width, "0")
+
+def hy36encode(width, value):
+    """Encode an integer as a hybrid-36 string of the given width (e.g. 5 for
+    atom serial numbers and 4 for residue sequence numbers). Numbers that fit
+    in the width are written as decimal, and larger numbers continue with
+    base-36 using upper case letters first (A0000 follows 99999), then lower
+    case letters (a0000 follows ZZZZZ).
+    See http://cci.lbl.gov/hybrid_36/
+    """
+    if 1 - 10**(width - 1) <= value < 10**width:
+        return "%*d" % (width, value)
+    block_size = 26 * 36**(width - 1)
+    offset = 10 * 36**(width - 1)
+    shifted = value - 10**width
+    if 0 <= shifted < block_size:
+        return _encode_base36(shifted + offset, width, _HY36_DIGITS_UPPER)
+    shifted -= block_size
+    if 0 <= shifted < block_size:
+        return _encode_base36(shifted + offset, width, _HY36_DIGITS_LOWER)
+    raise ValueError(
+        f"Value ({value}) out of range for hybrid-36 encoding of width {width}"
+    )
+
+def hy36encode_array(width, values):
+    """Encode an array of integers as hybrid-36 (see hy36encode). Return a
+    list of the values that can be formatted with "%{width}s", i.e. the 
+    original integers if all of them fit in the width in decimal, otherwise
+    a list of str."""
+    values = np.asarray(values, dtype=np.int64)
+    decimal_max = 10**width
+    if len(values) == 0 or (
+        values.min() >= 1 - 10**(width - 1) and values.max() < decimal_max
+    ):
+        return values.tolist()
+    if values.min() < 1 - 10**(width - 1):
+        raise ValueError(
+            f"Value ({values.min()}) out of range for hybrid-36 encoding of "
+            f"width {width}"
+        )
+    block_size = 26 * 36**(width - 1)
+    shifted = values - decimal_max
+    if shifted.max() >= 2 * block_size:
+        raise ValueError(
+            f"Value ({values.max()}) out of range for hybrid-36 encoding of "
+            f"width {width}"
+        )
+    is_upper = shifted < block_size
+    shifted = np.where(is_upper, shifted, shifted - block_size)
+    shifted += 10 * 36**(width - 1)
+    powers = 36 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (shifted[:, np.newaxis] // powers) % 36
+    chars = np.where(
+        is_upper[:, np.newaxis],
+        np.array(list(_HY36_DIGITS_UPPER))[digits],
+        np.array(list(_HY36_DIGITS_LOWER))[digits],
+    )
+    encoded = np.ascontiguousarray(chars).view(f'U{width}').ravel().tolist()
+    is_decimal = values < decimal_max
+    if is_decimal.any():
+        for i in np.flatnonzero(is_decimal).tolist():
+            encoded[i] = "%*d" % (width, values[i])
+    return encoded
 
 def _get_atom_line_with_parent_info(atom: Entities.Atom, trunc_resname=False):
     """Return the parent info of the atom (PRIVATE). Atom must have a parent residue."""
@@ -42,7 +125,10 @@ def _get_ter_line(atom: Entities.Atom, trunc_resname=False):
         # the nglview visualization
         resname = resname[:3]
 
-    args = (atom.get_serial_number(), resname, chain_id, resseq, icode)
+    args = (
+        hy36encode(5, atom.get_serial_number()), resname, chain_id,
+        hy36encode(4, resseq), icode
+    )
     return _TER_FORMAT_STRING % args
 
 def _get_orphan_atom_line(atom: Entities.Atom, trunc_resname=False):
@@ -94,55 +180,23 @@ def _get_atom_line(
             " preserve_atom_numbering=False"
         ) from exc
 
-    if atom_number > 99999:
-        raise ValueError(
-            f"Atom serial number ('{atom_number}') exceeds PDB format limit."
-        )
-
-    # Check if the element is valid, unknown (X), or blank
-    if atom.element:
-        element = atom.element.strip().upper()
-        if element.capitalize() not in atom_weights and element != "X":
-            raise ValueError(f"Unrecognised element {atom.element}")
-        element = element.rjust(2)
-    else:
-        element = "  "
-
-    # Format atom name
-    # Pad if:
-    #     - smaller than 4 characters
-    # AND - is not C, N, O, S, H, F, P, ..., one letter elements
-    # AND - first character is NOT numeric (funky hydrogen naming rules)
-    name = atom.fullname.strip()
-    if len(name) < 4 and name[:1].isalpha() and len(element.strip()) < 2:
-        name = " " + name
-
+    element = _format_element(atom.element)
+    name = _format_atom_name(atom.fullname, element)
     altloc = atom.altloc
     x, y, z = atom.coord
 
     # Write PDB format line
     bfactor = atom.bfactor
-    try:
-        occupancy = f"{atom.occupancy:6.2f}"
-    except (TypeError, ValueError):
-        if atom.occupancy is None:
-            occupancy = " " * 6
-            warnings.warn(
-                f"Missing occupancy in atom {atom.full_id!r} written as blank"
-            )
-        else:
-            raise ValueError(
-                f"Invalid occupancy value: {atom.occupancy!r}"
-            ) from None
+    occupancy = _format_occupancy(atom)
 
     args = (
         record_type,
-        atom_number,
+        hy36encode(5, atom_number),
         name,
         altloc,
         resname,
         chain_id,
-        resseq,
+        hy36encode(4, resseq),
         icode,
         x,
         y,
@@ -155,32 +209,159 @@ def _get_atom_line(
     )
     return _ATOM_FORMAT_STRING % args
 
-##TODO: Add support for CONECT records
-def get_pdb_str(entity, reset_serial=True, include_alt=False, trunc_resname=False):
-    """Return the PDB string of the entity."""
+def _format_element(element):
+    """Validate and right justify the element symbol (PRIVATE). Valid
+    elements, unknown (X), or blank are accepted"""
+    if not element:
+        return "  "
+    element = element.strip().upper()
+    if element.capitalize() not in atom_weights and element != "X":
+        raise ValueError(f"Unrecognised element {element}")
+    return element.rjust(2)
+
+def _format_atom_name(fullname, element):
+    """Format the atom name for the atom line (PRIVATE)."""
+    # Pad if:
+    #     - smaller than 4 characters
+    # AND - is not C, N, O, S, H, F, P, ..., one letter elements
+    # AND - first character is NOT numeric (funky hydrogen naming rules)
+    name = fullname.strip()
+    if len(name) < 4 and name[:1].isalpha() and len(element.strip()) < 2:
+        name = " " + name
+    return name
+
+def _format_occupancy(atom):
+    """Format the occupancy of the atom (PRIVATE). Missing occupancy is
+    written as blank"""
+    try:
+        return f"{atom.occupancy:6.2f}"
+    except (TypeError, ValueError):
+        if atom.occupancy is None:
+            warnings.warn(
+                f"Missing occupancy in atom {atom.full_id!r} written as blank"
+            )
+            return " " * 6
+        raise ValueError(
+            f"Invalid occupancy value: {atom.occupancy!r}"
+        ) from None
+
+def _get_chain_lines(chain, include_alt=False, trunc_resname=False):
+    """Return the list of atom lines and the TER line of a chain (PRIVATE).
+    The serial numbers and residue sequence numbers are encoded as columns, the
+    residue fields are formatted once per residue, and the element and atom 
+    name formatting are cached."""
+    atoms = list(chain.get_atoms(include_alt=include_alt))
+    if len(atoms) == 0:
+        return []
+    try:
+        serials = hy36encode_array(
+            5, [atom.get_serial_number() for atom in atoms]
+        )
+    except TypeError as exc:
+        raise ValueError(
+            "Atom serial numbers must be numerical"
+        ) from exc
+
+    # residue columns
+    residues = []
+    atom_res_idx = []
+    cur_residue = None
+    for atom in atoms:
+        if atom.parent is not cur_residue:
+            cur_residue = atom.parent
+            residues.append(cur_residue)
+        atom_res_idx.append(len(residues) - 1)
+    resseqs = hy36encode_array(4, [res.id[1] for res in residues])
+    res_fields = []
+    for residue, resseq in zip(residues, resseqs):
+        hetfield, _, icode = residue.id
+        resname = residue.resname
+        if len(resname) > 3 and trunc_resname:
+            # Truncate residue name to 3 characters so it does not mess up
+            # the nglview visualization
+            resname = resname[:3]
+        if (res_parent:=residue.parent) is not None:
+            chain_id = res_parent.get_id()[0]
+        else:
+            chain_id = '_'
+        res_fields.append((
+            "HETATM" if hetfield != " " else "ATOM  ",
+            _RESIDUE_FORMAT_STRING % (resname, chain_id, resseq, icode),
+            residue.segid
+        ))
+
+    element_cache = {}
+    name_cache = {}
+    coords = np.array([atom.coord for atom in atoms], dtype=float).tolist()
+    lines = []
+    for atom, serial, res_idx, (x, y, z) in zip(
+        atoms, serials, atom_res_idx, coords
+    ):
+        record_type, residue_str, segid = res_fields[res_idx]
+        if (element := element_cache.get(atom.element)) is None:
+            element = element_cache[atom.element] = _format_element(atom.element)
+        name_key = (atom.fullname, element)
+        if (name := name_cache.get(name_key)) is None:
+            name = name_cache[name_key] = _format_atom_name(*name_key)
+        lines.append(_ATOM_RES_FORMAT_STRING % (
+            record_type, serial, name, atom.altloc, residue_str, x, y, z,
+            _format_occupancy(atom), atom.bfactor, segid, element
+        ))
+    lines.append(_get_ter_line(atoms[-1], trunc_resname))
+    return lines
+
+def _get_chains(entity):
+    """Return the chains of the entity to be written (PRIVATE). Only the first
+    model is written for a structure."""
+    if entity.level in ('C', 'R', 'A'):
+        return [entity]
+    if entity.level == 'M':
+        return entity.child_list
+    if entity.level == 'S':
+        return entity.child_list[0].child_list
+    return []
+
+def _iter_pdb_line_blocks(entity, reset_serial, include_alt, trunc_resname):
+    """Yield the lines of the PDB string in blocks of chains (PRIVATE)."""
     if reset_serial and hasattr(entity, 'reset_atom_serial_numbers'):
         entity.reset_atom_serial_numbers(include_alt=include_alt)
 
     if entity.level == 'A':
         if entity.parent is None:
-            return _get_orphan_atom_line(entity, trunc_resname)
-        return _get_atom_line_with_parent_info(entity, trunc_resname)
+            yield [_get_orphan_atom_line(entity, trunc_resname)]
+        else:
+            yield [_get_atom_line_with_parent_info(entity, trunc_resname)]
+        return
 
-    chains = None
-    if entity.level in ('C', 'R', 'A'):
-        chains = [entity]
-    elif entity.level == 'M':
-        chains = entity.child_list
-    elif entity.level == 'S':
-        chains = entity.child_list[0].child_list
-    
-    pdb_str = ''
-    for chain in chains:
-        atoms = list(chain.get_atoms(include_alt=include_alt))
-        if len(atoms) == 0:
-            continue
-        for atom in atoms:
-            pdb_str += _get_atom_line_with_parent_info(atom, trunc_resname)
-        pdb_str += _get_ter_line(atoms[-1], trunc_resname)
-    pdb_str += 'END\n'
-    return pdb_str
\ No newline at end of file
+    for chain in _get_chains(entity):
+        yield _get_chain_lines(chain, include_alt, trunc_resname)
+    yield ['END\n']
+
+def iter_pdb_lines(
+        entity, reset_serial=True, include_alt=False, trunc_resname=False
+    ):
+    """Yield the lines of the PDB string of the entity. Atom serial numbers 
+    and residue sequence numbers that exceed the PDB format limits are written
+    in hybrid-36."""
+    for lines in _iter_pdb_line_blocks(
+        entity, reset_serial, include_alt, trunc_resname
+    ):
+        yield from lines
+
+##TODO: Add support for CONECT records
+def get_pdb_str(entity, reset_serial=True, include_alt=False, trunc_resname=False):
+    """Return the PDB string of the entity."""
+    return ''.join(
+        iter_pdb_lines(entity, reset_serial, include_alt, trunc_resname)
+    )
+
+def write_pdb(
+        entity, file, reset_serial=True, include_alt=False, trunc_resname=False
+    ):
+    """Write the entity to a PDB file (path or an open text mode file handle).
+    The lines are streamed to the file chain by chain."""
+    with as_handle(file, 'w') as handle:
+        for lines in _iter_pdb_line_blocks(
+            entity, reset_serial, include_alt, trunc_resname
+        ):
+            handle.writelines(lines)
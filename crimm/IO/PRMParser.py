@@ -10,6 +10,16 @@ cmap_par = namedtuple('cmap_param',['degree', 'values'])
 nonbond_par = namedtuple('nonbond_param', ['epsilon', 'rmin_half'])
 nonbond14_par = namedtuple('nonbond14_param', ['epsilon', 'rmin_half'])
 nbfix_par = namedtuple('nbfix_param', ['emin','rmin'])
+# pickle looks up the classes by their qualified names, which namedtuple sets to
+# the type names. Point them to the module attributes so that the parameters can
+# be pickled, while the repr still shows the type names.
+for _attr_name, _param_type in (
+    ('bond_par', bond_par), ('angle_par', angle_par), ('ub_par', ub_par),
+    ('dihe_par', dihe_par), ('impr_par', impr_par), ('cmap_par', cmap_par),
+    ('nonbond_par', nonbond_par), ('nonbond14_par', nonbond14_par),
+    ('nbfix_par', nbfix_par)
+):
+    _param_type.__qualname__ = _attr_name
 
 def categorize_lines(lines):
     line_dict = {
@@ -0,0 +1,272 @@
+"""
+Module containing the parser class for constructing structures with topology
+from CHARMM protein structure files (PSF).
+
+The atom records (segid, resid, resname, atom name, atom type, charge and mass)
+are read into the atom topology definitions, and the bonds, angles, dihedrals,
+impropers and cross-terms are loaded into the topology elements of the chains.
+The coordinates are read from a matching CRD file if provided. Both the
+standard and the extended (EXT) formats are read. Only the XPLOR format (atom
+types as names) has the atom types in the PSF, and the atom types of the CHARMM
+format are the type indices.
+
+Residues are detected through a change in resid, and segments through a change
+in segid, in the same way as in CRDParser.
+"""
+import warnings
+import numpy as np
+from Bio.PDB.PDBExceptions import PDBConstructionWarning
+from crimm import StructEntities as Entities
+from crimm.IO.CRDParser import CRDParser, read_crd_columns, _convert_resid
+from crimm.IO.CompressedFile import open_decompressed, get_file_stem
+from crimm.Utils.StructureUtils import gc_paused
+
+# Topology element sections as (section name, key, number of atoms per element)
+_PSF_ELEMENT_SECTIONS = {
+    'NBOND': ('bonds', 2),
+    'NTHETA': ('angles', 3),
+    'NPHI': ('dihedrals', 4),
+    'NIMPHI': ('impropers', 4),
+    'NCRTERM': ('cmap', 8),
+}
+
+def _find_section(lines, i):
+    """Find the next section header line ("counts !NAME") from line i
+    (PRIVATE). Return the list of counts, the section name and the index of the
+    line after the header, or (None, None, len(lines)) if there is none."""
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if '!' not in line:
+            continue
+        counts, name = line.split('!', 1)
+        try:
+            counts = [int(count) for count in counts.split()]
+        except ValueError:
+            continue
+        if counts and name.strip():
+            return counts, name.split()[0].rstrip(':').upper(), i
+    return None, None, i
+
+def _read_ints(lines, i, n_values):
+    """Read n_values integers starting from line i (PRIVATE). Return the int
+    array and the index of the next line."""
+    values = []
+    while len(values) < n_values:
+        if i >= len(lines):
+            raise ValueError(
+                f'Expected {n_values} values in PSF section, but found '
+                f'{len(values)}'
+            )
+        values.extend(lines[i].split())
+        i += 1
+    return np.array(values[:n_values], dtype=np.int64), i
+
+def _read_atoms(lines, i, n_atoms):
+    """Read the NATOM records starting from line i (PRIVATE)"""
+    records = [line.split() for line in lines[i:i+n_atoms]]
+    if len(records) != n_atoms or any(len(r) < 8 for r in records):
+        raise ValueError('Invalid NATOM section in PSF file')
+    fields = list(zip(*(r[:8] for r in records))) or [()]*8
+    serial, segid, resid, resname, atomname, atom_type, charge, mass = (
+        list(field) for field in fields
+    )
+    return {
+        'serial': np.array(serial, dtype=np.int64),
+        'segid': segid,
+        'resid': resid,
+        'resname': resname,
+        'atomname': atomname,
+        'atom_type': atom_type,
+        'charge': np.array(charge, dtype=float),
+        'mass': np.array(mass, dtype=float),
+    }, i + n_atoms
+
+def read_psf(filepath):
+    """Read a PSF file into a dictionary. The atom records are stored as the
+    lists of "segid", "resid", "resname", "atomname" and "atom_type", and the
+    arrays of "serial", "charge" and "mass". The topology elements are stored
+    as the (N, k) arrays of 0-based atom indices under "bonds", "angles",
+    "dihedrals", "impropers" and "cmap", and the groups as the (N, 3) array of
+    "groups" (0-based index of the first atom, group type, and move flag), the
+    same as get_psf_arrays from PSFWriter. The title lines are stored under
+    "title", and whether the file is in the EXT format under "ext".
+
+    Arguments:
+     :filepath: path to the PSF file (can be gzip/bzip2/xz compressed)
+    """
+    with open_decompressed(filepath) as f:
+        lines = f.readlines()
+    flags = lines[0].split() if lines else []
+    if not flags or flags[0] != 'PSF':
+        raise ValueError(f'Not a PSF file: {filepath}')
+    psf_data = {
+        'title': [],
+        'ext': 'EXT' in flags,
+        'groups': np.empty((0, 3), dtype=np.int64),
+    }
+    for key, n_per_element in _PSF_ELEMENT_SECTIONS.values():
+        psf_data[key] = np.empty((0, n_per_element), dtype=np.int64)
+
+    i = 1
+    while True:
+        counts, name, i = _find_section(lines, i)
+        if counts is None:
+            break
+        if name == 'NTITLE':
+            psf_data['title'] = [
+                line.rstrip('\r\n')[1:].strip()
+                for line in lines[i:i+counts[0]]
+            ]
+            i += counts[0]
+        elif name == 'NATOM':
+            atom_data, i = _read_atoms(lines, i, counts[0])
+            psf_data.update(atom_data)
+        elif name in _PSF_ELEMENT_SECTIONS:
+            key, n_per_element = _PSF_ELEMENT_SECTIONS[name]
+            values, i = _read_ints(lines, i, counts[0] * n_per_element)
+            psf_data[key] = values.reshape(-1, n_per_element) - 1
+        elif name == 'NGRP':
+            values, i = _read_ints(lines, i, counts[0] * 3)
+            psf_data['groups'] = values.reshape(-1, 3)
+
+    if 'atomname' not in psf_data:
+        raise ValueError(f'No NATOM section found in PSF file: {filepath}')
+    return psf_data
+
+class PSFParser(CRDParser):
+    """Parse a CHARMM protein structure file (PSF) for the structure and its
+    topology. The coordinates are read from the CRD file if provided.
+
+    Reads the following Attributes:
+     - Atomids
+     - Atomnames
+     - Resids
+     - Resnames
+     - Segids
+     - Atomtypes
+     - Charges
+     - Masses
+     - Groups
+     - Bonds, Angles, Dihedrals, Impropers and Cross-terms
+    """
+
+    def get_structure(self, filepath, structure_id = None, crd_file = None):
+        """Return the structure.
+
+        Arguments:
+         :filepath: path to PSF file (can be gzip/bzip2/xz compressed)
+         :structure_id: string, the id that will be used for the structure
+         :crd_file: path to the CRD file of the coordinates, with the atoms in
+                    the same order as the PSF
+        """
+        with warnings.catch_warnings():
+            if self.QUIET:
+                warnings.filterwarnings(
+                    "ignore", category=PDBConstructionWarning
+                )
+            psf_data = read_psf(filepath)
+            columns = self._get_columns(psf_data, crd_file)
+            if structure_id is None:
+                structure_id = get_file_stem(filepath)
+            with gc_paused():
+                self._build_structure(structure_id, columns)
+                self._load_topology(psf_data)
+
+        return self._structure_builder.get_structure()
+
+    @staticmethod
+    def _get_columns(psf_data, crd_file):
+        """Create the columns for _build_structure from the PSF atom records
+        and the CRD coordinates (PRIVATE)"""
+        n_atoms = len(psf_data['atomname'])
+        resid, icode = _convert_resid(np.array(psf_data['resid'], dtype=bytes))
+        columns = {
+            'serial': psf_data['serial'],
+            # residues are separated by resid and segid only
+            'resnum': np.zeros(n_atoms, dtype=np.int64),
+            'resname': psf_data['resname'],
+            'atomname': psf_data['atomname'],
+            'coord': None,
+            'segid': psf_data['segid'],
+            'resid': resid,
+            'icode': icode,
+            'tempFactor': np.zeros(n_atoms),
+        }
+        if crd_file is not None:
+            crd_columns = read_crd_columns(crd_file)
+            if len(crd_columns['serial']) != n_atoms:
+                raise ValueError(
+                    f'Number of atoms in CRD file ({len(crd_columns["serial"])})'
+                    f' does not match the PSF file ({n_atoms})'
+                )
+            columns['coord'] = crd_columns['coord']
+            columns['tempFactor'] = crd_columns['tempFactor']
+        return columns
+
+    def _load_topology(self, psf_data):
+        """Load the atom definitions, groups and topology elements from the
+        PSF onto the structure (PRIVATE)"""
+        # TopoLoader imports crimm.IO
+        from crimm.Modeller.TopoLoader import TopologyElementContainer
+
+        model = self._structure_builder.model
+        chains = model.child_list
+        atoms = []
+        atom_chain_index = []
+        for i, chain in enumerate(chains):
+            chain_atoms = list(chain.get_atoms())
+            atoms.extend(chain_atoms)
+            atom_chain_index.extend([i]*len(chain_atoms))
+        atom_chain_index = np.array(atom_chain_index, dtype=np.int64)
+
+        for atom, name, atom_type, charge, mass in zip(
+            atoms, psf_data['atomname'], psf_data['atom_type'],
+            psf_data['charge'].tolist(), psf_data['mass'].tolist()
+        ):
+            atom.topo_definition = Entities.AtomDefinition(
+                None, name, atom_type, charge, mass
+            )
+
+        group_starts = psf_data['groups'][:, 0].tolist()
+        group_ends = group_starts[1:] + [len(atoms)]
+        for start, end in zip(group_starts, group_ends):
+            residue = atoms[start].parent
+            if residue.atom_groups is None:
+                residue.atom_groups = []
+            residue.atom_groups.append(tuple(atoms[start:end]))
+
+        element_types = (
+            ('bonds', Entities.Bond), ('angles', Entities.Angle),
+            ('dihedrals', Entities.Dihedral), ('impropers', Entities.Improper),
+        )
+        for i, chain in enumerate(chains):
+            chain_atom_ids = np.flatnonzero(atom_chain_index == i)
+            topo_elements = TopologyElementContainer()
+            topo_elements.containing_entity = chain
+            visited_atom_ids = [chain_atom_ids]
+            # elements across chains (e.g. disulfide bonds) belong to the
+            # chain of their first atom
+            for key, element_cls in element_types:
+                indices = psf_data[key]
+                indices = indices[atom_chain_index[indices[:, 0]] == i]
+                visited_atom_ids.append(indices.ravel())
+                setattr(topo_elements, key, [
+                    element_cls(*(atoms[j] for j in element))
+                    for element in indices.tolist()
+                ])
+            cmap = psf_data['cmap']
+            cmap = cmap[atom_chain_index[cmap[:, 0]] == i]
+            if len(cmap):
+                topo_elements.cmap = [
+                    Entities.CMap(
+                        Entities.Dihedral(*(atoms[j] for j in element[:4])),
+                        Entities.Dihedral(*(atoms[j] for j in element[4:]))
+                    ) for element in cmap.tolist()
+                ]
+            topo_elements._visited_atoms = [
+                atoms[j] for j in
+                np.unique(np.concatenate(visited_atom_ids)).tolist()
+            ]
+            topo_elements.create_atom_lookup_table()
+            chain.topo_elements = topo_elements
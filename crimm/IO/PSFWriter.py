@@ -0,0 +1,350 @@
+"""Writer for crimm entities in CHARMM protein structure file (PSF) format.
+
+The atom types, charges and masses are taken from the topology definitions of
+the atoms, and the bonds, angles, dihedrals, impropers and cross-terms from the
+topology elements of the chains (see TopologyGenerator.generate). Waters
+without topology definitions are written as TIP3 with the TIP3P parameters.
+The PSF is written in XPLOR format (atom types as names), and the extended
+(EXT) format is used automatically when required. The atoms are in the same
+order as the CRD file from write_crd.
+"""
+import numpy as np
+from Bio.File import as_handle
+from crimm.IO.CRDWriter import (
+    _get_chains, _get_segid, _get_resid, _get_charmm_resname,
+    _get_residue_atoms, _WATER_RESNAMES
+)
+
+# TIP3P water, atom name: (atom type, charge, mass)
+_TIP3_ATOMS = {
+    'OH2': ('OT', -0.834, 15.9994),
+    'H1': ('HT', 0.417, 1.008),
+    'H2': ('HT', 0.417, 1.008),
+}
+# the H1-H2 bond is needed for SHAKE
+_TIP3_BONDS = (('OH2', 'H1'), ('OH2', 'H2'), ('H1', 'H2'))
+_TIP3_ANGLES = (('H1', 'OH2', 'H2'),)
+
+_PSF_ATOM_FORMAT_STRING = "%8d %-4s %-4s %-4s %-4s %-4s %10.6f %13.4f %11d\n"
+_PSF_EXT_ATOM_FORMAT_STRING = (
+    "%10d %-8s %-8s %-8s %-8s %-6s %10.6f %13.4f %11d\n"
+)
+# Topology element types as
+# (key, section title, number of atoms per element, elements per line)
+_PSF_TOPO_SECTIONS = (
+    ('bonds', 'NBOND: bonds', 2, 4),
+    ('angles', 'NTHETA: angles', 3, 3),
+    ('dihedrals', 'NPHI: dihedrals', 4, 2),
+    ('impropers', 'NIMPHI: impropers', 4, 2),
+)
+_MAX_STD_ATOMS = 100000
+_MAX_STD_NAME_LEN = 4
+# net charge threshold of neutral groups
+_NEUTRAL_CHARGE_TOL = 1e-4
+
+def _get_group_type(charges):
+    """Return the CHARMM group type (PRIVATE): 0 for groups without charges, 1
+    for neutral groups, and 2 for charged groups."""
+    if not any(charges):
+        return 0
+    if abs(sum(charges)) < _NEUTRAL_CHARGE_TOL:
+        return 1
+    return 2
+
+def _get_atom_params(residue, atoms, names, is_water):
+    """Return the (atom type, charge, mass) of the atoms in the residue from
+    the topology definitions, or the TIP3 parameters for waters (PRIVATE)"""
+    if is_water:
+        unknown = set(names) - _TIP3_ATOMS.keys()
+        if unknown:
+            raise ValueError(f'Unknown TIP3 water atoms {unknown} in {residue}')
+        return [_TIP3_ATOMS[name] for name in names]
+    params = []
+    for atom in atoms:
+        atom_def = atom.topo_definition
+        if atom_def is None:
+            raise ValueError(
+                f'Topology definition is not loaded for atom {atom.name} in '
+                f'{residue}!'
+            )
+        params.append((atom_def.atom_type, atom_def.charge, atom_def.mass))
+    return params
+
+def _get_residue_groups(residue, names, charges, start, is_water):
+    """Return the groups of the residue as (index of the first atom, group
+    type, move flag) (PRIVATE). The groups follow the atom groups of the
+    topology definition, and residues without them (e.g. water) are single
+    groups."""
+    if is_water or not residue.atom_groups:
+        return [(start, _get_group_type(charges), 0)]
+    atom_index = {name: i for i, name in enumerate(names)}
+    groups = []
+    for group in residue.atom_groups:
+        indices = [
+            atom_index.pop(atom.name) for atom in group
+            if atom.name in atom_index
+        ]
+        if indices:
+            group_type = _get_group_type([charges[i] for i in indices])
+            groups.append((start + min(indices), group_type, 0))
+    if atom_index:
+        # atoms not in any group are in a group of their own
+        indices = list(atom_index.values())
+        group_type = _get_group_type([charges[i] for i in indices])
+        groups.append((start + min(indices), group_type, 0))
+    return groups
+
+def _get_element_indices(elements, atom_index, name_index, n_atoms):
+    """Convert a list of topology elements to a (N, n_atoms) array of atom
+    indices (PRIVATE). Atoms that are not in the entity (e.g. the placeholders
+    of the missing atoms replaced by fix_chain) are looked up by their parent
+    residue and atom name."""
+    indices = []
+    for element in elements:
+        element_indices = []
+        for atom in element:
+            index = atom_index.get(id(atom))
+            if index is None:
+                index = name_index.get((id(atom.parent), atom.name))
+            if index is None:
+                raise ValueError(
+                    f'Topology elements contain atom {atom.name} of '
+                    f'{atom.parent} that is not in the entity. Build the '
+                    'missing atoms (e.g. with fix_chain) and re-run '
+                    'TopologyGenerator.generate() on the chain before '
+                    'writing the PSF.'
+                )
+            element_indices.append(index)
+        indices.append(element_indices)
+    return np.array(indices, dtype=np.int64).reshape(-1, n_atoms)
+
+def _get_water_element_indices(water_residues):
+    """Create the TIP3 bonds and angles of the water residues (PRIVATE).
+    water_residues is a list of dicts of atom name to atom index."""
+    bonds, angles = [], []
+    for names in water_residues:
+        for name1, name2 in _TIP3_BONDS:
+            if name1 in names and name2 in names:
+                bonds.append((names[name1], names[name2]))
+        for name1, name2, name3 in _TIP3_ANGLES:
+            if name1 in names and name2 in names and name3 in names:
+                angles.append((names[name1], names[name2], names[name3]))
+    return {
+        'bonds': np.array(bonds, dtype=np.int64).reshape(-1, 2),
+        'angles': np.array(angles, dtype=np.int64).reshape(-1, 3),
+    }
+
+def _get_chain_element_indices(chain, atom_index, name_index):
+    """Return the atom indices of the topology elements of the chain
+    (PRIVATE)"""
+    topo_elements = chain.topo_elements
+    if topo_elements is None:
+        raise ValueError(
+            f'Topology elements are not generated for {chain}! Use '
+            'TopologyGenerator.generate() on the chain first.'
+        )
+    element_indices = {}
+    for key, _, n_atoms, _ in _PSF_TOPO_SECTIONS:
+        element_indices[key] = _get_element_indices(
+            getattr(topo_elements, key) or [], atom_index, name_index, n_atoms
+        )
+    cmaps = [
+        tuple(atom for dihedral in cmap for atom in dihedral)
+        for cmap in (topo_elements.cmap or [])
+    ]
+    element_indices['cmap'] = _get_element_indices(
+        cmaps, atom_index, name_index, 8
+    )
+    return element_indices
+
+def get_psf_arrays(entity):
+    """Get the atom records and the topology of an entity for the PSF.
+
+    Return a dict with the lists of "segid", "resid", "resname", "atomname"
+    and "atom_type", the arrays of "charge" and "mass", the (N, k) arrays of
+    0-based atom indices of "bonds", "angles", "dihedrals", "impropers" and
+    "cmap", and the (N, 3) array of "groups" (0-based index of the first
+    atom, group type, and move flag).
+    """
+    segid, resid, resname, atomname = [], [], [], []
+    atom_params = []
+    groups = []
+    atom_index = {}
+    name_index = {}
+    element_indices = {key: [] for key, _, _, _ in _PSF_TOPO_SECTIONS}
+    element_indices['cmap'] = []
+    for chain in _get_chains(entity):
+        water_residues = []
+        has_topo_residues = False
+        for residue in chain:
+            atoms = _get_residue_atoms(residue)
+            is_water = (
+                residue.resname in _WATER_RESNAMES and
+                all(atom.topo_definition is None for atom in atoms)
+            )
+            has_topo_residues |= not is_water
+            cur_resname = _get_charmm_resname(residue)
+            cur_segid = _get_segid(residue, chain)
+            cur_resid = _get_resid(residue)
+            names = [atom.name for atom in atoms]
+            params = _get_atom_params(residue, atoms, names, is_water)
+            start = len(atomname)
+            n_atoms = len(atoms)
+            atom_index.update(zip(map(id, atoms), range(start, start+n_atoms)))
+            name_index.update(
+                ((id(atom.parent), atom.name), i)
+                for i, atom in enumerate(atoms, start)
+            )
+            segid.extend([cur_segid]*n_atoms)
+            resid.extend([cur_resid]*n_atoms)
+            resname.extend([cur_resname]*n_atoms)
+            atomname.extend(names)
+            atom_params.extend(params)
+            if is_water:
+                water_residues.append(dict(zip(names, range(start, start+n_atoms))))
+            groups.extend(
+                _get_residue_groups(
+                    residue, names, [p[1] for p in params], start, is_water
+                )
+            )
+
+        if has_topo_residues:
+            chain_indices = _get_chain_element_indices(
+                chain, atom_index, name_index
+            )
+            for key, indices in chain_indices.items():
+                element_indices[key].append(indices)
+        if water_residues:
+            water_indices = _get_water_element_indices(water_residues)
+            for key, indices in water_indices.items():
+                element_indices[key].append(indices)
+
+    atom_type, charge, mass = (
+        zip(*atom_params) if atom_params else ((), (), ())
+    )
+    psf_arrays = {
+        'segid': segid,
+        'resid': resid,
+        'resname': resname,
+        'atomname': atomname,
+        'atom_type': list(atom_type),
+        'charge': np.array(charge, dtype=float),
+        'mass': np.array(mass, dtype=float),
+        'groups': np.array(groups, dtype=np.int64).reshape(-1, 3),
+    }
+    for key, n_atoms in (
+        ('bonds', 2), ('angles', 3), ('dihedrals', 4), ('impropers', 4),
+        ('cmap', 8)
+    ):
+        indices = element_indices[key]
+        if indices:
+            psf_arrays[key] = np.concatenate(indices)
+        else:
+            psf_arrays[key] = np.empty((0, n_atoms), dtype=np.int64)
+    return psf_arrays
+
+def _needs_ext_format(psf_arrays):
+    """Return True if the atom records do not fit in the standard format
+    (PRIVATE)"""
+    if len(psf_arrays['atomname']) >= _MAX_STD_ATOMS:
+        return True
+    for key in ('segid', 'resid', 'resname', 'atomname', 'atom_type'):
+        if any(len(name) > _MAX_STD_NAME_LEN for name in set(psf_arrays[key])):
+            return True
+    return False
+
+def _iter_int_lines(values, per_line, width):
+    """Iterate over the lines of integers with per_line integers on each line
+    (PRIVATE)"""
+    values = values.ravel().tolist()
+    line_format = f'%{width}d' * per_line + '\n'
+    n_full = len(values) - len(values) % per_line
+    for i in range(0, n_full, per_line):
+        yield line_format % tuple(values[i:i+per_line])
+    if n_full < len(values):
+        remainder = values[n_full:]
+        yield (f'%{width}d' * len(remainder) + '\n') % tuple(remainder)
+
+def iter_psf_lines(entity, title=None, ext=None):
+    """Iterate over the lines of the PSF file of an entity.
+
+    Arguments:
+     :entity: Structure, Model or Chain with topology generated. Only the first
+              model of a structure is written.
+     :title: title lines (str or list of str) written after "*". Default is
+             the id of the entity.
+     :ext: if True, write in the extended format. If None, the extended format
+           is only used when required.
+    """
+    if title is None:
+        title = f'{entity.get_id()}'
+    yield from _iter_psf_array_lines(get_psf_arrays(entity), title, ext)
+
+def _iter_psf_array_lines(psf_arrays, title, ext):
+    """Iterate over the lines of the PSF file from the arrays of get_psf_arrays
+    (PRIVATE)"""
+    if ext is None:
+        ext = _needs_ext_format(psf_arrays)
+    width = 10 if ext else 8
+    if isinstance(title, str):
+        title = title.splitlines()
+
+    yield 'PSF EXT CMAP XPLOR\n\n' if ext else 'PSF CMAP XPLOR\n\n'
+    yield f'{len(title):{width}d} !NTITLE\n'
+    for line in title:
+        yield f'* {line}\n'
+    yield '\n'
+
+    n_atoms = len(psf_arrays['atomname'])
+    yield f'{n_atoms:{width}d} !NATOM\n'
+    atom_format = (
+        _PSF_EXT_ATOM_FORMAT_STRING if ext else _PSF_ATOM_FORMAT_STRING
+    )
+    for i, segid, resid, resname, atomname, atom_type, charge, mass in zip(
+        range(1, n_atoms+1), psf_arrays['segid'], psf_arrays['resid'],
+        psf_arrays['resname'], psf_arrays['atomname'],
+        psf_arrays['atom_type'], psf_arrays['charge'].tolist(),
+        psf_arrays['mass'].tolist()
+    ):
+        yield atom_format % (
+            i, segid, resid, resname, atomname, atom_type, charge, mass, 0
+        )
+    yield '\n'
+
+    for key, section_title, n_per_element, per_line in _PSF_TOPO_SECTIONS:
+        indices = psf_arrays[key]
+        yield f'{len(indices):{width}d} !{section_title}\n'
+        yield from _iter_int_lines(indices + 1, n_per_element * per_line, width)
+        yield '\n'
+
+    yield f'{0:{width}d} !NDON: donors\n\n'
+    yield f'{0:{width}d} !NACC: acceptors\n\n'
+    yield f'{0:{width}d} !NNB\n\n'
+    yield from _iter_int_lines(np.zeros(n_atoms, dtype=np.int64), 8, width)
+    yield '\n'
+
+    groups = psf_arrays['groups']
+    yield f'{len(groups):{width}d}{0:{width}d} !NGRP NST2\n'
+    yield from _iter_int_lines(groups, 9, width)
+    yield '\n'
+
+    yield f'{0:{width}d}{0:{width}d} !NUMLP NUMLPH\n\n'
+
+    cmap = psf_arrays['cmap']
+    yield f'{len(cmap):{width}d} !NCRTERM: cross-terms\n'
+    yield from _iter_int_lines(cmap + 1, 8, width)
+    yield '\n'
+
+def get_psf_str(entity, title=None, ext=None):
+    """Get the PSF format string of an entity (see iter_psf_lines)."""
+    return ''.join(iter_psf_lines(entity, title=title, ext=ext))
+
+def write_psf(entity, file, title=None, ext=None):
+    """Write an entity with topology to a PSF file (see iter_psf_lines).
+
+    Arguments:
+     :entity: Structure, Model or Chain
+     :file: file path or an open text mode file handle
+    """
+    with as_handle(file, 'w') as handle:
+        handle.writelines(iter_psf_lines(entity, title=title, ext=ext))
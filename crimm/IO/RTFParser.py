@@ -40,6 +40,19 @@ def defa_parser(line):
     last_patch = fields[last_i+1]
     return first_patch, last_patch
 
+def patching_parser(line):
+    """Parse keyword PATChing for the default terminal patches of a residue.
+    Either of the FIRSt and LAST patches can be omitted."""
+    field_str = comment_parser(line)[0]
+    fields = field_str.split()[1:]
+    patches = {}
+    for key, patch in zip(fields[::2], fields[1::2]):
+        if key.startswith('FIRS'):
+            patches['FIRST'] = patch
+        elif key.startswith('LAST'):
+            patches['LAST'] = patch
+    return patches
+
 def auto_parser(line):
     """Parse keyword AUTOGEN"""
     field_str = comment_parser(line)[0]
@@ -73,6 +86,17 @@ def pairwise_parser(line):
     atom_pairs = list(zip(fields[::2], fields[1::2]))
     return atom_pairs
 
+def triple_parser(line):
+    """Parse ANGLe keyword for groups of 3 atoms"""
+    field_str = comment_parser(line)[0]
+    fields = field_str.split()[1:]
+    if len(fields) % 3 != 0:
+        raise ValueError(
+            f'Invalid length of topology specification: {line}\n'
+            'Multiples  of 3 atoms required'
+        )
+    return [tuple(fields[i:i+3]) for i in range(0, len(fields), 3)]
+
 def quad_parser(line):
     """Parse IMPR keyword for group of 4 atoms"""
     field_str = comment_parser(line)[0]
@@ -169,29 +193,38 @@ def delete_parser(line):
 
 class RTFParser:
     """A parser class to load rtf (residue topology files) into dictionary.
-    Parser is initialized with RTF file from file path. If any lines from the 
-    file are not parsed, they will be stored in the unparsed_lines"""
-    def __init__(self, file_path):
+    Parser is initialized with RTF file from file path, or with the lines of
+    a rtf (e.g. the read rtf block of a stream file). The atom types defined 
+    in other files (e.g. the base rtf of a stream file) can be provided as 
+    mass_dict, in the same format as the mass_dict attribute 
+    {atom_type: (mass, desc)}. If any lines from the file are not parsed, they 
+    will be stored in the unparsed_lines"""
+    def __init__(self, file_path=None, lines=None, mass_dict=None):
         self.rtf_version = None
         self.topo_dict = None
+        self.mass_dict = dict(mass_dict) if mass_dict else {}
         self.decl_peptide_atoms = []
         self.default_patchs = {'FIRST':None,'LAST':None}
         self.default_autogen = None
         self.unparsed_lines = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            self.lines = [l.strip() for l in f.readlines() if not skip_line(l)]
+        if file_path is not None:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        elif lines is None:
+            raise ValueError('Either file_path or lines has to be provided')
+        self.lines = [l.strip() for l in lines if not skip_line(l)]
         self._parse_lines()
         n_unparsed = len(self.unparsed_lines)
         if n_unparsed > 0:
             warnings.warn(
-                f"Failed to parse {n_unparsed} lines from {file_path}"
+                f"Failed to parse {n_unparsed} lines from "
+                f"{file_path or 'rtf lines'}"
             )
 
     def _parse_lines(self):
-        ##TODO: Need to handle keywords DIHE, ANGLE, and PATCH
         self.rtf_version = '.'.join(self.lines[0].strip().split())
         self.topo_dict = {}
-        mass_dict = {}
+        mass_dict = self.mass_dict
         for l in self.lines[1:]:
             l = l.upper()
             if l.startswith('MASS'):
@@ -240,6 +273,11 @@ class RTFParser:
                     cur_atom_group = {cur_group_i: {}}
                     cur_res['atoms'].update(cur_atom_group)
                 atom_name, atom_type, atom_charge = atom_parser(l)
+                if atom_type not in mass_dict:
+                    raise ValueError(
+                        f'Atom type {atom_type} of atom {atom_name} is not '
+                        'defined by any MASS entry'
+                    )
                 cur_atom_dict = {
                     atom_name: 
                     {
@@ -293,11 +331,18 @@ class RTFParser:
                 delete_entry = delete_parser(l)
                 cur_res['delete'].append(delete_entry)
             elif l.startswith('DIHE'):
-                pass
+                # Explicit dihedrals (in addition to the autogenerated ones)
+                if 'dihedrals' not in cur_res:
+                    cur_res['dihedrals'] = []
+                cur_res['dihedrals'].extend(quad_parser(l))
             elif l.startswith('ANGL'):
-                pass
+                # Explicit angles (in addition to the autogenerated ones)
+                if 'angles' not in cur_res:
+                    cur_res['angles'] = []
+                cur_res['angles'].extend(triple_parser(l))
             elif l.startswith('PATC'):
-                pass
+                # Default terminal patches of the residue
+                cur_res['default_patches'] = patching_parser(l)
             elif l.startswith('END'):
                 break
             else:
@@ -0,0 +1,46 @@
+"""
+Module for reading the topology and parameter blocks from CHARMM stream files
+(.str), such as the ligand files generated by CGenFF.
+
+A stream file embeds the rtf and prm data in "read rtf card" and "read para
+card" blocks, each terminated by an END line. The file is read line by line in
+a single pass, and the lines of each block are yielded as they are found. The
+CHARMM commands outside of the blocks (e.g. "return", "set") are ignored.
+"""
+import re
+from crimm.IO.CompressedFile import open_decompressed
+
+# "read rtf card [append]" and "read para[meter] card [flex] [append]"
+_READ_BLOCK_PATTERN = re.compile(r'\s*read\s+(rtf|para\w*)\b', re.IGNORECASE)
+
+def _is_block_end(line):
+    """Return if the line terminates a read block (PRIVATE)"""
+    fields = line.split(None, 1)
+    return bool(fields) and fields[0].upper() == 'END'
+
+def iter_stream_blocks(filepath):
+    """Iterate over the rtf and prm blocks of a CHARMM stream file. Yield the
+    block type ("rtf" or "prm") and the list of lines in the block, including
+    the title lines and excluding the read command and the END line.
+
+    Arguments:
+     :filepath: path to the stream file (can be gzip/bzip2/xz compressed)
+    """
+    block_type, block_lines = None, None
+    with open_decompressed(filepath) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if block_type is None:
+                if (match := _READ_BLOCK_PATTERN.match(line)) is not None:
+                    is_rtf = match.group(1).lower() == 'rtf'
+                    block_type = 'rtf' if is_rtf else 'prm'
+                    block_lines = []
+            elif _is_block_end(line):
+                yield block_type, block_lines
+                block_type, block_lines = None, None
+            else:
+                block_lines.append(line)
+    if block_type is not None:
+        raise ValueError(
+            f'Unterminated read {block_type} block in stream file: {filepath}'
+        )
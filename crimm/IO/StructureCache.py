@@ -0,0 +1,478 @@
+"""Compact binary serialization of crimm Structures and Models.
+
+Coordinates, B-factors and occupancies are stored as contiguous arrays, and the
+chain, residue and atom metadata are stored as columnar tables. The file can be
+memory-mapped, so the arrays are accessible without reading the entire file,
+and the entity hierarchy is only built when requested.
+
+File layout:
+    magic (8 bytes) | format version (uint32) | header size (uint64) |
+    header (pickled dict) | arrays (each aligned to 64 bytes)
+"""
+import io
+import mmap
+import pickle
+import struct
+import warnings
+import numpy as np
+from crimm.StructEntities.Structure import Structure
+from crimm.StructEntities.Model import Model
+from crimm.StructEntities.Residue import Residue, Heterogen, DisorderedResidue
+from crimm.StructEntities.Atom import Atom, DisorderedAtom
+from crimm.StructEntities.Chain import (
+    Chain, PolymerChain, Heterogens, Macrolide, Oligosaccharide, Solvent,
+    CoSolvent, Ion, Glycosylation, NucleosidePhosphate, Ligand
+)
+
+_MAGIC = b'CRIMMSTR'
+_FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct('<8sIQ')
+_ALIGNMENT = 64
+# sentinel for missing (None) integer values
+_MISSING_INT = np.iinfo(np.int32).min
+
+_CHAIN_CLASSES = {
+    cls.__name__: cls for cls in (
+        Chain, PolymerChain, Heterogens, Macrolide, Oligosaccharide, Solvent,
+        CoSolvent, Ion, Glycosylation, NucleosidePhosphate, Ligand
+    )
+}
+# Chain attributes that are either rebuilt on loading or reference other
+# entities/topology objects, and they are not serialized
+_EXCLUDED_CHAIN_ATTRS = {
+    '_id', 'full_id', 'parent', 'child_list', 'child_dict', 'level',
+    '_ppb', 'letter_3to1_dict', 'het_res', 'het_resseq_lookup',
+    'undefined_res', 'topo_definitions', 'topo_elements',
+    '_missing_res_cache',
+}
+_EXCLUDED_MODEL_ATTRS = {
+    '_id', 'full_id', 'parent', 'child_list', 'child_dict', 'level',
+    'serial_num', 'connect_atoms', 'assembly_view', '_coord_buffer',
+}
+
+# Disorder flags for residue and atom rows
+_ORDERED = 0
+_DISORDERED = 1
+_DISORDERED_SELECTED = 2
+
+def _to_str_array(values):
+    """Convert a list of str to a fixed width byte string array if possible."""
+    arr = np.array(values, dtype=str)
+    try:
+        return np.char.encode(arr, 'ascii') if arr.size else arr.astype('S1')
+    except UnicodeEncodeError:
+        return arr
+
+def _to_str_list(arr):
+    """Convert a fixed width string array back to a list of str."""
+    if arr.dtype.kind == 'S':
+        return arr.astype('U').tolist()
+    return arr.tolist()
+
+def _to_int_array(values):
+    return np.array(
+        [_MISSING_INT if v is None else v for v in values], dtype=np.int32
+    )
+
+def _to_int_list(arr):
+    values = arr.tolist()
+    if (arr == _MISSING_INT).any():
+        values = [None if v == _MISSING_INT else v for v in values]
+    return values
+
+def _to_float_list(arr):
+    values = arr.tolist()
+    if np.isnan(arr).any():
+        values = [None if v != v else v for v in values]
+    return values
+
+
+class StructureArrays:
+    """Columnar array representation of a crimm Structure or Model.
+
+    The arrays are stored in the dictionary "arrays", and the structure, model
+    and chain attributes are stored in the dictionary "metadata". The
+    entity hierarchy can be rebuilt with to_entity().
+    """
+    def __init__(self, arrays, metadata):
+        self.arrays = arrays
+        self.metadata = metadata
+
+    def __repr__(self):
+        return (
+            f"<StructureArrays id={self.metadata['id']} "
+            f"Models={len(self.metadata['models'])} "
+            f"Atoms={len(self.arrays['coords'])}>"
+        )
+
+    @property
+    def coords(self):
+        """(N, 3) coordinates of all atoms (including altlocs)"""
+        return self.arrays['coords']
+
+    @classmethod
+    def from_entity(cls, entity):
+        """Create the arrays from a Structure or a Model."""
+        if entity.level == 'S':
+            models = entity.child_list
+            metadata = {
+                'level': 'S',
+                'id': entity.id,
+                'attrs': {
+                    'pdb_id': entity.pdb_id,
+                    'header': entity.header,
+                    'resolution': entity.resolution,
+                    'method': entity.method,
+                    'assemblies': entity.assemblies,
+                    'cell_info': entity.cell_info,
+                }
+            }
+        elif entity.level == 'M':
+            models = [entity]
+            metadata = {'level': 'M', 'id': entity.id, 'attrs': {}}
+        else:
+            raise ValueError(
+                "Only Structure level (S) or Model level (M) entity is accepted! "
+                f"{entity} has level \"{entity.level}\"."
+            )
+        metadata['models'] = []
+        metadata['chains'] = []
+
+        res_cols = {
+            k: [] for k in (
+                'resname', 'hetflag', 'resseq', 'icode', 'segid',
+                'author_seq_id', 'disordered', 'atom_start'
+            )
+        }
+        atom_cols = {
+            k: [] for k in (
+                'name', 'fullname', 'id', 'altloc', 'element', 'serial_number',
+                'bfactor', 'occupancy', 'disordered', 'coords', 'anisou'
+            )
+        }
+        chain_res_start = []
+
+        def add_atom(atom, disordered):
+            atom_cols['name'].append(atom.name)
+            atom_cols['fullname'].append(atom.fullname)
+            atom_cols['id'].append(atom.id)
+            atom_cols['altloc'].append(atom.altloc)
+            atom_cols['element'].append(atom.element or '')
+            atom_cols['serial_number'].append(atom.serial_number)
+            atom_cols['bfactor'].append(atom.bfactor)
+            atom_cols['occupancy'].append(atom.occupancy)
+            atom_cols['disordered'].append(disordered)
+            atom_cols['coords'].append(atom.coord)
+            atom_cols['anisou'].append(atom.anisou_array)
+
+        def add_residue(res, disordered):
+            hetflag, resseq, icode = res.id
+            res_cols['resname'].append(res.resname)
+            res_cols['hetflag'].append(hetflag)
+            res_cols['resseq'].append(resseq)
+            res_cols['icode'].append(icode)
+            res_cols['segid'].append(res.segid)
+            res_cols['author_seq_id'].append(getattr(res, 'author_seq_id', None))
+            res_cols['disordered'].append(disordered)
+            res_cols['atom_start'].append(len(atom_cols['name']))
+            for atom in res.child_list:
+                if atom.is_disordered() != 2:
+                    add_atom(atom, _ORDERED)
+                    continue
+                selected = atom.selected_child
+                for child_atom in atom.disordered_get_list():
+                    add_atom(
+                        child_atom,
+                        _DISORDERED_SELECTED if child_atom is selected
+                        else _DISORDERED
+                    )
+
+        for model in models:
+            metadata['models'].append({
+                'id': model.id,
+                'serial_num': model.serial_num,
+                'n_chains': len(model),
+                'attrs': {
+                    k: v for k, v in vars(model).items()
+                    if k not in _EXCLUDED_MODEL_ATTRS
+                },
+            })
+            for chain in model:
+                metadata['chains'].append({
+                    'id': chain.id,
+                    'class': type(chain).__name__,
+                    'attrs': {
+                        k: v for k, v in vars(chain).items()
+                        if k not in _EXCLUDED_CHAIN_ATTRS
+                    },
+                })
+                chain_res_start.append(len(res_cols['resname']))
+                for res in chain.child_list:
+                    if res.is_disordered() != 2:
+                        add_residue(res, _ORDERED)
+                        continue
+                    selected = res.selected_child
+                    for child_res in res.disordered_get_list():
+                        add_residue(
+                            child_res,
+                            _DISORDERED_SELECTED if child_res is selected
+                            else _DISORDERED
+                        )
+
+        n_atoms = len(atom_cols['name'])
+        arrays = {
+            'chain_res_start': np.array(chain_res_start, dtype=np.int64),
+            'res_name': _to_str_array(res_cols['resname']),
+            'res_hetflag': _to_str_array(res_cols['hetflag']),
+            'res_seq': np.array(res_cols['resseq'], dtype=np.int32),
+            'res_icode': _to_str_array(res_cols['icode']),
+            'res_segid': _to_str_array(res_cols['segid']),
+            'res_author_seq_id': _to_int_array(res_cols['author_seq_id']),
+            'res_disordered': np.array(res_cols['disordered'], dtype=np.int8),
+            'res_atom_start': np.array(res_cols['atom_start'], dtype=np.int64),
+            'atom_name': _to_str_array(atom_cols['name']),
+            'atom_altloc': _to_str_array(atom_cols['altloc']),
+            'atom_element': _to_str_array(atom_cols['element']),
+            'atom_serial_number': _to_int_array(atom_cols['serial_number']),
+            'atom_disordered': np.array(atom_cols['disordered'], dtype=np.int8),
+            'bfactors': np.array(atom_cols['bfactor'], dtype=np.float32),
+            'occupancies': np.array(
+                [np.nan if v is None else v for v in atom_cols['occupancy']],
+                dtype=np.float32
+            ),
+            'coords': np.array(atom_cols['coords'], dtype=np.float32).reshape(
+                n_atoms, 3
+            ),
+        }
+        # optional columns are only stored if they carry any information
+        if atom_cols['fullname'] != atom_cols['name']:
+            arrays['atom_fullname'] = _to_str_array(atom_cols['fullname'])
+        if atom_cols['id'] != atom_cols['name']:
+            arrays['atom_id'] = _to_str_array(atom_cols['id'])
+        has_anisou = np.array(
+            [u is not None for u in atom_cols['anisou']], dtype=bool
+        )
+        if has_anisou.any():
+            anisou = np.full((n_atoms, 6), np.nan, dtype=np.float32)
+            anisou[has_anisou] = [u for u in atom_cols['anisou'] if u is not None]
+            arrays['anisou'] = anisou
+        return cls(arrays, metadata)
+
+    def to_bytes(self):
+        """Serialize the arrays and metadata into bytes."""
+        buffer = io.BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    def write(self, handle):
+        """Write the arrays and metadata to a binary file handle."""
+        array_info = {}
+        offset = 0
+        for key, arr in self.arrays.items():
+            arr = np.ascontiguousarray(arr)
+            array_info[key] = (arr.dtype.str, arr.shape, offset)
+            offset += -(-arr.nbytes // _ALIGNMENT) * _ALIGNMENT
+        header = pickle.dumps(
+            {'metadata': self.metadata, 'arrays': array_info},
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+        data_start = _PREAMBLE.size + len(header)
+        padding = -data_start % _ALIGNMENT
+        handle.write(_PREAMBLE.pack(_MAGIC, _FORMAT_VERSION, len(header)+padding))
+        handle.write(header)
+        handle.write(b'\0' * padding)
+        for key, arr in self.arrays.items():
+            arr = np.ascontiguousarray(arr)
+            handle.write(arr.tobytes())
+            handle.write(b'\0' * (-arr.nbytes % _ALIGNMENT))
+
+    def save(self, filepath):
+        """Save the arrays and metadata to a file."""
+        with open(filepath, 'wb') as f:
+            self.write(f)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Load from a bytes-like object (bytes, mmap, memoryview). The arrays
+        are read-only views on the buffer without copying."""
+        magic, version, header_size = _PREAMBLE.unpack_from(buffer, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a crimm binary structure file!")
+        if version != _FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported crimm binary structure format version {version}"
+            )
+        data_start = _PREAMBLE.size + header_size
+        header = pickle.loads(buffer[_PREAMBLE.size:data_start])
+        arrays = {}
+        for key, (dtype, shape, offset) in header['arrays'].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape, dtype=np.int64))
+            arrays[key] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start+offset
+            ).reshape(shape)
+        return cls(arrays, header['metadata'])
+
+    @classmethod
+    def load(cls, filepath):
+        """Memory-map a file and load the arrays as read-only views on it."""
+        with open(filepath, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(buffer)
+
+    @staticmethod
+    def _create_chain(chain_info):
+        chain_cls = _CHAIN_CLASSES[chain_info['class']]
+        attrs = chain_info['attrs']
+        if issubclass(chain_cls, PolymerChain):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                chain = chain_cls(
+                    chain_info['id'],
+                    attrs['entity_id'],
+                    attrs['author_chain_id'],
+                    attrs['chain_type'],
+                    str(attrs['known_seq']),
+                    str(attrs['can_seq']),
+                    attrs['reported_res'],
+                    attrs['reported_missing_res'],
+                )
+        else:
+            chain = chain_cls(chain_info['id'])
+        chain.__dict__.update(attrs)
+        return chain
+
+    def to_entity(self):
+        """Build the Structure (or Model) from the arrays."""
+        arrays = self.arrays
+        metadata = self.metadata
+        n_atoms = len(arrays['coords'])
+        # atoms get writable views of one coordinate block
+        coords = np.array(arrays['coords'])
+        atom_names = _to_str_list(arrays['atom_name'])
+        atom_fullnames = atom_names
+        if 'atom_fullname' in arrays:
+            atom_fullnames = _to_str_list(arrays['atom_fullname'])
+        atom_ids = atom_names
+        if 'atom_id' in arrays:
+            atom_ids = _to_str_list(arrays['atom_id'])
+        altlocs = _to_str_list(arrays['atom_altloc'])
+        elements = _to_str_list(arrays['atom_element'])
+        serial_numbers = _to_int_list(arrays['atom_serial_number'])
+        bfactors = arrays['bfactors'].tolist()
+        occupancies = _to_float_list(arrays['occupancies'])
+        atom_disordered = arrays['atom_disordered'].tolist()
+        anisou = None
+        if 'anisou' in arrays:
+            anisou = np.array(arrays['anisou'])
+            has_anisou = ~np.isnan(anisou[:, 0])
+
+        resnames = _to_str_list(arrays['res_name'])
+        hetflags = _to_str_list(arrays['res_hetflag'])
+        resseqs = arrays['res_seq'].tolist()
+        icodes = _to_str_list(arrays['res_icode'])
+        segids = _to_str_list(arrays['res_segid'])
+        author_seq_ids = _to_int_list(arrays['res_author_seq_id'])
+        res_disordered = arrays['res_disordered'].tolist()
+        res_atom_bounds = np.append(arrays['res_atom_start'], n_atoms).tolist()
+        chain_res_bounds = np.append(
+            arrays['chain_res_start'], len(resnames)
+        ).tolist()
+
+        def build_residue(i, parent):
+            """Create the residue, add it to the parent entity and then fill
+            it with atoms. The atoms are attached directly instead of through
+            Residue.add, since their ids are already unique, and attaching
+            them after the residue avoids resetting the full id of every
+            atom."""
+            res_id = (hetflags[i], resseqs[i], icodes[i])
+            if isinstance(parent, Heterogens):
+                residue = Heterogen(res_id, resnames[i], segids[i])
+            else:
+                residue = Residue(res_id, resnames[i], segids[i], author_seq_ids[i])
+            if isinstance(parent, DisorderedResidue):
+                parent.disordered_add(residue)
+            else:
+                parent.add(residue)
+            disordered_atom = None
+            for j in range(res_atom_bounds[i], res_atom_bounds[i+1]):
+                atom = Atom(
+                    name = atom_names[j],
+                    coord = coords[j],
+                    bfactor = bfactors[j],
+                    occupancy = occupancies[j],
+                    altloc = altlocs[j],
+                    fullname = atom_fullnames[j],
+                    serial_number = serial_numbers[j],
+                    element = elements[j] or None,
+                )
+                atom.id = atom_ids[j]
+                if anisou is not None and has_anisou[j]:
+                    atom.set_anisou(anisou[j])
+                if atom_disordered[j] == _ORDERED:
+                    disordered_atom = None
+                    atom.parent = residue
+                    residue.child_list.append(atom)
+                    residue.child_dict[atom.id] = atom
+                    continue
+                if disordered_atom is None or disordered_atom.id != atom.id:
+                    disordered_atom = DisorderedAtom(atom.id)
+                    residue.add(disordered_atom)
+                    residue.flag_disordered()
+                disordered_atom.disordered_add(atom)
+                if atom_disordered[j] == _DISORDERED_SELECTED:
+                    disordered_atom.disordered_select(atom.altloc)
+
+        def build_chain(chain_idx):
+            chain = self._create_chain(metadata['chains'][chain_idx])
+            disordered_res = None
+            selected_resname = None
+            for i in range(chain_res_bounds[chain_idx], chain_res_bounds[chain_idx+1]):
+                if res_disordered[i] == _ORDERED:
+                    build_residue(i, chain)
+                    continue
+                res_id = (hetflags[i], resseqs[i], icodes[i])
+                if disordered_res is None or disordered_res.id != res_id:
+                    if disordered_res is not None:
+                        disordered_res.disordered_select(selected_resname)
+                    disordered_res = DisorderedResidue(res_id)
+                    chain.add(disordered_res)
+                build_residue(i, disordered_res)
+                if res_disordered[i] == _DISORDERED_SELECTED:
+                    selected_resname = resnames[i]
+            if disordered_res is not None:
+                disordered_res.disordered_select(selected_resname)
+            if isinstance(chain, Heterogens):
+                chain.update()
+            return chain
+
+        models = []
+        chain_idx = 0
+        for model_info in metadata['models']:
+            model = Model(model_info['id'], model_info['serial_num'])
+            for _ in range(model_info['n_chains']):
+                model.add(build_chain(chain_idx))
+                chain_idx += 1
+            attrs = dict(model_info['attrs'])
+            connect_dict = attrs.pop('connect_dict', {})
+            model.__dict__.update(attrs)
+            if connect_dict:
+                model.set_connect(connect_dict)
+            models.append(model)
+
+        if metadata['level'] == 'M':
+            return models[0]
+        structure = Structure(metadata['id'])
+        for model in models:
+            structure.add(model)
+        structure.__dict__.update(metadata['attrs'])
+        return structure
+
+
+def save_structure(entity, filepath):
+    """Save a crimm Structure or Model to a binary cache file."""
+    StructureArrays.from_entity(entity).save(filepath)
+
+def load_structure(filepath):
+    """Load a crimm Structure or Model from a binary cache file."""
+    return StructureArrays.load(filepath).to_entity()
@@ -0,0 +1,125 @@
+"""Cache of the parsed CHARMM topology (rtf) and parameter (prm) files.
+
+The parsed data are pickled to the user cache directory ($CRIMM_CACHE_DIR, or
+crimm/toppar under $XDG_CACHE_HOME or ~/.cache), and the cache files are keyed
+by the content hash of the source file and the cache format version. A cache is
+rebuilt automatically when the source file changes, and the caches of the old
+versions of the file are removed. If the cache directory is not writable, the
+files are parsed as usual.
+"""
+import os
+import glob
+import pickle
+import hashlib
+import tempfile
+from crimm.IO.RTFParser import RTFParser
+from crimm.IO.PRMParser import categorize_lines, parse_line_dict
+from crimm.Utils.StructureUtils import gc_paused
+
+# Increase the version when the parsed data format changes
+_CACHE_VERSION = 2
+
+def get_cache_dir():
+    """Return the directory of the toppar cache files"""
+    if cache_dir := os.environ.get('CRIMM_CACHE_DIR'):
+        return cache_dir
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    return os.path.join(cache_home, 'crimm', 'toppar')
+
+def _get_cache_prefix(file_path):
+    """Return the prefix of the cache file names of the source file (PRIVATE).
+    The prefix has the hash of the absolute path, so the files with the same
+    name from different directories do not replace each other's caches."""
+    abs_path = os.path.abspath(file_path)
+    path_digest = hashlib.sha256(abs_path.encode()).hexdigest()[:8]
+    return f'{os.path.basename(file_path)}.{path_digest}'
+
+def _get_cache_path(file_path, content):
+    """Return the cache file path for the content of the source file
+    (PRIVATE)"""
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    return os.path.join(
+        get_cache_dir(),
+        f'{_get_cache_prefix(file_path)}.v{_CACHE_VERSION}.{digest}.pkl'
+    )
+
+def _write_cache(cache_path, data, prefix):
+    """Write the cache file, and remove the caches of the other versions of the
+    source file (PRIVATE). The file is written to a temporary file first, so
+    the processes loading the cache at the same time never see a partial
+    file."""
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return
+    for old_path in glob.glob(os.path.join(cache_dir, f'{prefix}.v*.pkl')):
+        if old_path != cache_path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+def _load_cached(file_path, parse_func):
+    """Load the parsed data of the file from the cache, or parse the file and
+    cache the result (PRIVATE)"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    cache_path = _get_cache_path(file_path, content)
+    try:
+        with open(cache_path, 'rb') as f, gc_paused():
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        # missing, corrupted or incompatible cache will be rebuilt
+        pass
+    data = parse_func(file_path)
+    _write_cache(cache_path, data, _get_cache_prefix(file_path))
+    return data
+
+def _parse_rtf(file_path):
+    """Parse the rtf file to the dict of cached data (PRIVATE)"""
+    rtf = RTFParser(file_path=file_path)
+    return {
+        'rtf_version': rtf.rtf_version,
+        'topo_dict': rtf.topo_dict,
+        'mass_dict': rtf.mass_dict,
+        'lines': rtf.lines,
+        'decl_peptide_atoms': rtf.decl_peptide_atoms,
+        'default_patchs': rtf.default_patchs,
+        'default_autogen': rtf.default_autogen,
+    }
+
+def _parse_prm(file_path):
+    """Parse the prm file to the dict of cached data (PRIVATE)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = [l.rstrip() for l in f.readlines()]
+    return {
+        'param_dict': parse_line_dict(categorize_lines(lines)),
+        'lines': lines,
+    }
+
+def load_rtf(file_path):
+    """Load the parsed rtf file through the cache. Return a dict with the
+    "rtf_version", the "topo_dict", the "mass_dict" and the parsed "lines" of
+    RTFParser, and the "decl_peptide_atoms", "default_patchs" and
+    "default_autogen"."""
+    return _load_cached(file_path, _parse_rtf)
+
+def load_prm(file_path):
+    """Load the parsed prm file through the cache. Return a dict with the
+    "param_dict" from parse_line_dict and the "lines" of the file."""
+    return _load_cached(file_path, _parse_prm)
+
+def clear_cache():
+    """Remove all toppar cache files"""
+    for cache_path in glob.glob(os.path.join(get_cache_dir(), '*.pkl')):
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
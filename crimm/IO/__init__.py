@@ -1,5 +1,13 @@
-from crimm.IO.PDBString import get_pdb_str
+from crimm.IO.PDBString import get_pdb_str, write_pdb
 from crimm.IO.MMCIFParser import MMCIFParser
 from crimm.IO.PDBParser import PDBParser
 from crimm.IO.RTFParser import RTFParser
 
+from crimm.IO.StructureCache import save_structure, load_structure
+from crimm.IO.BatchParser import parse_many
+from crimm.IO.MMCIFWriter import get_mmcif_str, write_mmcif
+from crimm.IO.CRDWriter import get_crd_str, write_crd
+from crimm.IO.PSFWriter import get_psf_str, write_psf
+from crimm.IO.PSFParser import PSFParser
+from crimm.IO.DCDTrajectory import DCDTrajectory
+from crimm.IO.StreamParser import iter_stream_blocks
@@ -5,6 +5,7 @@ import numpy as np
 from numpy.linalg import norm
 from scipy.spatial.transform import Rotation as R
 from scipy.spatial.distance import pdist, squareform
+from crimm.StructEntities.CoordBuffer import get_atom_coords, set_atom_coords
 
 class CoordManipulator:
     def __init__(self) -> None:
@@ -28,12 +29,8 @@ class CoordManipulator:
         self.m_translation, self.m_rotation = None, None
 
     def _extract_atoms_and_coords(self, entity) -> Tuple[List[Atom], np.array]:
-        coords = []
-        atoms = []
-        for atom in entity.get_atoms(include_alt=True):
-            coords.append(atom.coord)
-            atoms.append(atom)
-        return atoms, np.asarray(coords)
+        atoms = list(entity.get_atoms(include_alt=True))
+        return atoms, get_atom_coords(atoms)
 
     def _find_farthest_atom_indices(self) -> Tuple[int, int]:
         idx_pair = np.unravel_index(
@@ -129,14 +126,11 @@ class CoordManipulator:
     def apply_entity(self, other_entity) -> None:
         """Apply the same transfermation to another structure entity."""
         atoms, coords = self._extract_atoms_and_coords(other_entity)
-        new_coords = self.apply_coords(coords)
-        for i, atom in enumerate(atoms):
-            atom.coord = new_coords[i]
+        set_atom_coords(atoms, self.apply_coords(coords))
 
     def _apply_to_loaded_entity(self) -> None:
         self.coords = self.apply_coords(self.coords)
-        for i, atom in enumerate(self._atoms):
-            atom.coord = self.coords[i]
+        set_atom_coords(self._atoms, self.coords)
 
     def orient_coords(self, apply_to_parent = False) -> None:
         """Apply translation and rotation operations to orient the structure 
@@ -8,6 +8,7 @@ from scipy.spatial import KDTree
 from crimm import Data
 from crimm.Modeller.CoordManipulator import CoordManipulator
 from crimm.StructEntities import Atom, Residue, Chain, Model
+from crimm.Utils.StructureUtils import get_coords
 
 WATER_COORD_PATH = os.path.join(os.path.dirname(Data.__file__), 'water_coords.npy')
 BOXWIDTH=18.662 # water unit cube width
@@ -165,10 +166,7 @@ class Solvator:
     def _extract_coords(self, entity) -> np.ndarray:
         """Extracts coordinates from entity. If any altloc atoms are present, 
         only the first altloc atoms will be included in the returned array."""
-        coords = []
-        for atom in entity.get_atoms(include_alt=False):
-            coords.append(atom.get_coord())
-        return np.array(coords)
+        return get_coords(entity, include_alt=False)
 
     def remove_existing_water(self, model: Model) -> Model:
         """Removes existing water molecules from the model."""
@@ -1,4 +1,5 @@
 import os
+import gc
 import warnings
 import pickle
 from typing import List, Tuple
@@ -7,8 +8,10 @@ from Bio.Data.PDBData import protein_letters_3to1_extended
 from Bio.Data.PDBData import protein_letters_1to3
 
 from crimm import StructEntities as Entities
+from crimm.IO.TopparCache import load_rtf, load_prm
+from crimm.IO.RTFParser import RTFParser, skip_line
 from crimm.IO.PRMParser import categorize_lines, parse_line_dict
-from crimm.IO.RTFParser import RTFParser
+from crimm.IO.StreamParser import iter_stream_blocks
 from crimm.Modeller import ResidueFixer
 # from crimm.Modeller.ParamLoader import ParameterLoader
 
@@ -50,6 +53,21 @@ def _find_atom_in_residue(
         return residue.missing_hydrogens[atom_name]
     return residue.missing_atoms[atom_name]
 
+def _merge_raw_lines(raw_lines: List[str], new_lines: List[str]) -> List[str]:
+    """Return the raw data lines with the data lines of an appended block
+    inserted before the last END of the existing lines. Title, comment and END
+    lines of the appended block are dropped. (Private function)"""
+    new_lines = [
+        l for l in new_lines
+        if not skip_line(l) and l.split()[0].upper() != 'END'
+    ]
+    end_i = len(raw_lines)
+    for i in range(len(raw_lines)-1, -1, -1):
+        if raw_lines[i].strip().upper().startswith('END'):
+            end_i = i
+            break
+    return raw_lines[:end_i] + new_lines + raw_lines[end_i:]
+
 def _find_atom_from_neighbor(
         cur_residue: Entities.Residue, atom_name: str
     )->Entities.Atom:
@@ -408,14 +426,28 @@ class ParameterLoader:
         entity_type = entity_type.lower()
         if entity_type not in prm_path_dict:
             raise ValueError(f'No parameter file for {entity_type}')
-        filename = prm_path_dict[entity_type]
-        with open(filename, 'r', encoding='utf-8') as f:
-
-            self._raw_data_strings = [
-                l.rstrip() for l in f.readlines() #if not skip_line(l)
-            ]
-            param_line_dict = categorize_lines(self._raw_data_strings)
-        self.param_dict.update(parse_line_dict(param_line_dict))
+        prm_data = load_prm(prm_path_dict[entity_type])
+        self._raw_data_strings = prm_data['lines']
+        self.param_dict.update(prm_data['param_dict'])
+
+    def load_prm_lines(self, lines: List[str]):
+        """Parse the lines of a prm (e.g. the read para block of a stream file)
+        and merge the parameters into the loader. Parameters for the same atom
+        types replace the existing ones, as appended parameters do in CHARMM."""
+        new_param_dict = parse_line_dict(categorize_lines(lines))
+        for param_type, params in new_param_dict.items():
+            if param_type not in self.param_dict:
+                self.param_dict[param_type] = {}
+            cur_params = self.param_dict[param_type]
+            for key, value in params.items():
+                # the parameters are looked up in both directions, so the
+                # existing entry in the reversed order is replaced as well
+                if isinstance(key, tuple):
+                    cur_params.pop(tuple(reversed(key)), None)
+                cur_params[key] = value
+        self._raw_data_strings = _merge_raw_lines(
+            self._raw_data_strings, lines
+        )
 
     def __repr__(self):
         n_bonds = len(self.param_dict['bonds'])
@@ -618,6 +650,7 @@ class ResidueTopologySet:
         self.residues = []
         self.patches = []
         self.patched_defs = {}
+        self.mass_dict = {}
         self._raw_data_strings = []
 
         if data_dict_path is not None:
@@ -629,20 +662,26 @@ class ResidueTopologySet:
             entity_type = entity_type.lower()
             if entity_type not in rtf_path_dict:
                 raise ValueError(f'Unknown entity type: {entity_type}')
-            rtf = RTFParser(file_path=rtf_path_dict[entity_type])
-            self._raw_data_strings = rtf.lines
-            self.load_data_dict(rtf.topo_dict, rtf.rtf_version)
+            rtf_data = load_rtf(rtf_path_dict[entity_type])
+            self._raw_data_strings = rtf_data['lines']
+            self.mass_dict = rtf_data['mass_dict']
+            self.load_data_dict(rtf_data['topo_dict'], rtf_data['rtf_version'])
 
     def load_data_dict(self, topo_data_dict: dict, rtf_version:str=None):
         """Load topology data from a dictionary. The dictionary should be parsed
-        from a RTF file."""
-        self.rtf_version = rtf_version
+        from a RTF file. Definitions with the names already in the set replace 
+        the existing ones. Return the list of loaded definitions."""
+        if self.rtf_version is None:
+            self.rtf_version = rtf_version
+        loaded_defs = []
         for resname, res_topo_dict in topo_data_dict.items():
             # if resname in Entities.ResidueDefinition.na_3to1:
             #     # Map 3-letter residue name to 1-letter residue name for nucleic
             #     # acids, since biopython uses 1-letter residue name for them.
             #     resname = Entities.ResidueDefinition.na_3to1[resname]
 
+            if resname in self.res_defs:
+                self._remove_definition(resname)
             if res_topo_dict['is_patch']:
                 res_def = Entities.PatchDefinition(
                     self.rtf_version, resname, res_topo_dict
@@ -655,10 +694,34 @@ class ResidueTopologySet:
                 self.residues.append(res_def)
 
             self.res_defs[resname] = res_def
+            loaded_defs.append(res_def)
 
         if 'HIS' not in self.res_defs and 'HSD' in self.res_defs:
             # Map all histidines HIS to HSD
             self.res_defs['HIS'] = self.res_defs['HSD']
+        return loaded_defs
+
+    def _remove_definition(self, resname: str):
+        """Remove the residue or patch definition from the set. The patched
+        definitions are cleared since they may be derived from it."""
+        res_def = self.res_defs.pop(resname)
+        for def_list in (self.residues, self.patches):
+            if res_def in def_list:
+                def_list.remove(res_def)
+        self.patched_defs = {}
+
+    def load_rtf_lines(self, lines: List[str]):
+        """Parse the lines of a rtf (e.g. the read rtf block of a stream file)
+        and merge the residue and patch definitions into the set. The atom
+        types defined in the set (e.g. from the base rtf) do not need to be
+        declared again. Return the list of loaded definitions."""
+        rtf = RTFParser(lines=lines, mass_dict=self.mass_dict)
+        self.mass_dict = rtf.mass_dict
+        # the version line of the rtf is not appended
+        self._raw_data_strings = _merge_raw_lines(
+            self._raw_data_strings, rtf.lines[1:]
+        )
+        return self.load_data_dict(rtf.topo_dict, rtf.rtf_version)
 
     def __repr__(self):
         return (
@@ -680,13 +743,77 @@ class ResidueTopologySet:
     def __iter__(self):
         return iter(self.res_defs.values())
     
+def load_stream_files(
+        *file_paths: str,
+        topo_set: ResidueTopologySet = None,
+        param_loader: ParameterLoader = None
+    ) -> Tuple[ResidueTopologySet, ParameterLoader]:
+    """Load the rtf and prm blocks of CHARMM stream files (.str) into the
+    topology set and the parameter loader. Each file is read in a single pass,
+    and its blocks are merged into the sets in order, so the base files of the
+    sets are not parsed again. The internal coordinate tables are only filled
+    for the newly loaded definitions. New sets are created if not provided,
+    in which case the stream files have to define all their atom types. 
+    Return the topology set and the parameter loader.
+    
+    The shared sets from get_shared_toppar should not be merged into, since 
+    they are used by all the topology generators in the process."""
+    if topo_set is None:
+        topo_set = ResidueTopologySet()
+    if param_loader is None:
+        param_loader = ParameterLoader()
+    loaded_defs = []
+    for file_path in file_paths:
+        for block_type, lines in iter_stream_blocks(file_path):
+            if block_type == 'rtf':
+                loaded_defs.extend(topo_set.load_rtf_lines(lines))
+            else:
+                param_loader.load_prm_lines(lines)
+    for res_def in loaded_defs:
+        param_loader.res_def_fill_ic(res_def, preserve=True)
+    return topo_set, param_loader
+
+# Process-wide registry of the topology and parameter sets shared by the
+# topology generators, keyed by entity type (see get_shared_toppar)
+_shared_toppar = {}
+
+def get_shared_toppar(entity_type: str) -> Tuple[ResidueTopologySet, ParameterLoader]:
+    """Return the (ResidueTopologySet, ParameterLoader) of the entity type
+    shared by the whole process. Each force field family is loaded once, and
+    the internal coordinate tables are filled from the parameters with 
+    preserve=True. The shared sets should be treated as read-only."""
+    entity_type = entity_type.lower()
+    if entity_type not in _shared_toppar:
+        topo_set = ResidueTopologySet(entity_type)
+        param_loader = ParameterLoader(entity_type)
+        param_loader.fill_ic(topo_set, preserve=True)
+        _shared_toppar[entity_type] = (topo_set, param_loader)
+    return _shared_toppar[entity_type]
+
+def preload_shared_toppar(*entity_types: str, freeze: bool = True):
+    """Load the shared topology and parameter sets of the entity types (e.g.
+    "protein", "nucleic") before forking a process pool, so the worker
+    processes inherit them as copy-on-write memory instead of loading their own
+    copies. If freeze is True, all objects tracked by the garbage collector
+    are frozen (gc.freeze), so the collections in the workers do not write to
+    the shared memory pages and copy them."""
+    for entity_type in entity_types:
+        get_shared_toppar(entity_type)
+    if freeze:
+        gc.freeze()
+
 class TopologyGenerator:
-    """Class for generating topology elements from the topology definition"""
-    def __init__(self):
+    """Class for generating topology elements from the topology definition.
+    By default, the topology and parameter sets are shared by all generators
+    in the process (see get_shared_toppar). Set use_shared to False to load
+    separate copies for the generator."""
+    def __init__(self, use_shared: bool = True):
+        self.use_shared = use_shared
         self.res_def_dict = {}
         self.param_dict = {}
         self.cur_defs: ResidueTopologySet = None
         self.cur_param: ParameterLoader = None
+        self._shared_types = set()
 
     def _load_residue_definitions(self, chain_type: str, preserve):
         """Load topology definition from the RTF file"""
@@ -695,14 +822,26 @@ class TopologyGenerator:
             raise NotImplementedError(
                 f"Topology generation on Chain type {chain_type} is not supported yet!"
             )
+        if not preserve and entity_type in self._shared_types:
+            # The shared sets are read-only. The internal coordinate tables
+            # are overwritten on separate copies instead.
+            self._shared_types.remove(entity_type)
+            del self.res_def_dict[entity_type]
+            del self.param_dict[entity_type]
         if entity_type not in self.res_def_dict:
-            self.res_def_dict[entity_type] = ResidueTopologySet(entity_type)
-        if entity_type not in self.param_dict:
-            self.param_dict[entity_type] = ParameterLoader(entity_type)
-        
+            if self.use_shared and preserve:
+                topo_set, param_loader = get_shared_toppar(entity_type)
+                self._shared_types.add(entity_type)
+            else:
+                topo_set = ResidueTopologySet(entity_type)
+                param_loader = ParameterLoader(entity_type)
+            self.res_def_dict[entity_type] = topo_set
+            self.param_dict[entity_type] = param_loader
+
         self.cur_defs = self.res_def_dict[entity_type]
         self.cur_param = self.param_dict[entity_type]
-        self.cur_param.fill_ic(self.cur_defs, preserve=preserve)
+        if entity_type not in self._shared_types:
+            self.cur_param.fill_ic(self.cur_defs, preserve=preserve)
         
     def _generate_residue_topology(
             self, residue: Entities.Residue, coerce = False, QUIET = False
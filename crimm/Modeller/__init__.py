@@ -1,2 +1,4 @@
 from crimm.Modeller.TopoFixer import ResidueFixer
 from crimm.Modeller.TopoLoader import ResidueTopologySet, TopologyGenerator, ParameterLoader
+from crimm.Modeller.TopoLoader import get_shared_toppar, preload_shared_toppar
+from crimm.Modeller.TopoLoader import load_stream_files
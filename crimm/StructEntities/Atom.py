@@ -1,10 +1,27 @@
 import warnings
 from Bio.PDB.Atom import Atom as _Atom
 from Bio.PDB.Atom import DisorderedAtom as _DisorderedAtom
+from crimm.StructEntities.CoordBuffer import mark_hierarchy_changed
 
 class Atom(_Atom):
     """Atom class derived from Biopython Residue and made compatible with
-    CHARMM"""
+    CHARMM. The attributes are stored in slots to keep large systems compact.
+    Attributes that are not listed in the slots (e.g. set by other modules)
+    are kept in the instance dict inherited from the Biopython Atom."""
+    __slots__ = (
+        'level', 'parent', 'name', 'fullname', '_coord_buffer', '_coord',
+        'bfactor', 'occupancy', 'altloc', 'full_id', 'id', 'disordered_flag',
+        'anisou_array', 'siguij_array', 'sigatm_array', 'orig_serial_number',
+        'serial_number', '_xtra', 'element', 'mass', 'pqr_charge', 'radius',
+        '_neighbors', '_topo_def',
+    )
+    # For atom sorting (protein and nucleic acid backbone atoms first)
+    _sorting_keys = {
+        "N": 0, "CA": 1, "C": 2, "O": 3,
+        "P": 0, "OP1": 1, "OP2": 2, "O5'": 3,
+        "C5'": 4, "C4'": 5, "C3'": 6, "O3'": 7
+    }
+
     def __init__(
         self,
         name,
@@ -25,6 +42,8 @@ class Atom(_Atom):
         # the atomic data
         self.name = name  # eg. CA, spaces are removed from atom name
         self.fullname = fullname  # e.g. " CA ", spaces included
+        # CoordBuffer that the coord is a row view of (see coord property)
+        self._coord_buffer = None
         self.coord = coord
         self.bfactor = bfactor
         self.occupancy = occupancy
@@ -38,25 +57,15 @@ class Atom(_Atom):
         # Original serial number
         self.orig_serial_number = serial_number
         self.serial_number = serial_number
-        # Dictionary that keeps additional properties
-        self.xtra = {}
+        # Dictionary that keeps additional properties (see xtra)
+        self._xtra = None
         assert not element or element == element.upper(), element
         self.element = self._assign_element(element)
         self.mass = self._assign_atom_mass()
         self.pqr_charge = pqr_charge
         self.radius = radius
-
-        # For atom sorting (protein backbone atoms first)
-        self._sorting_keys = {"N": 0, "CA": 1, "C": 2, "O": 3}
-        # For atom sorting (nucleic acid backbone atoms first)
-        self._sorting_keys.update(
-              {
-                  "P": 0, "OP1": 1, "OP2": 2, "O5'": 3, 
-                  "C5'": 4, "C4'": 5, "C3'": 6, "O3'": 7
-              }
-        )
-        # For neighbor lookup and graph building
-        self.neighbors = set()
+        # For neighbor lookup and graph building (see neighbors)
+        self._neighbors = None
         # Forcefield Parameters and Topology Definitions
         self._topo_def = None
         if topo_definition is not None:
@@ -71,13 +80,125 @@ class Atom(_Atom):
 
     def __getstate__(self):
         """Return state of the atom object for pickling, excluding neighbors 
-        to avoid infinite recursion errors"""
-        state = {k: v for k, v in self.__dict__.items() if k != "neighbors"}
+        to avoid infinite recursion errors. The copied and unpickled atoms are
+        not bound to the coordinate buffer."""
+        state = {
+            k: getattr(self, k) for k in self.__slots__
+            if k != '_neighbors' and hasattr(self, k)
+        }
+        state.update(vars(self))
+        if state.get('_coord_buffer') is not None:
+            state['_coord_buffer'] = None
+            if state['_coord'] is not None:
+                state['_coord'] = state['_coord'].copy()
         return state
 
     def __setstate__(self, state):
         """Set state of the atom object for pickling"""
-        self.__dict__.update(state)
+        state = dict(state)
+        # atoms pickled before the slots were introduced
+        if 'coord' in state:
+            state['_coord'] = state.pop('coord')
+            state['_coord_buffer'] = None
+        if 'xtra' in state:
+            state['_xtra'] = state.pop('xtra')
+        state.pop('neighbors', None)
+        state.pop('_sorting_keys', None)
+        self._coord_buffer = None
+        self._xtra = None
+        self._neighbors = None
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def _clone(self, parent=None):
+        """Return a copy of the atom with the given parent and without 
+        neighbors, which is not bound to a coordinate buffer. The coord array
+        is not copied (PRIVATE)"""
+        cls = self.__class__
+        clone = cls.__new__(cls)
+        clone.level = self.level
+        clone.name = self.name
+        clone.fullname = self.fullname
+        clone.bfactor = self.bfactor
+        clone.occupancy = self.occupancy
+        clone.altloc = self.altloc
+        clone.id = self.id
+        clone.disordered_flag = self.disordered_flag
+        clone.anisou_array = self.anisou_array
+        clone.siguij_array = self.siguij_array
+        clone.sigatm_array = self.sigatm_array
+        clone.orig_serial_number = self.orig_serial_number
+        clone.serial_number = self.serial_number
+        clone.element = self.element
+        clone.mass = self.mass
+        clone.pqr_charge = self.pqr_charge
+        clone.radius = self.radius
+        clone._topo_def = self._topo_def
+        clone.parent = parent
+        clone.full_id = clone.get_full_id()
+        clone._coord_buffer = None
+        clone._coord = self._coord
+        clone._xtra = None if self._xtra is None else self._xtra.copy()
+        clone._neighbors = None
+        if extra := vars(self):
+            clone.__dict__.update(extra)
+        return clone
+
+    def copy(self):
+        """Create a copy of the Atom. Parent information and neighbors are
+        lost, and the copy is not bound to a coordinate buffer."""
+        shallow = self._clone()
+        if shallow._coord is not None:
+            shallow._coord = shallow._coord.copy()
+        return shallow
+
+    @property
+    def xtra(self):
+        """Dictionary that keeps additional properties. The dictionary is 
+        created on the first access."""
+        if self._xtra is None:
+            self._xtra = {}
+        return self._xtra
+
+    @xtra.setter
+    def xtra(self, xtra):
+        self._xtra = xtra
+
+    @property
+    def neighbors(self):
+        """Set of the bonded neighbor atoms for neighbor lookup and graph
+        building. The set is created on the first access."""
+        if self._neighbors is None:
+            self._neighbors = set()
+        return self._neighbors
+
+    @neighbors.setter
+    def neighbors(self, neighbors):
+        self._neighbors = neighbors
+
+    @property
+    def coord(self):
+        """Coordinates of the atom. If the atom is bound to a CoordBuffer (e.g.
+        of the parent model), this is a view into its row of the buffer, and 
+        setting the coordinates writes into the row."""
+        return self._coord
+
+    @coord.setter
+    def coord(self, coord):
+        if self._coord_buffer is None:
+            self._coord = coord
+        else:
+            self._coord = self._coord_buffer.set_row(self, coord)
+
+    def set_parent(self, parent):
+        """Set the parent residue."""
+        super().set_parent(parent)
+        mark_hierarchy_changed()
+
+    def detach_parent(self):
+        """Remove reference to parent."""
+        super().detach_parent()
+        mark_hierarchy_changed()
 
     def reset_atom_serial_numbers(self):
         """Reset all atom serial numbers in the entire structure starting from 1."""
@@ -116,6 +237,15 @@ class DisorderedAtom(_DisorderedAtom):
             return self
         return self.parent.get_top_parent()
 
+    def copy(self):
+        """Copy the disordered atom recursively. The selected child of the copy
+        is the copy of the selected child (Biopython keeps referencing the
+        original atom)."""
+        shallow = super().copy()
+        if self.selected_child is not None:
+            shallow.disordered_select(self.selected_child.altloc)
+        return shallow
+
     def __getstate__(self):
         """Return state of the atom object for pickling, excluding neighbors 
         to avoid infinite recursion errors"""
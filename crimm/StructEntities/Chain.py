@@ -1,12 +1,16 @@
 import warnings
 from typing import List, Tuple, Dict
+import numpy as np
 from Bio.Seq import Seq
-from Bio.PDB import PPBuilder
+from Bio.PDB.Polypeptide import Polypeptide, is_aa
+from Bio.PDB.Entity import DisorderedEntityWrapper
 from Bio.Data.PDBData import protein_letters_3to1_extended
 from Bio.Data.PDBData import nucleic_letters_3to1_extended
 from Bio.PDB.Chain import Chain as _Chain
 from Bio.PDB.PDBExceptions import PDBConstructionException
 import crimm.StructEntities as cEntities
+from crimm.StructEntities.CoordBuffer import mark_hierarchy_changed
+from crimm.StructEntities.HierarchyCopy import copy_entity
 
 class BaseChain(_Chain):
     """Base class derived from and Biopython chain object and compatible with
@@ -26,6 +30,21 @@ class BaseChain(_Chain):
         """Alias for child_list. Returns the list of residues in this chain."""
         return self.child_list
 
+    def set_parent(self, entity):
+        """Set the parent model."""
+        super().set_parent(entity)
+        mark_hierarchy_changed()
+
+    def detach_parent(self):
+        """Detach the parent model."""
+        super().detach_parent()
+        mark_hierarchy_changed()
+
+    def copy(self):
+        """Copy the chain and all its residues and atoms in one pass. The 
+        coordinates of the copied atoms are views into a new CoordBuffer."""
+        return copy_entity(self)
+
     def get_top_parent(self):
         if self.parent is None:
             return self
@@ -108,7 +127,6 @@ class Chain(BaseChain):
     ## TODO: Implement hetflag check for florescence proteins (chromophore residues)
     def __init__(self, chain_id: str):
         super().__init__(chain_id)
-        self._ppb = PPBuilder()
         # There is no way to distinguish the type of the chain. Hence, the
         # nucleic letter codes are limited to one letter codes
         self.letter_3to1_dict = {
@@ -158,23 +176,40 @@ class Chain(BaseChain):
                 disordered_res.append(res)
         return disordered_res
     
-    def get_segments(self):
+    def get_segment_ranges(self):
         """
-        Build polypeptide segments based on C-N distance criterion
+        Return the (start, end) index ranges of the residues in the child list
+        for the continuous backbone segments based on C-N distance criterion 
+        (O3'-P for nucleic acid chains). The end index is exclusive.
         """
         # This will detect the gap in chain better than using residue sequence
         # numbering
-        return self._ppb.build_peptides(self, aa_only=False)
+        if self.chain_type in ('Polyribonucleotide', 'Polydeoxyribonucleotide'):
+            return find_segment_ranges(self.child_list, ("O3'", 'P'))
+        return find_segment_ranges(
+            self.child_list, ('C', 'N'), accept=_is_peptide_residue
+        )
+
+    def get_segments(self):
+        """
+        Build polypeptide segments based on C-N distance criterion (O3'-P for
+        nucleic acid chains)
+        """
+        return [
+            Polypeptide(self.child_list[start:end])
+            for start, end in self.get_segment_ranges()
+        ]
 
     def extract_segment_seq(self):
         """
         Extract sequence from the residues that are present in chain. Residues that 
         have missing C and N backbone atoms are skipped.
         """
-        seq = Seq('')
-        for segment in self.get_segments():
-            seq += segment.get_sequence()
-        return seq
+        seq = ''
+        for start, end in self.get_segment_ranges():
+            for res in self.child_list[start:end]:
+                seq += self.letter_3to1_dict.get(res.resname, 'X')
+        return Seq(seq)
     
     def extract_present_seq(self):
         """
@@ -197,7 +232,7 @@ class Chain(BaseChain):
         Check if the chain is continuous (no gaps). Missing segments on 
         the C and N terminals will be ignored.
         """
-        segments = self.get_segments()
+        segments = self.get_segment_ranges()
         # If the strucutures C-N distance are all within the criterion,
         # it is continuous
         return len(segments) == 1
@@ -238,6 +273,8 @@ class PolymerChain(Chain):
         self.known_seq = Seq(known_sequence)
         self.can_seq = Seq(canon_sequence)
         self.seq_lookup: Dict[int, Tuple[str, int, str]] = {}
+        # missing residues, gaps and masked sequence (see missing_res)
+        self._missing_res_cache = None
         if len(self.reported_res) != len(self.can_seq):
             warnings.warn(
                 "Total number of reported residues do not match with the "
@@ -260,6 +297,46 @@ class PolymerChain(Chain):
         if id in self.het_resseq_lookup:
             id = self.het_resseq_lookup[id]
         return super().__getitem__(id)
+
+    def add(self, residue):
+        """Add a residue to the chain."""
+        super().add(residue)
+        self.reset_missing_res()
+
+    def insert(self, pos, residue):
+        """Insert a residue at the position of the child list."""
+        super().insert(pos, residue)
+        self.reset_missing_res()
+
+    def detach_child(self, id):
+        """Remove a residue."""
+        super().detach_child(id)
+        self.reset_missing_res()
+
+    def reset_missing_res(self):
+        """Clear the cached missing residues, gaps and masked sequence. This is
+        done when residues are added or detached, and it needs to be called 
+        after the residues in the chain are renamed or renumbered in place."""
+        self._missing_res_cache = None
+
+    def _get_missing_res_cache(self):
+        """Return the dict of the cached missing residues, gaps and masked 
+        sequence. The cache is also cleared when reported_res or can_seq is 
+        reassigned or reported_res changes its length (PRIVATE)"""
+        cache = getattr(self, '_missing_res_cache', None)
+        if (
+            cache is None or 
+            cache['reported_res'] is not self.reported_res or
+            cache['n_reported'] != len(self.reported_res) or
+            cache['can_seq'] is not self.can_seq
+        ):
+            cache = self._missing_res_cache = {
+                'reported_res': self.reported_res,
+                'n_reported': len(self.reported_res),
+                'can_seq': self.can_seq,
+            }
+        return cache
+
     @property
     def seq(self):
         """
@@ -272,8 +349,17 @@ class PolymerChain(Chain):
         """
         Get the current missing residues in the chain.
         Currently present residues will be compared to the the list of author- 
-        reported residues to determine the missing ones.
+        reported residues to determine the missing ones. The result is cached 
+        until the residues or the reported residues change (see 
+        reset_missing_res).
         """
+        cache = self._get_missing_res_cache()
+        if 'missing_res' not in cache:
+            cache['missing_res'] = self._find_missing_res()
+        return list(cache['missing_res'])
+
+    def _find_missing_res(self):
+        """Find the reported residues that are not present (PRIVATE)"""
         present_res = set()
         for res in self:
             if isinstance(res, cEntities.DisorderedResidue):
@@ -298,18 +384,32 @@ class PolymerChain(Chain):
         Get a sequence masked with '-' for any residue that is missing CA and N
         backbone atoms
         """
-        if len(self.missing_res) == 0:
+        cache = self._get_missing_res_cache()
+        if 'masked_seq' in cache:
+            return cache['masked_seq']
+        missing_res = self.missing_res
+        if len(missing_res) == 0:
             missing_res_ids = []
         else:
-            missing_res_ids = list(zip(*self.missing_res))[0]
-        return MaskedSeq(missing_res_ids, self.can_seq, self.reported_res[0][0])
+            missing_res_ids = list(zip(*missing_res))[0]
+        cache['masked_seq'] = MaskedSeq(
+            missing_res_ids, self.can_seq, self.reported_res[0][0]
+        )
+        return cache['masked_seq']
 
     @property
     def gaps(self):
         """
         Group gap residues into sets for comparison purposes
         """
-        missing_res = self.missing_res
+        cache = self._get_missing_res_cache()
+        if 'gaps' not in cache:
+            cache['gaps'] = self._find_gaps(self.missing_res)
+        return [set(gap) for gap in cache['gaps']]
+
+    @staticmethod
+    def _find_gaps(missing_res):
+        """Group the consecutive missing residues into sets (PRIVATE)"""
         gaps = []
         if len(missing_res) == 0:
             return gaps
@@ -364,7 +464,7 @@ class PolymerChain(Chain):
         Check if the chain is continuous (no gaps). Missing segments on 
         the C and N terminals will be ignored.
         """
-        segments = self.get_segments()
+        segments = self.get_segment_ranges()
         if len(segments) == 1:
             # If the strucuture's C-N distances are all within the criterion,
             # it is continuous
@@ -458,6 +558,93 @@ class MaskedSeq(Seq):
         print(self.color_coded_seq)
 
 
+def _is_peptide_residue(residue):
+    """Return if the residue is an amino acid or has an alpha carbon, as the
+    residues accepted by Biopython's PPBuilder (PRIVATE)"""
+    return "CA" in residue.child_dict or is_aa(residue, standard=False)
+
+def _is_altloc_linked(prev_atom, next_atom, radius):
+    """Return if any pair of the altloc positions of the two link atoms with 
+    the same altloc (or one blank altloc) are within the radius (PRIVATE)"""
+    prev_list, next_list = [prev_atom], [next_atom]
+    if prev_atom.is_disordered() == 2:
+        prev_list = prev_atom.disordered_get_list()
+    if next_atom.is_disordered() == 2:
+        next_list = next_atom.disordered_get_list()
+    for next_alt in next_list:
+        for prev_alt in prev_list:
+            next_altloc, prev_altloc = next_alt.altloc, prev_alt.altloc
+            if (
+                next_altloc != prev_altloc and
+                next_altloc != ' ' and prev_altloc != ' '
+            ):
+                continue
+            if next_alt.coord is None or prev_alt.coord is None:
+                continue
+            if np.linalg.norm(next_alt.coord - prev_alt.coord) < radius:
+                return True
+    return False
+
+def find_segment_ranges(residues, link_atoms, radius=1.8, accept=None):
+    """Find the continuous backbone segments in a list of residues. Adjacent 
+    residues are linked if the first link atom of the previous residue (e.g. C
+    or O3') and the second link atom of the next residue (e.g. N or P) are 
+    within the radius. The link atom coordinates are gathered once and the 
+    distances are compared in one vectorized operation, where the altloc 
+    positions of disordered atoms are only checked for the unlinked pairs.
+
+    Arguments:
+     :residues: list of residues in the order of the chain
+     :link_atoms: names of the link atoms of the previous and the next residue
+     :radius: distance cutoff of the link (default 1.8 A as in PPBuilder)
+     :accept: function of a residue that returns False if the residue is not
+        part of any segment (optional)
+
+    Return the list of (start, end) index ranges of the segments (end index 
+    exclusive). A segment has at least two linked residues.
+    """
+    n_res = len(residues)
+    if n_res < 2:
+        return []
+    prev_name, next_name = link_atoms
+    prev_coords = np.full((n_res, 3), np.nan)
+    next_coords = np.full((n_res, 3), np.nan)
+    prev_atoms, next_atoms = [None]*n_res, [None]*n_res
+    has_disordered = False
+    for i, res in enumerate(residues):
+        if accept is not None and not accept(res):
+            continue
+        if isinstance(res, DisorderedEntityWrapper):
+            res = res.selected_child
+        child_dict = res.child_dict
+        if (atom := child_dict.get(prev_name)) is not None:
+            prev_atoms[i] = atom
+            if atom.is_disordered() == 2:
+                has_disordered = True
+            if (coord := atom.coord) is not None:
+                prev_coords[i] = coord
+        if (atom := child_dict.get(next_name)) is not None:
+            next_atoms[i] = atom
+            if atom.is_disordered() == 2:
+                has_disordered = True
+            if (coord := atom.coord) is not None:
+                next_coords[i] = coord
+    # link i is between residue i and i+1, and NaN distances are not linked
+    dists = np.linalg.norm(prev_coords[:-1] - next_coords[1:], axis=1)
+    is_linked = dists < radius
+    if has_disordered:
+        for i in np.flatnonzero(~is_linked):
+            prev_atom, next_atom = prev_atoms[i], next_atoms[i+1]
+            if prev_atom is None or next_atom is None:
+                continue
+            if prev_atom.is_disordered() == 2 or next_atom.is_disordered() == 2:
+                is_linked[i] = _is_altloc_linked(prev_atom, next_atom, radius)
+    # the runs of links are the segments
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_linked, [0]))))
+    return [
+        (int(start), int(end)+1) for start, end in zip(edges[::2], edges[1::2])
+    ]
+
 def convert_chain(chain: _Chain):
     """Convert a Biopython Chain class to general Chain"""
     pchain = Chain(chain.id)
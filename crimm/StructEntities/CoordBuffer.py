@@ -0,0 +1,143 @@
+"""Contiguous coordinate storage shared by a model and its atoms.
+
+A CoordBuffer holds the coordinates of a list of atoms as one (N, 3) float
+array, and the coord of each atom is a view into its row. Setting the coord of
+a bound atom writes into its row, so in-place operations on the buffer array
+(e.g. superposition, orientation or loading a trajectory frame) move the atoms
+without gathering or scattering the coordinates one atom at a time.
+
+The buffer of a model is created by Model.get_coord_buffer (or the Model.coords
+property), and rebuilt when the atoms of the model change. Attaching entities
+to or detaching them from a parent (e.g. through add, insert or detach_child)
+increments a hierarchy version, so the buffer is only checked against the
+atoms of the model after such changes. Atoms without coordinates are bound as
+well, and their rows are NaN until their coordinates are set. Copied and
+unpickled atoms are not bound to any buffer.
+"""
+import numpy as np
+
+# Incremented whenever any entity is attached to or detached from a parent
+_hierarchy_version = 0
+
+def mark_hierarchy_changed():
+    """Record that an entity has been attached to or detached from a parent,
+    so the coordinate buffers are checked against the atoms again."""
+    global _hierarchy_version
+    _hierarchy_version += 1
+
+class CoordBuffer:
+    """Contiguous (N, 3) float array of the coordinates of a list of atoms,
+    where the coord of each atom is a view into its row. If coords is given,
+    it is used as the buffer array instead of the current coordinates of the
+    atoms, and the atoms of the NaN rows are left unset."""
+    def __init__(self, atoms, coords=None):
+        self.atoms = list(atoms)
+        self._rows = {id(atom): i for i, atom in enumerate(self.atoms)}
+        # set if any atom is bound to another buffer afterwards
+        self._stale = False
+        self.hierarchy_version = _hierarchy_version
+        # if the atoms include the altloc atoms that are not selected
+        self.has_altloc = False
+        if coords is not None:
+            self.coords = np.asarray(coords, dtype=float)
+            if self.coords.shape != (len(self.atoms), 3):
+                raise ValueError(
+                    f'Shape of the coordinates {self.coords.shape} does not '
+                    f'match the number of atoms ({len(self.atoms)})'
+                )
+            has_coord = ~np.isnan(self.coords).any(axis=1)
+        else:
+            self.coords = np.full((len(self.atoms), 3), np.nan)
+            atom_coords = [atom.coord for atom in self.atoms]
+            has_coord = [coord is not None for coord in atom_coords]
+            if atom_coords and all(has_coord):
+                self.coords[:] = atom_coords
+            else:
+                for i, coord in enumerate(atom_coords):
+                    if coord is not None:
+                        self.coords[i] = coord
+        # iterating over the array gives the views of the rows
+        for atom, row, is_set in zip(self.atoms, self.coords, has_coord):
+            if (old_buffer := atom._coord_buffer) is not None:
+                old_buffer._stale = True
+            if is_set:
+                atom._coord = row
+            atom._coord_buffer = self
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def __repr__(self):
+        return f"<CoordBuffer Atoms={len(self)}>"
+
+    def is_current(self):
+        """Return if no entity has been attached or detached anywhere since
+        the buffer was created or last checked against its atoms."""
+        return (
+            not self._stale and self.hierarchy_version == _hierarchy_version
+        )
+
+    def mark_current(self):
+        """Record that the buffer has been checked against its atoms at the 
+        current hierarchy version."""
+        self.hierarchy_version = _hierarchy_version
+
+    def set_row(self, atom, coord):
+        """Write the coordinates of the bound atom to its row. Return the view
+        of the row, or None if coord is None."""
+        row = self._rows[id(atom)]
+        if coord is None:
+            self.coords[row] = np.nan
+            return None
+        view = self.coords[row]
+        view[...] = coord
+        return view
+
+    def get_view(self, atoms):
+        """Return the view of the rows of the atoms if they are bound to this
+        buffer as one contiguous block in the same order, otherwise None."""
+        if self._stale or len(atoms) == 0:
+            return None
+        start = self._rows.get(id(atoms[0]))
+        if start is None:
+            return None
+        end = start + len(atoms)
+        # list comparison checks the identity of each atom first
+        if self.atoms[start:end] != list(atoms):
+            return None
+        return self.coords[start:end]
+
+def get_buffer_view(atoms):
+    """Return the view of the coordinate buffer rows of the atoms if they are
+    one contiguous block of a buffer, otherwise None."""
+    if len(atoms) == 0:
+        return None
+    buffer = getattr(atoms[0], '_coord_buffer', None)
+    if buffer is None:
+        return None
+    return buffer.get_view(atoms)
+
+def get_atom_coords(atoms):
+    """Return the (N, 3) array of the coordinates of the atoms. The rows are
+    copied in one operation if the atoms are a contiguous block of a buffer."""
+    view = get_buffer_view(atoms)
+    if view is not None and not np.isnan(view).any():
+        return view.copy()
+    return np.array([atom.coord for atom in atoms])
+
+def set_atom_coords(atoms, coords):
+    """Set the coordinates of the atoms from the (N, 3) array. The rows are
+    written in one operation if the atoms are a contiguous block of a
+    buffer."""
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) != len(atoms):
+        raise ValueError(
+            f'Number of coordinates ({len(coords)}) does not match the number '
+            f'of atoms ({len(atoms)})'
+        )
+    view = get_buffer_view(atoms)
+    if view is not None:
+        view[...] = coords
+        return
+    for atom, coord in zip(atoms, coords):
+        atom.coord = coord
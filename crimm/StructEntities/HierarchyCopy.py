@@ -0,0 +1,132 @@
+"""One-pass copy of the entity hierarchy (Structure, Model, Chain, Residue).
+
+Biopython's Entity.copy copies the hierarchy recursively: each entity is
+shallow copied, detached, and its children are copied and added back one at a
+time, which checks the ids and resets the parent of every child. Here the
+hierarchy is cloned level by level in a single pass, where the parents, child
+lists and child dicts of the copies are set directly. The coordinates of all
+atoms are then copied as one array into a CoordBuffer of the copied atoms
+(one buffer per model), which is a single array copy if the original atoms are
+already bound to a buffer (e.g. Model.coords has been used).
+
+As in a shallow copy, the attributes other than the children are shared with
+the original entities, so the per-residue metadata (e.g. names, topology
+definitions and parameters) are not duplicated. The copied atoms do not have
+any neighbors.
+"""
+from Bio.PDB.Entity import DisorderedEntityWrapper
+from crimm.StructEntities.CoordBuffer import CoordBuffer, get_buffer_view
+
+def _clone_entity(entity, parent):
+    """Return a copy of the entity without children, sharing its attributes
+    (PRIVATE)"""
+    cls = entity.__class__
+    clone = cls.__new__(cls)
+    clone.__dict__.update(entity.__dict__)
+    clone.parent = parent
+    clone.full_id = clone._generate_full_id()
+    clone.xtra = entity.xtra.copy()
+    return clone
+
+def _copy_children(entity, clone, copy_child):
+    """Copy the children of the entity to the clone. Return the dict of the
+    copied children keyed by the id() of the original children (PRIVATE)"""
+    copies = {id(child): copy_child(child, clone) for child in entity.child_list}
+    clone.child_list = list(copies.values())
+    clone.child_dict = {
+        key: copies[id(child)] for key, child in entity.child_dict.items()
+    }
+    return copies
+
+def _copy_disordered(wrapper, parent, copy_child):
+    """Copy the disordered atom or residue and all of its children. The
+    children of a disordered entity have the same parent as the entity
+    (PRIVATE)"""
+    cls = wrapper.__class__
+    clone = cls.__new__(cls)
+    clone.__dict__.update(wrapper.__dict__)
+    clone.parent = parent
+    clone.child_dict = {}
+    clone.selected_child = None
+    for key, child in wrapper.child_dict.items():
+        child_copy = copy_child(child, parent)
+        clone.child_dict[key] = child_copy
+        if child is wrapper.selected_child:
+            clone.selected_child = child_copy
+    return clone
+
+def _copy_atom(atom, parent):
+    """Copy the atom or disordered atom (PRIVATE)"""
+    if isinstance(atom, DisorderedEntityWrapper):
+        return _copy_disordered(atom, parent, _copy_atom)
+    return atom._clone(parent)
+
+def _copy_residue(residue, parent):
+    """Copy the residue or disordered residue (PRIVATE)"""
+    if isinstance(residue, DisorderedEntityWrapper):
+        return _copy_disordered(residue, parent, _copy_residue)
+    clone = _clone_entity(residue, parent)
+    _copy_children(residue, clone, _copy_atom)
+    return clone
+
+def _copy_chain(chain, parent):
+    """Copy the chain (PRIVATE)"""
+    clone = _clone_entity(chain, parent)
+    copies = _copy_children(chain, clone, _copy_residue)
+    if (het_res := getattr(chain, 'het_res', None)) is not None:
+        # lists updated by Chain.add need to be copied as well
+        clone.het_res = [copies[id(res)] for res in het_res if id(res) in copies]
+        clone.het_resseq_lookup = dict(chain.het_resseq_lookup)
+    return clone
+
+def _copy_model(model, parent):
+    """Copy the model (PRIVATE)"""
+    clone = _clone_entity(model, parent)
+    clone._coord_buffer = None
+    _copy_children(model, clone, _copy_chain)
+    return clone
+
+def _copy_structure(structure, parent):
+    """Copy the structure (PRIVATE)"""
+    clone = _clone_entity(structure, parent)
+    _copy_children(structure, clone, _copy_model)
+    return clone
+
+_copy_funcs = {
+    'R': _copy_residue,
+    'C': _copy_chain,
+    'M': _copy_model,
+    'S': _copy_structure,
+}
+
+def _bind_coords(entity, clone):
+    """Copy the coordinates of the atoms of the entity into a CoordBuffer of
+    the atoms of the clone. The copied atoms share the coord arrays with the
+    original atoms until they are bound (PRIVATE)"""
+    atoms = list(entity.get_atoms(include_alt=True))
+    view = get_buffer_view(atoms)
+    coords = None if view is None else view.copy()
+    clone_atoms = list(clone.get_atoms(include_alt=True))
+    if clone.level == 'M':
+        clone._build_coord_buffer(clone_atoms, coords)
+    else:
+        CoordBuffer(clone_atoms, coords)
+
+def copy_entity(entity):
+    """Copy the structure, model, chain or residue with all of its children in
+    one pass. The copy has no parent, and the coordinates of the copied atoms
+    are views into a new CoordBuffer (one for each model)."""
+    if entity.level not in _copy_funcs:
+        raise ValueError(
+            f'Entity level "{entity.level}" is not supported for copying'
+        )
+    # imported here to avoid circular import
+    from crimm.Utils.StructureUtils import gc_paused
+    with gc_paused():
+        clone = _copy_funcs[entity.level](entity, None)
+        if entity.level == 'S':
+            for model, model_copy in zip(entity, clone):
+                _bind_coords(model, model_copy)
+        else:
+            _bind_coords(entity, clone)
+    return clone
@@ -1,6 +1,8 @@
 """Model class, used in Structure objects."""
 import warnings
 from Bio.PDB.Model import Model as _Model
+from crimm.StructEntities.CoordBuffer import CoordBuffer
+from crimm.StructEntities.HierarchyCopy import copy_entity
 
 class Model(_Model):
     """The extended Model class representing a model in a structure.
@@ -15,6 +17,10 @@ class Model(_Model):
         self.pdb_id = None
         self.connect_dict = {}
         self.connect_atoms = {}
+        # AssemblyView of the symmetry copies that are not materialized
+        self.assembly_view = None
+        # CoordBuffer of the atoms (see get_coord_buffer)
+        self._coord_buffer = None
 
     def set_pdb_id(self, pdb_id):
         """Set the PDB ID of this model."""
@@ -45,6 +51,58 @@ class Model(_Model):
         display(show_nglview_multiple(self.child_list))
         print(self.expanded_view())
 
+    def __getstate__(self):
+        """Return state of the model for pickling and copying. The coordinate
+        buffer is not included, since the copied atoms are not bound to it."""
+        state = self.__dict__.copy()
+        state['_coord_buffer'] = None
+        return state
+
+    def get_coord_buffer(self, rebuild=False):
+        """Return the CoordBuffer of all atoms in this model (including altloc
+        atoms), where the coord of each atom is a view into its row of the 
+        buffer. The buffer is created on the first call, and rebuilt if the 
+        atoms of the model have changed since. Changes made by reordering or
+        editing the child lists directly are not detected, in which case 
+        rebuild should be set to True."""
+        buffer = self._coord_buffer
+        if not rebuild and buffer is not None and buffer.is_current():
+            return buffer
+        atoms = list(self.get_atoms(include_alt=True))
+        if rebuild or buffer is None or (
+            len(buffer) != len(atoms) or buffer.get_view(atoms) is None
+        ):
+            buffer = self._build_coord_buffer(atoms)
+        buffer.mark_current()
+        return buffer
+
+    def _build_coord_buffer(self, atoms, coords=None):
+        """Create the CoordBuffer of the atoms of this model (PRIVATE)"""
+        buffer = self._coord_buffer = CoordBuffer(atoms, coords)
+        # altloc atoms are only in the buffer but not in get_atoms()
+        buffer.has_altloc = sum(1 for _ in self.get_atoms()) != len(atoms)
+        return buffer
+
+    def copy(self):
+        """Copy the model and all its chains, residues and atoms in one pass.
+        The coordinate buffer of the copy is created from the coordinates of
+        the model (see crimm.StructEntities.HierarchyCopy)."""
+        return copy_entity(self)
+
+    @property
+    def coords(self):
+        """(N, 3) coordinates of all atoms in this model (including altloc
+        atoms) from the coordinate buffer. The array is shared with the atoms,
+        so in-place operations on it (e.g. `model.coords += shift`) move the 
+        atoms."""
+        return self.get_coord_buffer().coords
+
+    @coords.setter
+    def coords(self, coords):
+        buffer_coords = self.get_coord_buffer().coords
+        if coords is not buffer_coords:
+            buffer_coords[...] = coords
+
     @property
     def chains(self):
         """Alias for child_list. Returns the list of chains in this model."""
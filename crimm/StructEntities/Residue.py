@@ -3,6 +3,8 @@ from Bio.PDB.Residue import Residue as _Residue
 from Bio.PDB.Entity import Entity
 from Bio.PDB.Residue import DisorderedResidue as _DisorderedResidue
 from crimm.StructEntities.TopoElements import Bond
+from crimm.StructEntities.CoordBuffer import mark_hierarchy_changed
+from crimm.StructEntities.HierarchyCopy import copy_entity
 
 class Residue(_Residue):
     """Residue class derived from Biopython Residue and made compatible with
@@ -28,6 +30,21 @@ class Residue(_Residue):
     def atoms(self):
         """Alias for child_list. Return the list of atoms in the residue."""
         return self.child_list
+
+    def set_parent(self, entity):
+        """Set the parent chain."""
+        super().set_parent(entity)
+        mark_hierarchy_changed()
+
+    def detach_parent(self):
+        """Detach the parent chain."""
+        super().detach_parent()
+        mark_hierarchy_changed()
+
+    def copy(self):
+        """Copy the residue and its atoms in one pass. The coordinates of the
+        copied atoms are views into a new CoordBuffer."""
+        return copy_entity(self)
     
     def get_atoms(self, include_alt=False):
         """Return the list of all atoms. If include_alt is True, all altloc of 
@@ -90,7 +107,20 @@ class DisorderedResidue(_DisorderedResidue):
         if self.parent is None:
             return self
         return self.parent.get_top_parent()
-    
+
+    def copy(self):
+        """Copy the disordered residue and all of its child residues in one 
+        pass. The selected child of the copy is the copy of the selected child
+        (Biopython keeps referencing the original residue)."""
+        return copy_entity(self)
+
+    def disordered_add(self, residue):
+        """Add a residue object and use its resname as key. The cached missing
+        residues of the parent chain are cleared."""
+        super().disordered_add(residue)
+        if hasattr(self.parent, 'reset_missing_res'):
+            self.parent.reset_missing_res()
+
     def reset_atom_serial_numbers(self, include_alt=True):
         """Reset all atom serial numbers in the encompassing entity (the parent
         structure, model, and chain, if they exist) starting from 1."""
@@ -1,6 +1,7 @@
 """The structure class, representing a macromolecular structure."""
 import warnings
 from Bio.PDB.Structure import Structure as _Structure
+from crimm.StructEntities.HierarchyCopy import copy_entity
 
 class Structure(_Structure):
     """The extended Structure class contains a collection of Model instances.
@@ -51,6 +52,11 @@ class Structure(_Structure):
         display(show_nglview_multiple(self.child_list[0].child_list))
         print(self.expanded_view())
 
+    def copy(self):
+        """Copy the structure and all its models in one pass. Each copied 
+        model has a CoordBuffer of its atoms."""
+        return copy_entity(self)
+
     @property
     def models(self):
         """Alias for child_list. Returns the list of models in this structure."""
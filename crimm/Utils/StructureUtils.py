@@ -1,5 +1,7 @@
+import gc
+from contextlib import contextmanager
 from string import ascii_uppercase
-import numpy as np
+from crimm.StructEntities.CoordBuffer import get_atom_coords
 
 def index_to_letters(index, letter = ''):
     """Enumerate a sequence of letters based on the alphabet from a integer number.
@@ -20,7 +22,27 @@ def index_to_letters(index, letter = ''):
     return index_to_letters(index, letter)
 
 def get_coords(entity, include_alt=False):
-    """Get atom coordinates from any structure entity level"""
+    """Get atom coordinates from any structure entity level. The coordinates
+    are copied in one operation if the atoms are bound to the coordinate
+    buffer of the model (see Model.get_coord_buffer)."""
     if entity.level == 'A':
         return entity.coord
-    return np.array([a.coord for a in entity.get_atoms(include_alt)])
\ No newline at end of file
+    if entity.level == 'M' and entity._coord_buffer is not None:
+        buffer = entity.get_coord_buffer()
+        if include_alt or not buffer.has_altloc:
+            return buffer.coords.copy()
+    return get_atom_coords(list(entity.get_atoms(include_alt)))
+
+@contextmanager
+def gc_paused():
+    """Pause the garbage collector while a large number of entities are
+    created. The parent-child references make every new entity a tracked
+    container, and the collections triggered by the allocations would
+    repeatedly scan the entire structure while none of them are garbage."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()